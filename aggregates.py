@@ -0,0 +1,221 @@
+"""Pre-aggregated rental history for the Dashboard and Analytics pages.
+
+train.csv is scanned once into hourly / weather / season / monthly / daily
+rollups (sums and row counts) stored in a small .npz next to the other
+caches. When the CSV grows, only the appended bytes are parsed and added to
+the stored sums; if it was rewritten instead, the rollups are rebuilt.
+Page loads read the arrays from memory and only ``os.stat`` the CSV.
+
+``path`` may also be a column store directory (see ``storage.py``); its
+memory-mapped columns are summed directly, without parsing text.
+"""
+import hashlib
+import io
+import os
+import threading
+
+import numpy as np
+
+from storage import META_FILE, ColumnStore, is_store
+
+HISTORY_FILE = 'train.csv'
+CACHE_FILE = os.path.join('models', 'cache', 'rollups.npz')
+CHUNK_ROWS = 200_000
+# Bytes just before the processed offset, hashed to detect rewrites vs appends
+_TAIL_BYTES = 4096
+
+_SUM_COLUMNS = ('casual', 'registered', 'count', 'temp')
+
+
+def _empty_state():
+    return {
+        'hour_sum': np.zeros((24, len(_SUM_COLUMNS))), 'hour_n': np.zeros(24, dtype=np.int64),
+        'weather_sum': np.zeros((4, len(_SUM_COLUMNS))), 'weather_n': np.zeros(4, dtype=np.int64),
+        'season_sum': np.zeros((4, len(_SUM_COLUMNS))), 'season_n': np.zeros(4, dtype=np.int64),
+        'month_sum': np.zeros((12, len(_SUM_COLUMNS))), 'month_n': np.zeros(12, dtype=np.int64),
+        'day_ordinal': np.zeros(0, dtype=np.int64), 'day_count': np.zeros(0),
+        'offset': np.int64(0), 'rows': np.int64(0), 'tail_hash': np.array(''), 'header': np.array(''),
+    }
+
+
+def _tail_hash(f, offset):
+    start = max(0, offset - _TAIL_BYTES)
+    f.seek(start)
+    return hashlib.sha1(f.read(offset - start)).hexdigest()
+
+
+def _accumulate(state, df):
+    # pandas is only needed when new rows are parsed; cached page loads skip the import
+    import pandas as pd
+    dt = pd.to_datetime(df['datetime'], errors='coerce')
+    values = df[list(_SUM_COLUMNS)].to_numpy(dtype=float)
+    groups = {
+        'hour': dt.dt.hour.to_numpy(),
+        'weather': df['weather'].to_numpy() - 1,
+        'season': df['season'].to_numpy() - 1,
+        'month': dt.dt.month.to_numpy() - 1,
+    }
+    for name, idx in groups.items():
+        size = len(state[f'{name}_n'])
+        ok = (idx >= 0) & (idx < size)
+        idx = idx[ok].astype(np.int64)
+        state[f'{name}_n'] += np.bincount(idx, minlength=size)
+        for j in range(len(_SUM_COLUMNS)):
+            state[f'{name}_sum'][:, j] += np.bincount(idx, weights=values[ok, j], minlength=size)
+
+    # Daily totals, merged into the sorted per-day arrays
+    days = (dt.dt.normalize() - pd.Timestamp('1970-01-01')).dt.days.to_numpy()
+    ok = ~np.isnan(days.astype(float))
+    days, counts = days[ok].astype(np.int64), df['count'].to_numpy(dtype=float)[ok]
+    all_days = np.concatenate([state['day_ordinal'], days])
+    all_counts = np.concatenate([state['day_count'], counts])
+    state['day_ordinal'], inverse = np.unique(all_days, return_inverse=True)
+    state['day_count'] = np.bincount(inverse, weights=all_counts)
+    state['rows'] = np.int64(int(state['rows']) + len(df))
+
+
+def refresh(path=HISTORY_FILE, cache_file=CACHE_FILE, state=None):
+    """Bring the rollups up to date with ``path``; returns the state dict"""
+    if state is None:
+        state = _load_state(cache_file)
+    size = os.path.getsize(path)
+    offset = int(state['offset'])
+
+    with open(path, 'rb') as f:
+        header = f.readline()
+        appended = (
+            offset > 0 and size >= offset
+            and str(state['header']) == header.decode()
+            and str(state['tail_hash']) == _tail_hash(f, offset)
+        )
+        if not appended:
+            state, offset = _empty_state(), len(header)
+            state['header'] = np.array(header.decode())
+        if size == offset:
+            return state
+
+        f.seek(offset)
+        new_bytes = f.read(size - offset)
+        # Only consume complete lines; a partially written last row waits for the next refresh
+        complete = new_bytes.rfind(b'\n') + 1 if not new_bytes.endswith(b'\n') else len(new_bytes)
+        if complete:
+            import pandas as pd
+            names = header.decode().strip().split(',')
+            for chunk in pd.read_csv(io.BytesIO(new_bytes[:complete]), names=names, header=None,
+                                     chunksize=CHUNK_ROWS):
+                _accumulate(state, chunk)
+            offset += complete
+        state['offset'] = np.int64(offset)
+        state['tail_hash'] = np.array(_tail_hash(f, offset))
+
+    _save_state(state, cache_file)
+    return state
+
+
+def from_store(path):
+    """Rollup state summed over the columns of a store directory"""
+    state = _empty_state()
+    for df in ColumnStore(path).iter_frames(CHUNK_ROWS, ('datetime', 'weather', 'season') + _SUM_COLUMNS):
+        _accumulate(state, df)
+    return state
+
+
+def _load_state(cache_file):
+    if os.path.exists(cache_file):
+        try:
+            with np.load(cache_file, allow_pickle=False) as z:
+                state = {k: z[k] for k in z.files}
+            if state.keys() == _empty_state().keys():
+                return state
+        except (OSError, ValueError):
+            pass
+    return _empty_state()
+
+
+def _save_state(state, cache_file):
+    os.makedirs(os.path.dirname(cache_file) or '.', exist_ok=True)
+    tmp = cache_file + '.tmp.npz'
+    np.savez(tmp, **state)
+    os.replace(tmp, cache_file)
+
+
+# ─────────────────────────────────────────────
+#  READ SIDE
+# ─────────────────────────────────────────────
+class Rollups:
+    """Read-only view over a rollup state with the arrays the pages plot"""
+
+    def __init__(self, state):
+        self.state = state
+
+    def _mean(self, group, column):
+        n = self.state[f'{group}_n']
+        s = self.state[f'{group}_sum'][:, _SUM_COLUMNS.index(column)]
+        return np.divide(s, n, out=np.zeros_like(s), where=n > 0)
+
+    @property
+    def rows(self):
+        return int(self.state['rows'])
+
+    @property
+    def days(self):
+        return len(self.state['day_ordinal'])
+
+    def hourly_mean(self, column):
+        return self._mean('hour', column)
+
+    def weather_mean(self, column='count'):
+        return self._mean('weather', column)
+
+    def season_share(self):
+        """Mean hourly rentals per season, as percentages of their sum"""
+        mean = self._mean('season', 'count')
+        total = mean.sum()
+        return mean / total * 100 if total else mean
+
+    def monthly_total(self):
+        return self.state['month_sum'][:, _SUM_COLUMNS.index('count')]
+
+    def monthly_mean(self, column):
+        return self._mean('month', column)
+
+    def total_rentals(self):
+        return float(self.state['day_count'].sum())
+
+    def avg_daily(self):
+        return float(self.state['day_count'].mean()) if self.days else 0.0
+
+
+_rollups = None
+_rollups_stat = None
+_rollups_lock = threading.Lock()
+
+
+def get_rollups(path=HISTORY_FILE, cache_file=CACHE_FILE):
+    """Process-wide rollups, refreshed when ``path`` changes; None without data"""
+    global _rollups, _rollups_stat
+    store = is_store(path)
+    try:
+        st = os.stat(os.path.join(path, META_FILE) if store else path)
+    except OSError:
+        return None
+    stat = (st.st_size, st.st_mtime_ns)
+    if _rollups is not None and _rollups_stat == stat:
+        return _rollups
+    with _rollups_lock:
+        if _rollups is None or _rollups_stat != stat:
+            if store:
+                state = from_store(path)
+            else:
+                # Refresh a copy so readers of the current rollups never see half-added sums
+                state = {k: np.copy(v) for k, v in _rollups.state.items()} if _rollups is not None else None
+                state = refresh(path, cache_file, state)
+            _rollups, _rollups_stat = Rollups(state), stat
+    return _rollups
+
+
+def clear():
+    """Drop the in-process rollups; the next ``get_rollups`` reloads the on-disk cache"""
+    global _rollups, _rollups_stat
+    with _rollups_lock:
+        _rollups = _rollups_stat = None
@@ -1,10 +1,24 @@
+import time
+
+script_t0 = time.perf_counter()
+
 import streamlit as st
-import pickle
 import numpy as np
-import pandas as pd
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import os
+
+import figures
+import startup
+from figures import C, CHART_CONFIG
+from instrumentation import get_instrumentation
+from model_registry import get_registry
+from records import ResultBatch
+
+# The weighted log-space ensemble (ensemble.EnsemblePredictor), wherever it is offered or shown
+ENSEMBLE_LABEL = 'Ensemble (Weighted)'
+
+# Modules only one page needs (pandas via the rollups and forecast, the
+# prediction stack, make_subplots) are imported inside that page's branch;
+# startup.prewarm() loads them in the background meanwhile.
 
 # ─────────────────────────────────────────────
 #  PAGE CONFIG
@@ -15,6 +29,7 @@ st.set_page_config(
     layout="wide",
     initial_sidebar_state="collapsed"
 )
+startup.prewarm()
 
 # ─────────────────────────────────────────────
 #  GLOBAL CSS
@@ -220,25 +235,41 @@ casual      = [4, 2,1,1,2, 6,12, 25, 42, 52, 58, 62, 65, 63, 60, 58, 52, 48, 38,
 months_label = ['Jan','Feb','Mar','Apr','May','Jun','Jul','Aug','Sep','Oct','Nov','Dec']
 total_rentals= [40200,22000,52000,72000,96000,115000,138000,135000,138000,104000,72000,25000]
 avg_temp     = [4,5,9,15,19,24,27,26,21,15,9,5]
+weather_avg  = [118, 112, 106, 14]
+season_share = [27,34,28,12]
+history = dict(days=365, rows=8760, total=1058318, avg_daily=2900)
+
+# Replace the reference figures above with rollups of train.csv when it is
+# available; only the pages that plot them pay for loading the rollups
+if st.session_state.get('page', "Dashboard") in ("Dashboard", "Analytics"):
+    from aggregates import get_rollups
+    rollups = get_rollups()
+else:
+    rollups = None
+if rollups is not None and rollups.rows:
+    registered = np.round(rollups.hourly_mean('registered')).astype(int).tolist()
+    casual = np.round(rollups.hourly_mean('casual')).astype(int).tolist()
+    total_rentals = np.round(rollups.monthly_total()).astype(int).tolist()
+    avg_temp = np.round(rollups.monthly_mean('temp'), 1).tolist()
+    weather_avg = np.round(rollups.weather_mean()).astype(int).tolist()
+    season_share = np.round(rollups.season_share()).astype(int).tolist()
+    history = dict(days=rollups.days, rows=rollups.rows,
+                   total=round(rollups.total_rentals()), avg_daily=round(rollups.avg_daily()))
+
+# The Dashboard's hourly split comes from the casual / registered model when
+# one is trained: its predictions averaged over the history, hour by hour.
+# The prewarm thread computes it; until then the rollups above stand in.
+hourly_split = None
+if st.session_state.get('page', "Dashboard") == "Dashboard":
+    from riders import hourly_split as predicted_hourly_split
+    hourly_split = predicted_hourly_split(block=False)
+if hourly_split is not None:
+    registered, casual = (np.round(v).astype(int).tolist() for v in hourly_split)
+
+hourly_total = [r + c for r, c in zip(registered, casual)]
+peak_hour = int(np.argmax(hourly_total))
+weather_drop = round((1 - weather_avg[2] / weather_avg[0]) * 100) if weather_avg[0] else 0
 
-C = {
-    'teal':'#14b8a6','cyan':'#38bdf8','purple':'#a78bfa',
-    'orange':'#fb923c','green':'#4ade80',
-    'grid':'rgba(255,255,255,0.04)','muted':'#3a5472','text':'#c8d6e8',
-}
-
-BASE_LAYOUT = dict(
-    paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)',
-    font=dict(family='Plus Jakarta Sans', color=C['text'], size=12),
-    xaxis=dict(gridcolor=C['grid'], color=C['muted'], showline=False),
-    yaxis=dict(gridcolor=C['grid'], color=C['muted'], showline=False),
-    legend=dict(bgcolor='rgba(0,0,0,0)', orientation='h',
-                yanchor='bottom', y=-0.26, xanchor='center', x=0.5,
-                font=dict(size=12, color=C['text'])),
-    hovermode='x unified',
-    hoverlabel=dict(bgcolor='#1a2840', bordercolor='rgba(56,189,248,0.3)',
-                    font=dict(family='Plus Jakarta Sans', color='#e2ecfb', size=13))
-)
 
 
 def kpi(icon, label, value, sub, accent):
@@ -255,74 +286,27 @@ def sec(title, sub):
 
 
 # ─────────────────────────────────────────────
-#  HELPER FUNCTIONS FOR NORMALIZATION
+#  MODEL LOADING
 # ─────────────────────────────────────────────
-def normalize_temperature(temp_celsius):
-    min_temp = -5
-    max_temp = 40
-    clipped_temp = np.clip(temp_celsius, min_temp, max_temp)
-    normalized = (clipped_temp - min_temp) / (max_temp - min_temp)
-    return normalized
-
-def normalize_humidity(humidity_percent):
-    clipped_humidity = np.clip(humidity_percent, 0, 100)
-    normalized = clipped_humidity / 100.0
-    return normalized
-
-def normalize_windspeed(windspeed_kmh):
-    min_wind = 0
-    max_wind = 50
-    clipped_wind = np.clip(windspeed_kmh, min_wind, max_wind)
-    normalized = (clipped_wind - min_wind) / (max_wind - min_wind)
-    return normalized
-
-def predict_for_hours(model, base_features, hours_range):
-    predictions = []
-    for hour in hours_range:
-        features = base_features.copy()
-        features[8] = hour
-        pred_log = model.predict(features.reshape(1, -1))
-        pred = int(max(0, np.expm1(pred_log)[0]))
-        predictions.append(pred)
-    return predictions
-
 def load_available_models():
-    """Load all available model files and return a dictionary of models"""
-    model_files = {
-        'Gradient Boosting': 'bike_model_gradientboosting.pkl',
-        'Random Forest': 'bike_model_randomforest.pkl',
-        'XGBoost': 'bike_model_xgboost.pkl',
-        'CatBoost': 'bike_model_catboost.pkl'
-    }
-    
-    available_models = {}
-    for model_name, filename in model_files.items():
-        if os.path.exists(filename):
-            try:
-                with open(filename, 'rb') as f:
-                    available_models[model_name] = pickle.load(f)
-            except:
-                pass
-    
-    # Also try to load the original model as fallback
-    if not available_models and os.path.exists('bike_model.pkl'):
-        try:
-            with open('bike_model.pkl', 'rb') as f:
-                available_models['Gradient Boosting (Original)'] = pickle.load(f)
-        except:
-            pass
-    
-    return available_models
+    """Return all available models from the process-wide registry"""
+    return get_registry().load_models()
 
 def load_ensemble_info():
     """Load ensemble info if available"""
-    if os.path.exists('bike_ensemble_info.pkl'):
-        try:
-            with open('bike_ensemble_info.pkl', 'rb') as f:
-                return pickle.load(f)
-        except:
-            return None
-    return None
+    return get_registry().load_ensemble_info()
+
+def predict_inline(X, model, interval=False):
+    """Same result as the batch scheduler, computed in this thread so a profiler sees the work"""
+    from batching import ENSEMBLE
+    from ensemble import get_ensemble
+    from intervals import model_interval
+    from prediction import predict_log
+    models = load_available_models()
+    if model == ENSEMBLE:
+        ensemble = get_ensemble(models)
+        return ensemble.predict_interval(X, concurrent=False) if interval else ensemble.predict_log(X, concurrent=False)
+    return model_interval(models[model], X) if interval else predict_log(models[model], X)
 
 
 # ─────────────────────────────────────────────
@@ -335,7 +319,7 @@ if 'selected_model' not in st.session_state:
     st.session_state.selected_model = None
 
 if 'comparison_results' not in st.session_state:
-    st.session_state.comparison_results = {}
+    st.session_state.comparison_results = ResultBatch()
 
 
 # ─────────────────────────────────────────────
@@ -468,47 +452,25 @@ if st.session_state.page == "Dashboard":
     col_h, col_w = st.columns([5,1])
     with col_h:
         st.markdown('<div style="font-size:1.65rem;font-weight:800;color:#e2ecfb;line-height:1.1;">Bike Rental Dashboard</div>', unsafe_allow_html=True)
-        st.markdown('<div style="font-size:0.78rem;color:#3a5472;margin-bottom:18px;">Historical analysis · 365 days · 8,760 hourly records</div>', unsafe_allow_html=True)
+        st.markdown(f'<div style="font-size:0.78rem;color:#3a5472;margin-bottom:18px;">Historical analysis · {history["days"]:,} days · {history["rows"]:,} hourly records</div>', unsafe_allow_html=True)
     with col_w:
         st.markdown('<div style="text-align:right;padding-top:6px;"><span style="background:linear-gradient(90deg,#fef3c7,#fde68a);color:#92400e;border-radius:30px;padding:7px 16px;font-weight:700;font-size:0.82rem;">☀️ Clear 22°C</span></div>', unsafe_allow_html=True)
 
     c1,c2,c3,c4 = st.columns(4, gap="small")
-    with c1: kpi("🚲","Total Rentals","1,058,318","Past 12 months","linear-gradient(90deg,#14b8a6,#38bdf8)")
-    with c2: kpi("📈","Avg Daily","2,900","Rentals per day","linear-gradient(90deg,#a78bfa,#818cf8)")
-    with c3: kpi("⏰","Peak Hour","17:00","Avg 257 bikes / hr","linear-gradient(90deg,#fb923c,#f59e0b)")
-    with c4: kpi("🌦","Weather Effect","13% drop","Clear vs rainy days","linear-gradient(90deg,#4ade80,#22d3ee)")
+    with c1: kpi("🚲","Total Rentals",f"{history['total']:,}",f"Past {history['days']:,} days","linear-gradient(90deg,#14b8a6,#38bdf8)")
+    with c2: kpi("📈","Avg Daily",f"{history['avg_daily']:,}","Rentals per day","linear-gradient(90deg,#a78bfa,#818cf8)")
+    with c3: kpi("⏰","Peak Hour",f"{peak_hour:02d}:00",f"Avg {hourly_total[peak_hour]} bikes / hr","linear-gradient(90deg,#fb923c,#f59e0b)")
+    with c4: kpi("🌦","Weather Effect",f"{weather_drop}% drop","Clear vs rainy days","linear-gradient(90deg,#4ade80,#22d3ee)")
 
     st.markdown("<br>", unsafe_allow_html=True)
 
     # Hourly chart
     st.markdown('<div class="chart-card">', unsafe_allow_html=True)
-    sec("Average Hourly Demand Pattern", "Registered vs Casual riders across 24 hours")
-
-    fig1 = go.Figure()
-    fig1.add_trace(go.Scatter(
-        x=hours, y=registered, name="Registered",
-        mode='lines', fill='tozeroy',
-        line=dict(color=C['cyan'], width=2.5, shape='spline'),
-        fillcolor='rgba(56,189,248,0.13)',
-        hovertemplate='<b>Registered</b>: %{y}'
-    ))
-    fig1.add_trace(go.Scatter(
-        x=hours, y=casual, name="Casual",
-        mode='lines', fill='tozeroy',
-        line=dict(color=C['purple'], width=2.5, shape='spline'),
-        fillcolor='rgba(167,139,250,0.13)',
-        hovertemplate='<b>Casual</b>: %{y}'
-    ))
-    lay1 = {**BASE_LAYOUT}
-    lay1['height'] = 295
-    lay1['margin'] = dict(l=10,r=10,t=6,b=40)
-    lay1['xaxis'] = dict(
-        tickvals=hours, ticktext=[f"{h:02d}:00" for h in hours],
-        gridcolor=C['grid'], color=C['muted'], showline=False
-    )
-    lay1['yaxis'] = dict(range=[0,215], gridcolor=C['grid'], color=C['muted'])
-    fig1.update_layout(**lay1)
-    st.plotly_chart(fig1, use_container_width=True, config={'displayModeBar':False})
+    sec("Average Hourly Demand Pattern", "Registered vs Casual riders across 24 hours"
+        + (" · split model estimate" if hourly_split is not None else ""))
+
+    fig1 = figures.cached('hourly_pattern', figures.hourly_pattern, registered, casual)
+    st.plotly_chart(fig1, use_container_width=True, config=CHART_CONFIG)
     st.markdown('</div>', unsafe_allow_html=True)
 
     st.markdown("<br>", unsafe_allow_html=True)
@@ -518,44 +480,15 @@ if st.session_state.page == "Dashboard":
     with col_l:
         st.markdown('<div class="chart-card">', unsafe_allow_html=True)
         sec("Weather Impact on Demand", "Average hourly rentals by weather condition")
-        fig2 = go.Figure(go.Bar(
-            x=['Clear','Cloudy','Light Rain','Heavy Rain'],
-            y=[118, 112, 106, 14],
-            marker_color=[C['orange'], '#94a3b8', '#60a5fa', C['purple']],
-            marker_line_width=0,
-            hovertemplate='%{x}: <b>%{y}</b> avg rentals<extra></extra>'
-        ))
-        lay2 = {**BASE_LAYOUT}
-        lay2['height'] = 280
-        lay2['margin'] = dict(l=10,r=10,t=6,b=10)
-        lay2['yaxis'] = dict(gridcolor=C['grid'], color=C['muted'], range=[0,145])
-        lay2['bargap'] = 0.35
-        lay2['showlegend'] = False
-        fig2.update_layout(**lay2)
-        st.plotly_chart(fig2, use_container_width=True, config={'displayModeBar':False})
+        fig2 = figures.cached('weather_impact', figures.weather_impact, weather_avg)
+        st.plotly_chart(fig2, use_container_width=True, config=CHART_CONFIG)
         st.markdown('</div>', unsafe_allow_html=True)
 
     with col_r:
         st.markdown('<div class="chart-card">', unsafe_allow_html=True)
         sec("Seasonal Split", "Avg daily rentals by season")
-        fig3 = go.Figure(go.Pie(
-            labels=['Spring','Summer','Fall','Winter'],
-            values=[27,34,28,12],
-            hole=0.0,
-            marker=dict(
-                colors=[C['green'], C['orange'], '#fb923c', '#60a5fa'],
-                line=dict(color='#0c1522', width=2.5)
-            ),
-            textinfo='label+percent',
-            textfont=dict(size=13, color='#e2ecfb'),
-            hovertemplate='<b>%{label}</b>: %{value}%<extra></extra>'
-        ))
-        lay3 = {**BASE_LAYOUT}
-        lay3['height'] = 280
-        lay3['margin'] = dict(l=10,r=10,t=6,b=10)
-        lay3['showlegend'] = False
-        fig3.update_layout(**lay3)
-        st.plotly_chart(fig3, use_container_width=True, config={'displayModeBar':False})
+        fig3 = figures.cached('season_split', figures.season_split, season_share)
+        st.plotly_chart(fig3, use_container_width=True, config=CHART_CONFIG)
         st.markdown('</div>', unsafe_allow_html=True)
 
 
@@ -570,9 +503,26 @@ elif st.session_state.page == "Weather Forecast":
     lows    = [14,13,10,16,17,14,15]
     impacts = ["+12%","-5%","-28%","+18%","+22%","+8%","+14%"]
     icolors = ["#4ade80","#fb923c","#f87171","#4ade80","#4ade80","#4ade80","#4ade80"]
+    daily   = [3360,2760,1920,3720,4080,3180,3540]
+
+    # Model-driven outlook when a weather_forecast.json/.csv is present
+    from forecast import get_forecast
+    try:
+        outlook = get_forecast()
+    except (ValueError, KeyError) as e:
+        outlook = None
+        st.warning(f"Could not read the weather forecast file: {e}")
+    if outlook:
+        days    = [d['label'] for d in outlook]
+        icons   = [d['icon'] for d in outlook]
+        highs   = [d['high'] for d in outlook]
+        lows    = [d['low'] for d in outlook]
+        impacts = [f"{d['impact']:+.0f}%" for d in outlook]
+        icolors = ["#4ade80" if d['impact'] >= 0 else "#fb923c" if d['impact'] > -20 else "#f87171" for d in outlook]
+        daily   = [d['rentals'] for d in outlook]
 
     cols = st.columns(7, gap="small")
-    for i, col in enumerate(cols):
+    for i, col in enumerate(cols[:len(days)]):
         with col:
             st.markdown(f"""
             <div class="kpi-card" style="--accent:{icolors[i]};padding:16px 10px;text-align:center;">
@@ -586,24 +536,25 @@ elif st.session_state.page == "Weather Forecast":
 
     st.markdown("<br>", unsafe_allow_html=True)
     st.markdown('<div class="chart-card">', unsafe_allow_html=True)
-    sec("Forecasted Demand", "Estimated daily rentals for next 7 days")
-    fig_w = go.Figure(go.Bar(
-        x=days, y=[3360,2760,1920,3720,4080,3180,3540],
-        marker_color=C['cyan'], marker_line_width=0,
-        hovertemplate='%{x}: <b>%{y:,}</b> est. rentals<extra></extra>'
-    ))
-    lay_w = {**BASE_LAYOUT}
-    lay_w['height'] = 240
-    lay_w['margin'] = dict(l=10,r=10,t=6,b=10)
-    lay_w['showlegend'] = False
-    lay_w['bargap'] = 0.3
-    fig_w.update_layout(**lay_w)
-    st.plotly_chart(fig_w, use_container_width=True, config={'displayModeBar':False})
+    sec("Forecasted Demand", f"Estimated daily rentals for next {len(days)} days")
+    fig_w = figures.cached('forecast_bars', figures.forecast_bars, days, daily)
+    st.plotly_chart(fig_w, use_container_width=True, config=CHART_CONFIG)
     st.markdown('</div>', unsafe_allow_html=True)
 
 
 # Predict Demand
 elif st.session_state.page == "Predict Demand":
+    from plotly.subplots import make_subplots
+
+    from batching import ENSEMBLE
+    from ensemble import get_ensemble
+    from features import build_features, hour_grid
+    from instrumentation import profile
+    from intervals import LEVEL, interval_counts
+    from prediction_cache import get_cache
+    from prediction import to_counts
+    from sweep import sweep
+
     # Load available models
     available_models = load_available_models()
     ensemble_info = load_ensemble_info()
@@ -623,7 +574,7 @@ elif st.session_state.page == "Predict Demand":
             
             # Add ensemble option if available
             if ensemble_info:
-                model_names.append('Ensemble (Average of All Models)')
+                model_names.append(ENSEMBLE_LABEL)
             
             selected_model_name = st.selectbox(
                 "Select Model for Prediction",
@@ -635,7 +586,7 @@ elif st.session_state.page == "Predict Demand":
         
         with model_col2:
             # Show model badge and validation score if available
-            if selected_model_name != 'Ensemble (Average of All Models)' and ensemble_info:
+            if selected_model_name != ENSEMBLE_LABEL and ensemble_info:
                 if selected_model_name in ensemble_info.get('validation_scores', {}):
                     score = ensemble_info['validation_scores'][selected_model_name]
                     st.markdown(f"""
@@ -643,13 +594,26 @@ elif st.session_state.page == "Predict Demand":
                         <span class="model-badge">RMSLE: {score:.4f}</span>
                     </div>
                     """, unsafe_allow_html=True)
-            elif selected_model_name == 'Ensemble (Average of All Models)' and ensemble_info:
+            elif selected_model_name == ENSEMBLE_LABEL and ensemble_info:
                 st.markdown(f"""
                 <div style="text-align:right;">
                     <span class="model-badge">Ensemble RMSLE: {ensemble_info.get('ensemble_rmsle', 'N/A'):.4f}</span>
                 </div>
                 """, unsafe_allow_html=True)
-        
+
+            # Load cost of the models backing this selection (paid once per process)
+            load_stats = [s for s in get_registry().stats()
+                          if s['name'] in available_models
+                          and (s['name'] == selected_model_name or selected_model_name == ENSEMBLE_LABEL)]
+            if load_stats:
+                load_ms = sum(s['load_seconds'] for s in load_stats) * 1000
+                load_mb = sum(s['memory_bytes'] for s in load_stats) / 1e6
+                st.markdown(f"""
+                <div style="text-align:right;font-size:0.7rem;color:#3a5472;margin-top:6px;">
+                    Loaded in {load_ms:,.0f} ms · {load_mb:,.1f} MB
+                </div>
+                """, unsafe_allow_html=True)
+
         st.markdown('</div>', unsafe_allow_html=True)
     else:
         st.warning("No trained models found. Please run Benchmark_solution.ipynb to train and save models first.")
@@ -683,6 +647,8 @@ elif st.session_state.page == "Predict Demand":
                                 format_func=lambda x: ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"][x],
                                 key="dow_select")
         
+        profile_request = st.checkbox("⏱  Profile this request", key="profile_toggle")
+
         # Add compare button
         compare_col1, compare_col2 = st.columns(2)
         with compare_col1:
@@ -691,52 +657,43 @@ elif st.session_state.page == "Predict Demand":
             compare_btn = st.button("📊  Compare All Models", key="compare_btn")
 
     with col_out:
-        temp_norm = normalize_temperature(temp_celsius)
-        atemp_norm = normalize_temperature(atemp_celsius)
-        humidity_norm = normalize_humidity(humidity_percent)
-        windspeed_norm = normalize_windspeed(windspeed_kmh)
-        
-        base_features = np.array([
-            season, holiday, workingday, weather,
-            temp_norm, atemp_norm, humidity_norm, windspeed_norm,
-            hour, day, month, yr, dayofweek
-        ])
+        with get_instrumentation().timer('feature_build'):
+            base_features = build_features(
+                season, holiday, workingday, weather,
+                temp_celsius, atemp_celsius, humidity_percent, windspeed_kmh,
+                hour, day, month, yr, dayofweek
+            )
         
         season_names = {1:"Spring",2:"Summer",3:"Fall",4:"Winter"}
         weather_names = {1:"Clear",2:"Cloudy",3:"Light Rain",4:"Heavy Rain"}
 
         if predict_btn:
             try:
-                if selected_model_name == 'Ensemble (Average of All Models)' and ensemble_info:
-                    # Ensemble prediction
-                    ensemble_predictions = []
-                    for model_name, model in available_models.items():
-                        pred_log = model.predict(base_features.reshape(1, -1))
-                        ensemble_predictions.append(pred_log[0])
-                    pred_log = np.mean(ensemble_predictions)
+                # One (24 x 13) batch per model, coalesced with other sessions' requests
+                # and cached as a unit; the selected hour is read off the curve
+                if selected_model_name == ENSEMBLE_LABEL and ensemble_info:
+                    curve_model = ENSEMBLE
                 else:
-                    # Single model prediction
-                    model = available_models[selected_model_name]
-                    pred_log = model.predict(base_features.reshape(1, -1))
-                
-                prediction = int(max(0, np.expm1(pred_log)[0] if isinstance(pred_log, np.ndarray) else np.expm1(pred_log)))
+                    curve_model = selected_model_name
+                with profile(profile_request) as request_profile:
+                    with get_instrumentation().timer('curve', model=curve_model):
+                        if profile_request:
+                            # Skip the cache so the profile shows the full prediction path
+                            curve_log = predict_inline(hour_grid(base_features, hours), curve_model, interval=True)
+                        else:
+                            curve_log = get_cache().curve(base_features, curve_model, hours, interval=True)
+                st.session_state.last_profile = request_profile
                 
-                # Generate hourly predictions for the selected model/ensemble
-                if selected_model_name == 'Ensemble (Average of All Models)' and ensemble_info:
-                    # For ensemble, average predictions from all models for each hour
-                    all_hours_predictions = []
-                    for hour_i in hours:
-                        hour_preds = []
-                        for model_name, model in available_models.items():
-                            temp_features = base_features.copy()
-                            temp_features[8] = hour_i
-                            pred_log_i = model.predict(temp_features.reshape(1, -1))
-                            hour_preds.append(pred_log_i[0])
-                        avg_pred_log = np.mean(hour_preds)
-                        all_hours_predictions.append(int(max(0, np.expm1(avg_pred_log))))
+                # Point, lower and upper rows from the same pass (no bounds for boosted models)
+                curve_bikes = interval_counts(curve_log)
+                all_hours_predictions = curve_bikes['count']
+                prediction = all_hours_predictions[hour]
+                lower, upper = curve_bikes['lower'][hour], curve_bikes['upper'][hour]
+                if lower is not None:
+                    range_html = (f'<div style="color:#1a4036;margin-top:4px;font-size:0.75rem;">'
+                                  f'{int(LEVEL * 100)}% range {lower:,} – {upper:,}</div>')
                 else:
-                    model = available_models[selected_model_name]
-                    all_hours_predictions = predict_for_hours(model, base_features, hours)
+                    range_html = ""
                 
                 st.markdown(f"""
                 <div class="result-card">
@@ -745,6 +702,7 @@ elif st.session_state.page == "Predict Demand":
                     </div>
                     <div class="result-num">{prediction:,}</div>
                     <div style="color:#1a4036;margin-top:8px;font-size:0.8rem;">bikes per hour</div>
+                    {range_html}
                     <div style="display:flex;gap:10px;margin-top:22px;">
                         <div style="flex:1;background:rgba(20,184,166,0.07);border-radius:10px;padding:12px;text-align:center;">
                             <div style="color:#1a4036;font-size:0.65rem;letter-spacing:.1em;text-transform:uppercase;">Season</div>
@@ -776,19 +734,22 @@ elif st.session_state.page == "Predict Demand":
         elif compare_btn:
             try:
                 # Compare all models
-                comparison_results = {}
+                comparison_results = ResultBatch(len(available_models) + 1)
                 all_predictions = {}
                 
-                for model_name, model in available_models.items():
-                    pred_log = model.predict(base_features.reshape(1, -1))
-                    pred = int(max(0, np.expm1(pred_log)[0]))
-                    comparison_results[model_name] = pred
+                # Every member scores the same row side by side; the ensemble is
+                # their weighted mean in log space, as on the Predict path
+                ensemble = get_ensemble(available_models)
+                member_logs, member_ms = ensemble.predict_members(base_features)
+                for model_name, pred_log in member_logs.items():
+                    pred = int(to_counts(pred_log)[0])
+                    comparison_results.add(model_name, pred, pred_log[0], member_ms[model_name])
                     all_predictions[model_name] = pred
                 
                 # Add ensemble if available
                 if ensemble_info:
-                    ensemble_pred = int(np.mean(list(comparison_results.values())))
-                    comparison_results['Ensemble (Average)'] = ensemble_pred
+                    ensemble_log = ensemble.combine(member_logs)
+                    comparison_results.add(ENSEMBLE_LABEL, int(to_counts(ensemble_log)[0]), ensemble_log[0])
                 
                 st.session_state.comparison_results = comparison_results
                 
@@ -809,6 +770,8 @@ elif st.session_state.page == "Predict Demand":
                     """, unsafe_allow_html=True)
                 
                 st.markdown('</div>', unsafe_allow_html=True)
+                st.caption(" · ".join(f"{name} {member_ms[name]:.1f} ms (w {ensemble.weight_map[name]:.2f})"
+                                      for name in member_logs))
                 
             except Exception as e:
                 st.error(f"Comparison error: {str(e)}")
@@ -826,43 +789,12 @@ elif st.session_state.page == "Predict Demand":
         st.markdown('<div class="chart-card">', unsafe_allow_html=True)
         sec("Hourly Demand Forecast", f"Predicted bike rentals throughout the day ({season_names[season]}, {weather_names[weather]}) using {selected_model_name}")
         
-        fig_hourly = go.Figure()
-        fig_hourly.add_trace(go.Scatter(
-            x=hours, y=all_hours_predictions,
-            name="Predicted Demand",
-            mode='lines+markers',
-            line=dict(color=C['cyan'], width=4, shape='spline'),
-            marker=dict(size=10, color=C['cyan']),
-            hovertemplate='Hour %{x:02d}:00<br><b>%{y:,}</b> bikes<extra></extra>'
-        ))
-        fig_hourly.add_trace(go.Scatter(
-            x=[hour], y=[prediction],
-            name=f"Selected Hour ({hour:02d}:00)",
-            mode='markers',
-            marker=dict(size=16, color=C['orange'], line=dict(width=3, color='white')),
-            hovertemplate='Selected: %{x:02d}:00<br><b>%{y:,}</b> bikes<extra></extra>'
-        ))
+        figure_t0 = time.perf_counter()
+        fig_hourly = figures.patched(st.session_state, 'hourly_forecast', figures.hourly_forecast,
+                                     figures.hourly_forecast_traces(all_hours_predictions, hour, prediction))
+        get_instrumentation().observe('figure', time.perf_counter() - figure_t0, figure='hourly')
         
-        lay_hourly = {**BASE_LAYOUT}
-        lay_hourly['height'] = 500
-        lay_hourly['margin'] = dict(l=80, r=40, t=40, b=100)
-        lay_hourly['xaxis'] = dict(
-            tickvals=hours, ticktext=[f"{h:02d}:00" for h in hours],
-            tickangle=-45, gridcolor=C['grid'], color=C['muted'],
-            showline=False, title="Hour of Day", title_font=dict(size=14), tickfont=dict(size=11)
-        )
-        lay_hourly['yaxis'] = dict(
-            gridcolor=C['grid'], color=C['muted'],
-            title="Predicted Rentals (bikes per hour)", title_font=dict(size=14), tickfont=dict(size=11)
-        )
-        lay_hourly['showlegend'] = True
-        lay_hourly['legend'] = dict(
-            bgcolor='rgba(0,0,0,0)', orientation='h',
-            yanchor='bottom', y=1.02, xanchor='center', x=0.5, font=dict(size=12)
-        )
-        fig_hourly.update_layout(**lay_hourly)
-        
-        st.plotly_chart(fig_hourly, use_container_width=True, config={'displayModeBar':False})
+        st.plotly_chart(fig_hourly, use_container_width=True, config=CHART_CONFIG)
         st.markdown('</div>', unsafe_allow_html=True)
     
     # Show comparison results if available
@@ -872,46 +804,77 @@ elif st.session_state.page == "Predict Demand":
         sec("Model Comparison Chart", "Visual comparison of predictions from all models")
         
         # Create comparison bar chart
-        models_list = list(st.session_state.comparison_results.keys())
-        predictions_list = list(st.session_state.comparison_results.values())
-        
-        colors = [C['cyan'], C['purple'], C['orange'], C['green'], '#94a3b8']
-        
-        fig_compare = go.Figure(go.Bar(
-            x=models_list,
-            y=predictions_list,
-            marker_color=colors[:len(models_list)],
-            marker_line_width=0,
-            text=[f"{p:,}" for p in predictions_list],
-            textposition='outside',
-            textfont=dict(size=12, color=C['text']),
-            hovertemplate='%{x}: <b>%{y:,}</b> bikes<extra></extra>'
-        ))
+        models_list = st.session_state.comparison_results.models
+        predictions_list = st.session_state.comparison_results.counts.tolist()
         
-        lay_compare = {**BASE_LAYOUT}
-        lay_compare['height'] = 400
-        lay_compare['margin'] = dict(l=60, r=40, t=40, b=100)
-        lay_compare['showlegend'] = False
-        lay_compare['bargap'] = 0.3
-        lay_compare['xaxis'] = dict(
-            tickangle=-30,
-            gridcolor=C['grid'], 
-            color=C['muted'],
-            showline=False,
-            title="Model",
-            title_font=dict(size=14)
-        )
-        lay_compare['yaxis'] = dict(
-            gridcolor=C['grid'], 
-            color=C['muted'],
-            title="Predicted Rentals (bikes per hour)",
-            title_font=dict(size=14)
-        )
-        fig_compare.update_layout(**lay_compare)
+        figure_t0 = time.perf_counter()
+        fig_compare = figures.patched(st.session_state, 'model_comparison', figures.model_comparison,
+                                      figures.model_comparison_traces(models_list, predictions_list))
+        get_instrumentation().observe('figure', time.perf_counter() - figure_t0, figure='compare')
         
-        st.plotly_chart(fig_compare, use_container_width=True, config={'displayModeBar':False})
+        st.plotly_chart(fig_compare, use_container_width=True, config=CHART_CONFIG)
         st.markdown('</div>', unsafe_allow_html=True)
 
+    # Scenario sweep around the current form values
+    st.markdown("<br>", unsafe_allow_html=True)
+    with st.expander("🧪  Scenario Sweep — how demand responds across conditions"):
+        sweep_labels = {'temp':"Temperature (°C)", 'humidity':"Humidity (%)", 'windspeed':"Wind Speed (km/h)",
+                        'hour':"Hour of Day", 'weather':"Weather"}
+        sweep_ranges = {'temp':np.arange(-5, 41, 1.0), 'humidity':np.arange(0, 101, 5.0),
+                        'windspeed':np.arange(0, 51, 2.5), 'hour':range(24), 'weather':[1,2,3,4]}
+        sweep_axes = st.multiselect("Features to sweep", list(sweep_labels), default=['temp','hour'],
+                                    format_func=sweep_labels.get, key="sweep_axes")
+        if st.button("🧪  Run Sweep", key="sweep_btn") and sweep_axes:
+            sweep_model = ENSEMBLE if selected_model_name == ENSEMBLE_LABEL else selected_model_name
+            sweep_result = sweep(base_features, {a: sweep_ranges[a] for a in sweep_axes}, sweep_model,
+                                 models=available_models)
+            st.caption(f"{sweep_result.rows:,} scenarios in {sweep_result.seconds * 1000:.0f} ms · "
+                       f"mean {sweep_result.mean:,.0f} bikes / hr · range {sweep_result.min:,.0f}–{sweep_result.max:,.0f}")
+
+            fig_pd = make_subplots(rows=1, cols=len(sweep_axes), subplot_titles=[sweep_labels[a] for a in sweep_axes])
+            for i, (axis, (values, mean)) in enumerate(sweep_result.curves.items(), start=1):
+                fig_pd.add_trace(go.Scatter(
+                    x=figures.compact(values), y=figures.compact(mean), mode='lines', line=dict(color=C['cyan'], width=2.5),
+                    hovertemplate='%{x}: <b>%{y:,.0f}</b> bikes<extra></extra>'
+                ), row=1, col=i)
+            fig_pd.update_layout(**figures.layout(height=260, margin=dict(l=10,r=10,t=30,b=10), showlegend=False))
+            st.plotly_chart(fig_pd, use_container_width=True, config=CHART_CONFIG)
+
+            if len(sweep_axes) >= 2:
+                (axis_a, axis_b), heat = next(iter(sweep_result.heatmaps.items()))
+                fig_heat = go.Figure(go.Heatmap(
+                    z=figures.compact(heat), x=figures.compact(list(sweep_ranges[axis_b])),
+                    y=figures.compact(list(sweep_ranges[axis_a])),
+                    colorscale='Teal', colorbar=dict(title="bikes"),
+                    hovertemplate=f"{sweep_labels[axis_a]} %{{y}} · {sweep_labels[axis_b]} %{{x}}<br><b>%{{z:,.0f}}</b> bikes<extra></extra>"
+                ))
+                fig_heat.update_layout(**figures.layout(
+                    height=380, margin=dict(l=10,r=10,t=6,b=10),
+                    xaxis=dict(title=sweep_labels[axis_b]), yaxis=dict(title=sweep_labels[axis_a]),
+                ))
+                st.plotly_chart(fig_heat, use_container_width=True, config=CHART_CONFIG)
+
+    # Stage latencies for this process, plus the last profiled request
+    with st.expander("⏱  Performance"):
+        stage_rows = get_instrumentation().snapshot()
+        if stage_rows:
+            st.dataframe([
+                {'stage': r['stage'], 'labels': ", ".join(f"{k}={v}" for k, v in r['labels'].items()),
+                 'count': r['count'], 'p50 ms': r.get('p50_ms'), 'p95 ms': r.get('p95_ms'), 'p99 ms': r.get('p99_ms')}
+                for r in stage_rows
+            ], hide_index=True)
+        else:
+            st.caption("No timings recorded yet.")
+        boot = startup.report()
+        if boot['cold_start_s'] is not None:
+            steps = " · ".join(f"{name} {s:.2f}s" for name, s in boot['prewarm_s'].items())
+            st.caption(f"Cold start {boot['cold_start_s']:.2f}s · prewarm "
+                       f"{'done' if boot['prewarm_done'] else 'running'}: {steps or '-'}")
+        last_profile = st.session_state.get('last_profile')
+        if last_profile is not None:
+            st.caption(f"Last profiled request: {last_profile.seconds * 1000:.1f} ms ({last_profile.kind})")
+            st.code(last_profile.text, language=None)
+
 
 # Analytics
 elif st.session_state.page == "Analytics":
@@ -922,34 +885,8 @@ elif st.session_state.page == "Analytics":
     st.markdown('<div class="chart-card">', unsafe_allow_html=True)
     sec("Monthly Rental Volume", "Total rentals per month with average temperature")
 
-    fig_m = make_subplots(specs=[[{"secondary_y": True}]])
-    fig_m.add_trace(go.Bar(
-        x=months_label, y=total_rentals, name="Total Rentals",
-        marker_color=C['cyan'], marker_line_width=0,
-        hovertemplate='%{x}: <b>%{y:,}</b><extra></extra>'
-    ), secondary_y=False)
-    fig_m.add_trace(go.Bar(
-        x=months_label, y=avg_temp, name="Avg Temp (°C)",
-        marker_color=C['orange'], marker_line_width=0,
-        hovertemplate='%{x}: <b>%{y}°C</b><extra></extra>'
-    ), secondary_y=True)
-
-    fig_m.update_layout(
-        paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)',
-        font=dict(family='Plus Jakarta Sans', color=C['text'], size=12),
-        margin=dict(l=10,r=10,t=6,b=40), height=310,
-        bargap=0.15, bargroupgap=0.05,
-        legend=dict(bgcolor='rgba(0,0,0,0)', orientation='h',
-                    yanchor='bottom', y=-0.28, xanchor='center', x=0.5,
-                    font=dict(size=12, color=C['text'])),
-        hovermode='x unified',
-        hoverlabel=dict(bgcolor='#1a2840', bordercolor='rgba(56,189,248,0.3)',
-                        font=dict(family='Plus Jakarta Sans', color='#e2ecfb', size=13))
-    )
-    fig_m.update_xaxes(gridcolor=C['grid'], color=C['muted'])
-    fig_m.update_yaxes(gridcolor=C['grid'], color=C['muted'], secondary_y=False)
-    fig_m.update_yaxes(gridcolor='rgba(0,0,0,0)', color=C['orange'], secondary_y=True)
-    st.plotly_chart(fig_m, use_container_width=True, config={'displayModeBar':False})
+    fig_m = figures.cached('monthly_volume', figures.monthly_volume, months_label, total_rentals, avg_temp)
+    st.plotly_chart(fig_m, use_container_width=True, config=CHART_CONFIG)
     st.markdown('</div>', unsafe_allow_html=True)
 
     st.markdown("<br>", unsafe_allow_html=True)
@@ -975,4 +912,8 @@ elif st.session_state.page == "Analytics":
                 <div style="font-size:0.76rem;color:#3a5472;line-height:1.5;">{body}</div>
             </div>
             """, unsafe_allow_html=True)
-            
\ No newline at end of file
+            
+
+
+# Script run time; the first run in this process is logged as the cold start
+startup.script_finished(time.perf_counter() - script_t0, st.session_state.page)
@@ -0,0 +1,234 @@
+"""Headless batch scoring for test.csv-shaped files.
+
+    python batch_score.py test.csv -o predictions.csv
+    python batch_score.py history.csv -o scores.parquet --model XGBoost --chunksize 500000
+    python batch_score.py test.csv -o all.csv --model all
+    python batch_score.py test.csv -o ranges.csv --interval
+    python batch_score.py test.csv -o riders.csv --model split
+    python batch_score.py stations.csv -o stations_pred.csv --shard-column station --city london
+
+Input is streamed in chunks, so files larger than memory are fine. A column
+store directory (``python storage.py history.csv``) can be given instead of
+a CSV and is read through memory maps without parsing.
+
+``--interval`` adds ``count_lower`` / ``count_upper`` columns with the 80%
+range from the forest's tree spread and the ensemble members' spread (see
+``intervals``), computed in the same pass as the point. Models without a
+spread leave them empty. ``--model split`` writes ``casual``, ``registered``
+and their sum ``count`` from the dual-target model (see ``riders``).
+
+``--shard-column`` groups each chunk's rows by that column (``city`` or
+``city/station`` values, or station names under ``--city``). Each group is
+scored once with its shard's models (see ``shards``), and the rows are
+written in their input order. Rows with an empty value use the flat model
+files.
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+from ensemble import get_ensemble
+from features import frame_to_features
+from intervals import interval_counts, model_interval
+from model_registry import MODEL_FILES, get_registry
+from prediction import predict_many, to_counts
+from riders import predict_split, split_counts
+from shards import get_shards, parse_shard, shard_key
+from storage import is_store, iter_frames
+
+ENSEMBLE = 'ensemble'
+ALL = 'all'
+SPLIT = 'split'
+DEFAULT_CHUNKSIZE = 100_000
+
+
+# ─────────────────────────────────────────────
+#  SCORING
+# ─────────────────────────────────────────────
+def _add_interval(out, prefix, rows):
+    bikes = interval_counts(rows)
+    out[prefix] = bikes['count']
+    out[f"{prefix}_lower"] = pd.array(bikes['lower'], dtype='Int64')
+    out[f"{prefix}_upper"] = pd.array(bikes['upper'], dtype='Int64')
+
+
+def score_frame(df, models, model=ENSEMBLE, interval=False, ensemble=None):
+    """Score one DataFrame chunk, returning datetime plus prediction column(s)"""
+    X = frame_to_features(df)
+    out = pd.DataFrame({'datetime': df['datetime'].to_numpy()})
+    if model in (ENSEMBLE, ALL):
+        ensemble = ensemble or get_ensemble(models)
+    if interval and model == ENSEMBLE:
+        _add_interval(out, 'count', ensemble.predict_interval(X))
+    elif interval and model != ALL:
+        _add_interval(out, 'count', model_interval(models[model], X))
+    elif model == SPLIT:
+        for column, counts in split_counts(predict_split(models[SPLIT], X)).items():
+            out[column] = counts
+    elif model == ENSEMBLE:
+        out['count'] = to_counts(ensemble.predict_log(X))
+    elif model == ALL:
+        per_model, _ = ensemble.predict_members(X)
+        for name, pred_log in per_model.items():
+            out[name] = to_counts(pred_log)
+        out['Ensemble'] = to_counts(ensemble.combine(per_model))
+    else:
+        out['count'] = to_counts(predict_many({model: models[model]}, X)[model])
+    return out
+
+
+class _ParquetSink:
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Parquet output requires pyarrow (pip install pyarrow)")
+        self._pa = pa
+        self._pq = pq
+        self._path = path
+        self._writer = None
+
+    def write(self, df):
+        table = self._pa.Table.from_pandas(df, preserve_index=False)
+        if self._writer is None:
+            self._writer = self._pq.ParquetWriter(self._path, table.schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+class _CsvSink:
+    def __init__(self, path):
+        self._f = open(path, 'w', newline='')
+        self._header = True
+
+    def write(self, df):
+        df.to_csv(self._f, header=self._header, index=False)
+        self._header = False
+
+    def close(self):
+        self._f.close()
+
+
+def _open_sink(path):
+    if os.path.splitext(path)[1].lower() in ('.parquet', '.pq'):
+        return _ParquetSink(path)
+    return _CsvSink(path)
+
+
+def _models_for(model, shard=None):
+    """``(models, ensemble or None)`` to score ``model`` with, from the flat files or a shard"""
+    if shard is None:
+        registry = get_registry()
+    else:
+        try:
+            registry = get_shards().registry(shard)
+        except KeyError:
+            raise SystemExit(f"Shard '{shard}' has no models")
+    if model == SPLIT:
+        split_model = registry.load_split_model()
+        models = {SPLIT: split_model} if split_model is not None else {}
+    else:
+        models = registry.load_models()
+    where = f" in shard '{shard}'" if shard is not None else ""
+    if not models:
+        raise SystemExit(f"No trained models found{where}.")
+    if model not in (ENSEMBLE, ALL) and model not in models:
+        raise SystemExit(f"Model '{model}' is not available{where} (have: {', '.join(models)})")
+    ensemble = get_shards().ensemble(shard) if shard is not None and model in (ENSEMBLE, ALL) else None
+    return models, ensemble
+
+
+def score_sharded(df, shard_column, model=ENSEMBLE, interval=False, city=None, flat_models=None):
+    """Score a chunk shard by shard (one pass per shard's models), keeping row order"""
+    parts = []
+    for value, group in df.groupby(shard_column, sort=False, dropna=False):
+        value = None if pd.isna(value) or value == '' else str(value)
+        try:
+            shard = shard_key(city, value) if city and value is not None else parse_shard(value)
+        except ValueError as e:
+            raise SystemExit(str(e))
+        if shard is None and flat_models is not None:
+            models, ensemble = flat_models, None
+        else:
+            models, ensemble = _models_for(model, shard)
+        out = score_frame(group, models, model, interval, ensemble)
+        out.insert(1, shard_column, group[shard_column].to_numpy())
+        out.index = group.index
+        parts.append(out)
+    return pd.concat(parts).loc[df.index].reset_index(drop=True)
+
+
+def score_file(input_path, output_path, model=ENSEMBLE, chunksize=DEFAULT_CHUNKSIZE, models=None, log=None,
+               interval=False, shard_column=None, city=None):
+    """Stream ``input_path`` through the models into ``output_path``.
+
+    Returns ``{'rows', 'seconds', 'rows_per_sec'}``.
+    """
+    if interval and model == SPLIT:
+        raise SystemExit(f"--interval is not available for '{SPLIT}'")
+    if interval and model == ALL:
+        raise SystemExit(f"--interval needs a single model or '{ENSEMBLE}', not '{ALL}'")
+    if shard_column is not None and model == ALL:
+        # Shards may hold different families, so the columns would vary by chunk
+        raise SystemExit(f"--shard-column needs a single model or '{ENSEMBLE}', not '{ALL}'")
+    if models is not None and model not in (ENSEMBLE, ALL) and model not in models:
+        raise SystemExit(f"Model '{model}' is not available (have: {', '.join(models)})")
+    if models is None and shard_column is None:
+        models, _ = _models_for(model)
+
+    sink = _open_sink(output_path)
+    rows = 0
+    t0 = time.perf_counter()
+    try:
+        chunks = iter_frames(input_path, chunksize) if is_store(input_path) else \
+            pd.read_csv(input_path, chunksize=chunksize)
+        for chunk in chunks:
+            if shard_column is not None:
+                if shard_column not in chunk:
+                    raise SystemExit(f"No '{shard_column}' column in {input_path}")
+                sink.write(score_sharded(chunk, shard_column, model, interval, city, models))
+            else:
+                sink.write(score_frame(chunk, models, model, interval))
+            rows += len(chunk)
+            if log:
+                elapsed = time.perf_counter() - t0
+                log(f"{rows:,} rows · {rows / elapsed:,.0f} rows/s")
+    finally:
+        sink.close()
+    seconds = time.perf_counter() - t0
+    return {'rows': rows, 'seconds': seconds, 'rows_per_sec': rows / seconds if seconds else 0.0}
+
+
+# ─────────────────────────────────────────────
+#  CLI
+# ─────────────────────────────────────────────
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a test.csv-shaped file with the bike demand models")
+    parser.add_argument('input', help="CSV (or column store) with datetime, season, holiday, workingday, weather, temp, atemp, humidity, windspeed")
+    parser.add_argument('-o', '--output', required=True, help="output path (.csv or .parquet)")
+    parser.add_argument('--model', default=ENSEMBLE,
+                        help=f"one of: {', '.join(MODEL_FILES)}, '{ENSEMBLE}', '{ALL}' or '{SPLIT}' (default: {ENSEMBLE})")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE, help="rows per chunk")
+    parser.add_argument('--interval', action='store_true', help="add count_lower / count_upper (80%% range) columns")
+    parser.add_argument('--shard-column', help="score each row with the shard named in this column (see shards.py)")
+    parser.add_argument('--city', help="city of the --shard-column station names")
+    parser.add_argument('-q', '--quiet', action='store_true', help="only print the final summary")
+    args = parser.parse_args(argv)
+
+    log = None if args.quiet else (lambda msg: print(msg, file=sys.stderr))
+    if args.city and not args.shard_column:
+        parser.error("--city needs --shard-column")
+    stats = score_file(args.input, args.output, args.model, args.chunksize, log=log, interval=args.interval,
+                       shard_column=args.shard_column, city=args.city)
+    print(f"Scored {stats['rows']:,} rows in {stats['seconds']:.2f}s ({stats['rows_per_sec']:,.0f} rows/s) -> {args.output}")
+
+
+if __name__ == '__main__':
+    main()
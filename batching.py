@@ -0,0 +1,305 @@
+import collections
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from ensemble import get_ensemble, run_members
+from features import N_FEATURES
+from intervals import bounds, predict_log_spread
+from model_registry import get_registry
+from prediction import predict_log
+from records import model_input
+from riders import predict_split
+from shards import get_shards
+
+ENSEMBLE = 'ensemble'
+SPLIT = 'split'
+
+BATCH_WINDOW_MS = 2.0
+MAX_BATCH_ROWS = 4096
+METRICS_WINDOW = 1000
+
+
+class _Request:
+    __slots__ = ('X', 'model', 'interval', 'shard', 'future', 'enqueued')
+
+    def __init__(self, X, model, interval=False, shard=None):
+        self.X = X
+        self.model = model
+        self.interval = interval
+        self.shard = shard
+        self.future = Future()
+        self.enqueued = time.perf_counter()
+
+
+def _job_name(shard, name):
+    return name if shard is None else f"{shard}:{name}"
+
+
+def _percentiles(values):
+    if not values:
+        return {'p50': None, 'p95': None, 'max': None}
+    arr = np.fromiter(values, dtype=float)
+    return {'p50': float(np.percentile(arr, 50)), 'p95': float(np.percentile(arr, 95)), 'max': float(arr.max())}
+
+
+# ─────────────────────────────────────────────
+#  SCHEDULER
+# ─────────────────────────────────────────────
+class BatchScheduler:
+    """Coalesce concurrent predictions into one vectorized call per model.
+
+    Callers (Streamlit sessions, server handlers) ``submit`` a feature
+    matrix and get a ``Future`` of log predictions. A single worker thread
+    waits up to ``window_ms`` after the first pending request (or until
+    ``max_rows`` are queued), stacks the rows each model needs, predicts
+    once per model (the models side by side on the ensemble's thread pool)
+    and scatters the slices back. Ensemble requests get the weighted
+    log-space mean from ``ensemble.EnsemblePredictor``.
+
+    ``interval=True`` requests get ``(3, n)`` point / lower / upper rows
+    (see ``intervals``). When a batch holds one, forests are evaluated tree
+    by tree in that same pass, so the spread costs no extra model call.
+
+    ``'split'`` requests go to the dual-target model (see ``riders``) and
+    get ``(n, 2)`` casual / registered log predictions; it runs alongside
+    the other models in the same pass.
+
+    ``shard`` (``'city'`` or ``'city/station'``, see ``shards``) routes a
+    request to that shard's models instead of the flat ones. Rows are
+    grouped by shard and model, so each shard's models run once per batch.
+    Requests for a shard that is not loaded yet wait for it off the worker
+    thread and rejoin a later batch.
+    """
+
+    def __init__(self, window_ms=BATCH_WINDOW_MS, max_rows=MAX_BATCH_ROWS, load_models=None):
+        self.window_s = window_ms / 1000.0
+        self.max_rows = max_rows
+        self._load_models = load_models or get_registry().load_models
+        self._pending = []
+        self._pending_rows = 0
+        self._cond = threading.Condition()
+        self._started = time.perf_counter()
+
+        self._batch_rows = collections.deque(maxlen=METRICS_WINDOW)
+        self._batch_requests = collections.deque(maxlen=METRICS_WINDOW)
+        self._queue_wait_ms = collections.deque(maxlen=METRICS_WINDOW)
+        self._predict_ms = collections.deque(maxlen=METRICS_WINDOW)
+        self._totals = {'batches': 0, 'requests': 0, 'rows': 0, 'predict_calls': 0, 'errors': 0}
+
+        self._worker = threading.Thread(target=self._run, name='batch-scheduler', daemon=True)
+        self._worker.start()
+
+    def submit(self, X, model=ENSEMBLE, interval=False, shard=None):
+        """Queue rows for ``model`` (a model name, ``'ensemble'`` or ``'split'``) of ``shard``.
+
+        Rows that are not 13 finite features fail this caller's future right
+        away instead of the batch they would have joined.
+        """
+        X = model_input(X)
+        request = _Request(X, model, interval, shard)
+        if X.ndim != 2 or X.shape[1] != N_FEATURES:
+            request.future.set_exception(ValueError(f"expected {N_FEATURES} feature columns, got {X.shape[-1]}"))
+            return request.future
+        if not np.isfinite(X).all():
+            request.future.set_exception(ValueError("feature rows hold NaN or infinite values"))
+            return request.future
+        with self._cond:
+            self._pending.append(request)
+            self._pending_rows += len(X)
+            self._cond.notify()
+        return request.future
+
+    def predict(self, X, model=ENSEMBLE, timeout=None, interval=False, shard=None):
+        """Blocking ``submit``: returns log predictions for ``X``"""
+        return self.submit(X, model, interval, shard).result(timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                deadline = self._pending[0].enqueued + self.window_s
+                while self._pending_rows < self.max_rows:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, self._pending, self._pending_rows = self._pending, [], 0
+            batch = self._defer_cold(batch)
+            if batch:
+                self._dispatch(batch)
+
+    def _defer_cold(self, batch):
+        """Requests whose shard is loaded; the others wait for a background load"""
+        cold = collections.defaultdict(list)
+        ready = []
+        shards = get_shards()
+        for request in batch:
+            if request.shard is not None and not shards.is_loaded(request.shard):
+                cold[request.shard].append(request)
+            else:
+                ready.append(request)
+        for shard, requests in cold.items():
+            shards.prefetch(shard).add_done_callback(lambda loaded, requests=requests: self._requeue(requests, loaded))
+        return ready
+
+    def _requeue(self, requests, loaded):
+        error = loaded.exception()
+        if error is not None:
+            for request in requests:
+                if not request.future.cancelled():
+                    request.future.set_exception(error)
+            with self._cond:
+                self._totals['errors'] += len(requests)
+            return
+        # They keep their enqueue time, so they go out with the next batch
+        with self._cond:
+            self._pending.extend(requests)
+            self._pending_rows += sum(len(r.X) for r in requests)
+            self._cond.notify()
+
+    def _dispatch(self, batch):
+        started = time.perf_counter()
+        try:
+            # Each shard's models (and ensemble) are looked up once per batch; a
+            # shard that fails to load only fails its own requests
+            shard_models, ensembles, split_models, failed = {}, {}, {}, {}
+            for shard in {request.shard for request in batch}:
+                try:
+                    if shard is None:
+                        shard_models[None] = self._load_models()
+                        ensembles[None] = get_ensemble(shard_models[None])
+                    else:
+                        shard_models[shard] = get_shards().load_models(shard)
+                        ensembles[shard] = get_shards().ensemble(shard)
+                    if any(r.shard == shard and r.model == SPLIT for r in batch):
+                        registry = get_registry() if shard is None else get_shards().registry(shard)
+                        split_models[shard] = registry.load_split_model()
+                except Exception as e:
+                    failed[shard] = e
+
+            rows_by_job = collections.defaultdict(list)
+            job_models, job_names = {}, {}
+            for i, request in enumerate(batch):
+                if request.shard in failed:
+                    continue
+                models = shard_models[request.shard]
+                if request.model == SPLIT:
+                    split_model = split_models[request.shard]
+                    needed = {SPLIT: split_model} if split_model is not None else {}
+                elif request.model == ENSEMBLE:
+                    needed = models
+                else:
+                    needed = {request.model: models[request.model]} if request.model in models else {}
+                for name, model in needed.items():
+                    job = _job_name(request.shard, name)
+                    job_models[job], job_names[job] = model, (request.shard, name)
+                    rows_by_job[job].append(i)
+
+            # One predict per (shard, model) over the rows every request needs
+            # from it, the models running concurrently
+            jobs = {job: (job_models[job], np.vstack([batch[i].X for i in idx]))
+                    for job, idx in rows_by_job.items()}
+            spread = any(request.interval for request in batch)
+            point = predict_log_spread if spread else predict_log
+            split_ids = {id(model) for model in split_models.values() if model is not None}
+
+            def predict(model, X):
+                return predict_split(model, X) if id(model) in split_ids else point(model, X)
+
+            t0 = time.perf_counter()
+            preds, timings = run_members(jobs, predict=predict) if jobs else ({}, {})
+            predict_ms = (time.perf_counter() - t0) * 1000
+            predict_calls = len(jobs)
+            for job, ms in timings.items():
+                shard, name = job_names[job]
+                ensembles[shard].record({name: ms})
+            per_request = [dict() for _ in batch]
+            per_request_var = [dict() for _ in batch]
+            for job, pred in preds.items():
+                name = job_names[job][1]
+                pred, var = pred if spread and name != SPLIT else (pred, None)
+                start = 0
+                for i in rows_by_job[job]:
+                    stop = start + len(batch[i].X)
+                    per_request[i][name] = pred[start:stop]
+                    per_request_var[i][name] = None if var is None else var[start:stop]
+                    start = stop
+        except Exception as e:
+            if len(batch) > 1:
+                # Retry each request on its own, so only the one that fails gets the error
+                for request in batch:
+                    self._dispatch([request])
+                return
+            for request in batch:
+                if not request.future.cancelled():
+                    request.future.set_exception(e)
+            self._record(batch, started, 0, 0.0, errors=len(batch))
+            return
+
+        errors = 0
+        for request, preds, variances in zip(batch, per_request, per_request_var):
+            if request.future.cancelled():
+                continue
+            if request.shard in failed:
+                errors += 1
+                request.future.set_exception(failed[request.shard])
+                continue
+            ensemble = ensembles[request.shard]
+            if request.model == ENSEMBLE and preds:
+                request.future.set_result(ensemble.interval(preds, variances) if request.interval
+                                          else ensemble.combine(preds))
+            elif request.model == SPLIT and preds:
+                request.future.set_result(preds[SPLIT])
+            elif request.model in preds:
+                request.future.set_result(bounds(preds[request.model], variances[request.model])
+                                          if request.interval else preds[request.model])
+            else:
+                errors += 1
+                request.future.set_exception(KeyError(request.model))
+        self._record(batch, started, predict_calls, predict_ms, errors)
+
+    def _record(self, batch, started, predict_calls, predict_ms, errors):
+        with self._cond:
+            self._batch_rows.append(sum(len(r.X) for r in batch))
+            self._batch_requests.append(len(batch))
+            self._queue_wait_ms.extend((started - r.enqueued) * 1000 for r in batch)
+            self._predict_ms.append(predict_ms)
+            self._totals['batches'] += 1
+            self._totals['requests'] += len(batch)
+            self._totals['rows'] += self._batch_rows[-1]
+            self._totals['predict_calls'] += predict_calls
+            self._totals['errors'] += errors
+
+    def metrics(self):
+        """Batch size, queue wait and throughput over recent batches"""
+        with self._cond:
+            elapsed = time.perf_counter() - self._started
+            totals = dict(self._totals)
+            return {
+                **totals,
+                'pending_rows': self._pending_rows,
+                'batch_rows': _percentiles(self._batch_rows),
+                'batch_requests': _percentiles(self._batch_requests),
+                'queue_wait_ms': _percentiles(self._queue_wait_ms),
+                'predict_ms': _percentiles(self._predict_ms),
+                'rows_per_sec': totals['rows'] / elapsed if elapsed else 0.0,
+                'requests_per_batch': totals['requests'] / totals['batches'] if totals['batches'] else 0.0,
+            }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Return the scheduler shared by every session in this process"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = BatchScheduler()
+    return _scheduler
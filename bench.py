@@ -0,0 +1,258 @@
+"""Benchmark suite for model loading, inference and page rendering.
+
+    python bench.py run                      # run everything, append to history
+    python bench.py run --filter predict     # only benchmarks whose name matches
+    python bench.py compare main my-branch   # latest run of each, side by side
+    python bench.py list
+
+Each benchmark is timed asv-style: the callable is repeated until a
+measurement takes at least ``MIN_SAMPLE_S``, then sampled ``--repeat``
+times; the min, median and mean per call are recorded. Every run is
+appended to ``bench_history.jsonl`` with the git branch, commit and
+whether the tree was dirty, so runs on different branches can be compared
+locally.
+
+Benchmarks:
+
+    load:<model>          unpickling each bike_model_*.pkl
+    predict_1:<model>     one-row predict per model
+    predict_4096:<model>  4096-row batched predict per model (rows/s reported)
+    ensemble_1/_4096      weighted ensemble over all members
+    curve_24h             the Predict page's 24-hour ensemble curve
+    figure:hourly_*       building vs patching the hourly chart, and its JSON
+    batch_score           scoring test.csv end to end
+    page_warm:<name>      rerunning app.py for the Dashboard / Analytics pages with
+                          the process-wide figures and rollups already built
+    page_cold:<name>      the same with those caches dropped first, so building
+                          the figures and loading the rollups is timed too
+"""
+import argparse
+import json
+import os
+import pickle
+import platform
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+import plotly.io as pio
+
+import figures
+from batch_score import score_file
+from ensemble import EnsemblePredictor
+from features import FEATURE_INDEX, build_features, hour_grid
+from model_registry import MODEL_FILES, get_registry
+from prediction import predict_log
+
+HISTORY_FILE = 'bench_history.jsonl'
+TEST_FILE = 'test.csv'
+MIN_SAMPLE_S = 0.2
+DEFAULT_REPEAT = 5
+BATCH_ROWS = 4096
+
+# The Predict Demand form's defaults
+BASE_FEATURES = build_features(2, 0, 1, 1, 20.0, 20.0, 60.0, 10.0, 17, 15, 6, 1, 2)
+
+
+# ─────────────────────────────────────────────
+#  TIMING
+# ─────────────────────────────────────────────
+def measure(fn, repeat=DEFAULT_REPEAT, min_sample_s=MIN_SAMPLE_S):
+    """Per-call seconds of ``fn``: ``{'min', 'median', 'mean', 'number', 'repeat'}``"""
+    fn()  # warm-up
+    number = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - t0
+        if elapsed >= min_sample_s or number >= 1_000_000:
+            break
+        number *= 10 if elapsed < min_sample_s / 10 else 2
+    samples = [elapsed / number]
+    for _ in range(repeat - 1):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - t0) / number)
+    return {'min': min(samples), 'median': float(np.median(samples)), 'mean': float(np.mean(samples)),
+            'number': number, 'repeat': repeat}
+
+
+def _git(*args):
+    try:
+        return subprocess.run(['git', *args], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def git_state():
+    return {
+        'branch': _git('rev-parse', '--abbrev-ref', 'HEAD'),
+        'commit': _git('rev-parse', '--short', 'HEAD'),
+        'dirty': bool(_git('status', '--porcelain', '--untracked-files=no')),
+    }
+
+
+# ─────────────────────────────────────────────
+#  BENCHMARKS
+# ─────────────────────────────────────────────
+def collect(models):
+    """``[(name, fn, rows per call)]`` for every benchmark that can run here"""
+    benches = []
+    for name, filename in MODEL_FILES.items():
+        if os.path.exists(filename) and name in models:
+            with open(filename, 'rb') as f:
+                blob = f.read()
+            benches.append((f'load:{name}', lambda blob=blob: pickle.loads(blob), None))
+
+    X1 = BASE_FEATURES.reshape(1, -1)
+    XB = np.tile(BASE_FEATURES, (BATCH_ROWS, 1))
+    XB[:, FEATURE_INDEX['hour']] = np.arange(BATCH_ROWS) % 24
+    for name, model in models.items():
+        benches.append((f'predict_1:{name}', lambda m=model: predict_log(m, X1), 1))
+        benches.append((f'predict_{BATCH_ROWS}:{name}', lambda m=model: predict_log(m, XB), BATCH_ROWS))
+
+    if models:
+        ensemble = EnsemblePredictor(models, get_registry().load_ensemble_weights())
+        curve = hour_grid(BASE_FEATURES, range(24))
+        benches.append(('ensemble_1', lambda: ensemble.predict_log(X1), 1))
+        benches.append((f'ensemble_{BATCH_ROWS}', lambda: ensemble.predict_log(XB), BATCH_ROWS))
+        benches.append(('curve_24h', lambda: ensemble.predict_log(curve), 24))
+        if os.path.exists(TEST_FILE):
+            out = os.path.join(tempfile.gettempdir(), 'bench_scores.csv')
+            rows = sum(1 for _ in open(TEST_FILE)) - 1
+            benches.append(('batch_score', lambda: score_file(TEST_FILE, out, models=models), rows))
+
+    # Figure construction vs patching a session's skeleton, and serializing the result
+    counts = np.arange(24) * 10
+    store = {}
+    benches.append(('figure:hourly_build', lambda: figures.hourly_forecast().update(
+        data=figures.hourly_forecast_traces(counts, 17, 170)), None))
+    benches.append(('figure:hourly_patch', lambda: figures.patched(
+        store, 'hourly_forecast', figures.hourly_forecast, figures.hourly_forecast_traces(counts, 17, 170)), None))
+    benches.append(('figure:hourly_json', lambda: pio.to_json(figures.patched(
+        store, 'hourly_forecast', figures.hourly_forecast), validate=False), None))
+
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        AppTest = None
+    if AppTest is not None:
+        import aggregates
+
+        def run_page(page, cold=False):
+            if cold:
+                # Figures and rollups are otherwise process-wide and warm after the first run
+                figures.clear()
+                aggregates.clear()
+            at = AppTest.from_file('app.py', default_timeout=120)
+            at.session_state.page = page
+            at.run()
+            if at.exception:
+                raise RuntimeError(f"{page} page failed: {at.exception}")
+
+        for page in ('Dashboard', 'Analytics'):
+            benches.append((f'page_warm:{page}', lambda page=page: run_page(page), None))
+            benches.append((f'page_cold:{page}', lambda page=page: run_page(page, cold=True), None))
+    return benches
+
+
+def run(pattern=None, repeat=DEFAULT_REPEAT, log=print):
+    models = get_registry().load_models()
+    results = {}
+    for name, fn, rows in collect(models):
+        if pattern and pattern not in name:
+            continue
+        stats = measure(fn, repeat)
+        if rows:
+            stats['rows_per_sec'] = rows / stats['median']
+        results[name] = stats
+        rate = f" · {stats['rows_per_sec']:>12,.0f} rows/s" if rows else ''
+        log(f"  {name:32s} {stats['median'] * 1000:10.3f} ms (min {stats['min'] * 1000:.3f}){rate}")
+    return results
+
+
+# ─────────────────────────────────────────────
+#  HISTORY
+# ─────────────────────────────────────────────
+def save(results, path=HISTORY_FILE):
+    record = {'time': time.time(), **git_state(), 'python': platform.python_version(),
+              'machine': platform.machine(), 'cpus': os.cpu_count(), 'results': results}
+    with open(path, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+    return record
+
+
+def load_history(path=HISTORY_FILE):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def latest(history, ref):
+    """Most recent record whose branch equals ``ref`` or whose commit starts with it"""
+    for record in reversed(history):
+        if record.get('branch') == ref or (record.get('commit') or '').startswith(ref):
+            return record
+    return None
+
+
+def compare(base, head, log=print):
+    names = sorted(set(base['results']) | set(head['results']))
+    labels = [f"{r['branch']}@{r['commit']}" for r in (base, head)]
+    log(f"  {'benchmark':32s} {labels[0]:>18s} {labels[1]:>18s}   ratio")
+    for name in names:
+        a, b = base['results'].get(name), head['results'].get(name)
+        if a is None or b is None:
+            cells = ['-' if r is None else '%.3f ms' % (r['median'] * 1000) for r in (a, b)]
+            log(f"  {name:32s} {cells[0]:>18s} {cells[1]:>18s}")
+            continue
+        ratio = b['median'] / a['median'] if a['median'] else float('nan')
+        flag = '  slower' if ratio > 1.1 else '  faster' if ratio < 0.9 else ''
+        log(f"  {name:32s} {a['median'] * 1000:15.3f} ms {b['median'] * 1000:15.3f} ms {ratio:6.2f}x{flag}")
+
+
+# ─────────────────────────────────────────────
+#  CLI
+# ─────────────────────────────────────────────
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark model loading, inference and page rendering")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_run = sub.add_parser('run', help="run the benchmarks")
+    p_run.add_argument('--filter', help="only benchmarks whose name contains this")
+    p_run.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    p_run.add_argument('--no-save', action='store_true', help=f"don't append to {HISTORY_FILE}")
+    p_cmp = sub.add_parser('compare', help="compare the latest runs of two branches/commits")
+    p_cmp.add_argument('base')
+    p_cmp.add_argument('head', nargs='?', help="default: the latest run")
+    sub.add_parser('list', help="list recorded runs")
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        state = git_state()
+        print(f"Benchmarking {state['branch']}@{state['commit']}{' (dirty)' if state['dirty'] else ''}")
+        results = run(args.filter, args.repeat)
+        if not results:
+            raise SystemExit("No benchmarks ran (no models found?).")
+        if not args.no_save:
+            save(results)
+            print(f"Appended to {HISTORY_FILE}")
+    elif args.command == 'compare':
+        history = load_history()
+        base = latest(history, args.base)
+        head = latest(history, args.head) if args.head else (history[-1] if history else None)
+        if base is None or head is None:
+            raise SystemExit("No recorded run matches; see `python bench.py list`.")
+        compare(base, head)
+    else:
+        for record in load_history():
+            stamp = time.strftime('%Y-%m-%d %H:%M', time.localtime(record['time']))
+            print(f"{stamp}  {record['branch']}@{record['commit']}{'*' if record['dirty'] else ' '} "
+                  f"{len(record['results'])} benchmarks")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+"""Time-series cross-validation for the bike demand models.
+
+    python cv.py                                  # all models, 4 expanding folds
+    python cv.py --window rolling --train-months 12 --folds 6
+    python cv.py --write-info                     # update bike_ensemble_info.pkl
+
+Folds are calendar months: each validates on one month and trains only on
+earlier months (all of them for ``expanding``, the last ``train_months``
+for ``rolling``), so no future hours leak into training. The derived
+feature matrix and fold indices are cached on disk keyed by the source
+file's size and mtime, and (model, fold) fits run in a process pool.
+
+Scores are reported per fold and per model; ``as_validation_scores``
+returns the ``{'validation_scores', 'ensemble_rmsle'}`` shape the app
+reads from ``bike_ensemble_info.pkl``.
+"""
+import argparse
+import hashlib
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from ensemble import EnsemblePredictor
+from features import FEATURE_INDEX
+from model_registry import ENSEMBLE_INFO_FILE, MODEL_FILES, get_registry
+from train import TRAIN_FILE, load_training_data, make_model, rmsle
+
+CACHE_DIR = os.path.join('models', 'cache')
+
+
+# ─────────────────────────────────────────────
+#  FOLDS
+# ─────────────────────────────────────────────
+def month_keys(X):
+    """Running month number (yr * 12 + month) for every row"""
+    return (X[:, FEATURE_INDEX['yr']] * 12 + X[:, FEATURE_INDEX['month']]).astype(np.int64)
+
+
+def month_splits(X, n_folds=4, window='expanding', train_months=None):
+    """``[(train_idx, val_idx), ...]`` validating on each of the last ``n_folds`` months"""
+    keys = month_keys(X)
+    months = np.unique(keys)
+    folds = []
+    for month in months[-n_folds:]:
+        train_mask = keys < month
+        if window == 'rolling':
+            train_mask &= keys >= month - (train_months or 12)
+        train_idx = np.flatnonzero(train_mask)
+        val_idx = np.flatnonzero(keys == month)
+        if len(train_idx) and len(val_idx):
+            folds.append((train_idx, val_idx))
+    return folds
+
+
+# ─────────────────────────────────────────────
+#  FEATURE / FOLD CACHE
+# ─────────────────────────────────────────────
+def _source_key(path, *extra):
+    st = os.stat(path)
+    raw = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}|{'|'.join(map(str, extra))}"
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+
+def cached_training_data(path, cache_dir=CACHE_DIR):
+    """``(X, y)`` for ``path``, derived once and then memory-mapped from .npy"""
+    key = _source_key(path)
+    x_path = os.path.join(cache_dir, f'{key}.X.npy')
+    y_path = os.path.join(cache_dir, f'{key}.y.npy')
+    if not (os.path.exists(x_path) and os.path.exists(y_path)):
+        X, y = load_training_data(path)
+        os.makedirs(cache_dir, exist_ok=True)
+        for arr, dst in ((X, x_path), (y, y_path)):
+            tmp = dst + '.tmp.npy'
+            np.save(tmp, arr)
+            os.replace(tmp, dst)
+    return np.load(x_path, mmap_mode='r'), np.load(y_path, mmap_mode='r')
+
+
+def cached_folds(path, X, n_folds=4, window='expanding', train_months=None, cache_dir=CACHE_DIR):
+    """Fold indices for ``path``, computed once per (file state, fold spec)"""
+    key = _source_key(path, n_folds, window, train_months)
+    fold_path = os.path.join(cache_dir, f'{key}.folds.npz')
+    if os.path.exists(fold_path):
+        with np.load(fold_path) as z:
+            return [(z[f'train{i}'], z[f'val{i}']) for i in range(int(z['n']))]
+    folds = month_splits(X, n_folds, window, train_months)
+    os.makedirs(cache_dir, exist_ok=True)
+    arrays = {'n': np.int64(len(folds))}
+    for i, (train_idx, val_idx) in enumerate(folds):
+        arrays[f'train{i}'] = train_idx
+        arrays[f'val{i}'] = val_idx
+    tmp = fold_path + '.tmp.npz'
+    np.savez(tmp, **arrays)
+    os.replace(tmp, fold_path)
+    return folds
+
+
+# ─────────────────────────────────────────────
+#  ENGINE
+# ─────────────────────────────────────────────
+_worker_data = {}
+
+
+def _init_worker(X, y, folds):
+    _worker_data.update(X=np.asarray(X), y=np.asarray(y), folds=folds)
+
+
+def _fit_fold(name, fold, n_jobs, overrides):
+    X, y = _worker_data['X'], _worker_data['y']
+    train_idx, val_idx = _worker_data['folds'][fold]
+    t0 = time.perf_counter()
+    model = make_model(name, n_jobs, **overrides)
+    model.fit(X[train_idx], y[train_idx])
+    return name, fold, np.asarray(model.predict(X[val_idx]), dtype=float), time.perf_counter() - t0
+
+
+def cross_validate(X, y, folds, model_names=None, workers=None, overrides=None, log=print, weights=None):
+    """Fit every (model, fold) pair in parallel.
+
+    Returns ``{'folds': [{model: rmsle, ..., 'Ensemble': rmsle}], 'seconds': {model: total fit s}}``;
+    the ensemble combines the members with ``weights`` (the contents of
+    ``bike_ensemble_weights.pkl``; None weighs them equally), as the app does.
+    """
+    model_names = list(model_names or MODEL_FILES)
+    overrides = overrides or {}
+    workers = workers or os.cpu_count() or 1
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    preds = [dict() for _ in folds]
+    seconds = {name: 0.0 for name in model_names}
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(X, y, folds)) as pool:
+        futures = [pool.submit(_fit_fold, name, i, threads, overrides.get(name, {}))
+                   for i in range(len(folds)) for name in model_names]
+        for future in futures:
+            name, fold, pred, fit_s = future.result()
+            preds[fold][name] = pred
+            seconds[name] += fit_s
+
+    y = np.asarray(y)
+    ensemble = EnsemblePredictor(dict.fromkeys(model_names), weights)
+    per_fold = []
+    for (_, val_idx), fold_preds in zip(folds, preds):
+        scores = {name: rmsle(y[val_idx], fold_preds[name]) for name in model_names}
+        scores['Ensemble'] = rmsle(y[val_idx], ensemble.combine(fold_preds))
+        per_fold.append(scores)
+        if log:
+            log("  " + " · ".join(f"{k} {v:.4f}" for k, v in scores.items()) + f" ({len(val_idx):,} rows)")
+    return {'folds': per_fold, 'seconds': seconds}
+
+
+def as_validation_scores(result):
+    """Mean per-model RMSLE in the shape of ``ensemble_info``"""
+    names = [k for k in result['folds'][0] if k != 'Ensemble']
+    return {
+        'validation_scores': {n: float(np.mean([f[n] for f in result['folds']])) for n in names},
+        'ensemble_rmsle': float(np.mean([f['Ensemble'] for f in result['folds']])),
+        'cv_fold_scores': result['folds'],
+    }
+
+
+def write_ensemble_info(scores, path=ENSEMBLE_INFO_FILE):
+    """Merge CV scores into the ensemble info file the app reads"""
+    info = {}
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            info = pickle.load(f)
+    info.update(scores)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        pickle.dump(info, f)
+    os.replace(tmp, path)
+
+
+# ─────────────────────────────────────────────
+#  CLI
+# ─────────────────────────────────────────────
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time-series cross-validation by month")
+    parser.add_argument('--data', default=TRAIN_FILE)
+    parser.add_argument('--models', help=f"comma-separated subset of: {', '.join(MODEL_FILES)}")
+    parser.add_argument('--folds', type=int, default=4, help="validation months")
+    parser.add_argument('--window', choices=['expanding', 'rolling'], default='expanding')
+    parser.add_argument('--train-months', type=int, default=12, help="training months for --window rolling")
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--write-info', action='store_true', help=f"merge scores into {ENSEMBLE_INFO_FILE}")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    X, y = cached_training_data(args.data)
+    folds = cached_folds(args.data, X, args.folds, args.window, args.train_months)
+    print(f"{len(X):,} rows · {len(folds)} {args.window} folds · prepared in {time.perf_counter() - t0:.2f}s")
+
+    model_names = [m.strip() for m in args.models.split(',')] if args.models else None
+    # The ensemble is scored with the published weights, i.e. as it is served
+    result = cross_validate(X, y, folds, model_names, args.workers,
+                            weights=get_registry().load_ensemble_weights())
+    scores = as_validation_scores(result)
+    print()
+    for name, score in scores['validation_scores'].items():
+        print(f"  {name:20s} RMSLE {score:.6f} (fit {result['seconds'][name]:.1f}s)")
+    print(f"  {'Ensemble':20s} RMSLE {scores['ensemble_rmsle']:.6f}")
+    if args.write_info:
+        write_ensemble_info(scores)
+        print(f"Updated {ENSEMBLE_INFO_FILE}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+"""Weighted log-space ensemble over the loaded models.
+
+Weights come from ``bike_ensemble_weights.pkl``: a ``{model name: weight}``
+dict (display names, or the notebooks' spelling such as
+``'GradientBoosting'``), optionally wrapped as ``{'weights': {...}}``, or a
+sequence in ``MODEL_FILES`` order. They are renormalized over the members
+that are actually loaded; without a usable file every member weighs the same.
+``train.py`` writes the file with ``inverse_error_weights`` of the
+validation scores.
+
+Members score one shared batch concurrently on a thread pool; XGBoost,
+CatBoost and the sklearn tree predictors release the GIL while predicting,
+so the members overlap instead of running back to back.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from instrumentation import get_instrumentation
+from intervals import LEVEL, bounds, ensemble_variance, predict_log_spread
+from model_registry import MODEL_FILES, get_registry
+from prediction import predict_log
+from records import model_input
+
+MAX_THREADS = min(8, os.cpu_count() or 1)
+
+
+def _alias(name):
+    return ''.join(ch for ch in str(name).lower() if ch.isalnum())
+
+
+def normalize_weights(raw, names):
+    """Weights for ``names`` (summing to 1) from whatever the weights file holds"""
+    if isinstance(raw, dict) and isinstance(raw.get('weights'), (dict, list, tuple, np.ndarray)):
+        raw = raw['weights']
+    weights = np.ones(len(names))
+    if isinstance(raw, dict):
+        by_alias = {_alias(k): v for k, v in raw.items()}
+        weights = np.array([float(by_alias.get(_alias(n), 0.0)) for n in names])
+    elif isinstance(raw, (list, tuple, np.ndarray)) and len(raw) == len(MODEL_FILES):
+        by_name = dict(zip(MODEL_FILES, raw))
+        weights = np.array([float(by_name.get(n, 0.0)) for n in names])
+    weights = np.clip(weights, 0, None)
+    if not np.isfinite(weights).all() or weights.sum() <= 0:
+        weights = np.ones(len(names))
+    return weights / weights.sum()
+
+
+def inverse_error_weights(scores):
+    """``{name: weight}`` proportional to 1 / RMSLE² of each model's validation score"""
+    inverse = {name: 1.0 / max(float(score), 1e-12) ** 2 for name, score in scores.items()}
+    total = sum(inverse.values())
+    return {name: value / total for name, value in inverse.items()}
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=MAX_THREADS, thread_name_prefix='ensemble')
+    return _pool
+
+
+def _timed_predict(model, X, predict=predict_log):
+    t0 = time.perf_counter()
+    pred = predict(model, X)
+    return pred, (time.perf_counter() - t0) * 1000
+
+
+def run_members(jobs, concurrent=True, predict=predict_log):
+    """Predict ``{name: (model, X)}``; returns ``({name: log preds}, {name: ms})``.
+
+    ``concurrent=False`` runs the members one after another in the calling
+    thread, which is what a profiler attached to that thread needs to see.
+    ``predict=intervals.predict_log_spread`` returns ``(log preds, variance)``
+    per member instead.
+    """
+    preds, timings = {}, {}
+    if len(jobs) == 1 or not concurrent:
+        for name, (model, X) in jobs.items():
+            preds[name], timings[name] = _timed_predict(model, X, predict)
+    else:
+        pool = _get_pool()
+        futures = {name: pool.submit(_timed_predict, model, X, predict) for name, (model, X) in jobs.items()}
+        for name, future in futures.items():
+            preds[name], timings[name] = future.result()
+    inst = get_instrumentation()
+    for name, ms in timings.items():
+        inst.observe('predict', ms / 1000, model=name)
+    return preds, timings
+
+
+# ─────────────────────────────────────────────
+#  ENSEMBLE PREDICTOR
+# ─────────────────────────────────────────────
+class EnsemblePredictor:
+    """Weighted log-space average of several models, scored on one shared batch.
+
+    Has the ``predict(X)`` interface of its members, so it can stand in for
+    a single model anywhere a model is expected.
+    """
+
+    def __init__(self, models, weights=None):
+        self.models = dict(models)
+        self.names = list(self.models)
+        self.weights = normalize_weights(weights, self.names)
+        self._lock = threading.Lock()
+        self._stats = {name: {'calls': 0, 'total_ms': 0.0, 'last_ms': None} for name in self.names}
+
+    @property
+    def weight_map(self):
+        return dict(zip(self.names, self.weights.tolist()))
+
+    def combine(self, per_model):
+        """Weighted mean of ``{name: log predictions}`` over the members present"""
+        names = [n for n in self.names if n in per_model]
+        if not names:
+            raise ValueError("no ensemble member predictions to combine")
+        w = np.array([self.weight_map[n] for n in names])
+        stacked = np.vstack([np.asarray(per_model[n], dtype=float).ravel() for n in names])
+        return w @ stacked / w.sum()
+
+    def predict_members(self, X, concurrent=True):
+        """``({name: log predictions}, {name: ms})`` for every member on ``X``"""
+        X = model_input(X)
+        preds, timings = run_members({name: (model, X) for name, model in self.models.items()}, concurrent)
+        self.record(timings)
+        return preds, timings
+
+    def record(self, timings):
+        """Add ``{name: ms}`` member predict times to the per-member stats"""
+        with self._lock:
+            for name, ms in timings.items():
+                stats = self._stats.get(name)
+                if stats is not None:
+                    stats['calls'] += 1
+                    stats['total_ms'] += ms
+                    stats['last_ms'] = ms
+
+    def predict_log(self, X, concurrent=True):
+        return self.combine(self.predict_members(X, concurrent)[0])
+
+    def interval(self, logs, variances, level=LEVEL):
+        """``(3, n)`` point / lower / upper log rows from member predictions and variances"""
+        weights = {n: w for n, w in self.weight_map.items() if n in logs}
+        return bounds(self.combine(logs), ensemble_variance(weights, logs, variances), level)
+
+    def predict_interval(self, X, level=LEVEL, concurrent=True):
+        """Point and interval in one pass over the members (forests report their tree spread)"""
+        X = model_input(X)
+        jobs = {name: (model, X) for name, model in self.models.items()}
+        spread, timings = run_members(jobs, concurrent, predict=predict_log_spread)
+        self.record(timings)
+        return self.interval({n: s[0] for n, s in spread.items()}, {n: s[1] for n, s in spread.items()}, level)
+
+    predict = predict_log
+
+    def timings(self):
+        """Per-member call count, last and mean predict time in ms"""
+        with self._lock:
+            return {
+                name: {**s, 'mean_ms': s['total_ms'] / s['calls'] if s['calls'] else None,
+                       'weight': self.weight_map[name]}
+                for name, s in self._stats.items()
+            }
+
+
+_ensemble = None
+_ensemble_key = None
+_ensemble_lock = threading.Lock()
+
+
+def get_ensemble(models=None):
+    """Ensemble over the registry's models, rebuilt when a model or the weights change"""
+    global _ensemble, _ensemble_key
+    registry = get_registry()
+    models = models if models is not None else registry.load_models()
+    weights = registry.load_ensemble_weights()
+    key = (tuple((name, id(model)) for name, model in models.items()), id(weights))
+    with _ensemble_lock:
+        if _ensemble is None or _ensemble_key != key:
+            _ensemble, _ensemble_key = EnsemblePredictor(models, weights), key
+        return _ensemble
@@ -0,0 +1,139 @@
+import numpy as np
+
+
+# ─────────────────────────────────────────────
+#  FEATURE LAYOUT (column order the models were trained on)
+# ─────────────────────────────────────────────
+FEATURE_NAMES = [
+    'season', 'holiday', 'workingday', 'weather',
+    'temp', 'atemp', 'humidity', 'windspeed',
+    'hour', 'day', 'month', 'yr', 'dayofweek'
+]
+FEATURE_INDEX = {name: i for i, name in enumerate(FEATURE_NAMES)}
+N_FEATURES = len(FEATURE_NAMES)
+
+# ``yr`` is 0 for 2011, 1 for 2012, as in the Year selector
+BASE_YEAR = 2011
+
+# (month, day) each season starts on in the rental data: the equinoxes and
+# solstices (Mar 21 spring, Jun 21 summer, Sep 23 fall, Dec 21 winter)
+SEASON_STARTS = ((3, 21), (6, 21), (9, 23), (12, 21))
+
+
+def season_of(month, day):
+    """Season code (1-4) the rental data gives a calendar date"""
+    key = np.asarray(month) * 100 + np.asarray(day)
+    starts = [m * 100 + d for m, d in SEASON_STARTS]
+    return np.searchsorted(starts, key, side='right') % 4 + 1
+
+
+# ─────────────────────────────────────────────
+#  NORMALIZATION
+# ─────────────────────────────────────────────
+def normalize_temperature(temp_celsius):
+    min_temp = -5
+    max_temp = 40
+    clipped_temp = np.clip(temp_celsius, min_temp, max_temp)
+    normalized = (clipped_temp - min_temp) / (max_temp - min_temp)
+    return normalized
+
+def normalize_humidity(humidity_percent):
+    clipped_humidity = np.clip(humidity_percent, 0, 100)
+    normalized = clipped_humidity / 100.0
+    return normalized
+
+def normalize_windspeed(windspeed_kmh):
+    min_wind = 0
+    max_wind = 50
+    clipped_wind = np.clip(windspeed_kmh, min_wind, max_wind)
+    normalized = (clipped_wind - min_wind) / (max_wind - min_wind)
+    return normalized
+
+
+# ─────────────────────────────────────────────
+#  FEATURE CONSTRUCTION
+# ─────────────────────────────────────────────
+def build_features(season, holiday, workingday, weather,
+                   temp_celsius, atemp_celsius, humidity_percent, windspeed_kmh,
+                   hour, day, month, yr, dayofweek):
+    """Build the 13-feature model input from raw form values"""
+    return np.array([
+        season, holiday, workingday, weather,
+        normalize_temperature(temp_celsius), normalize_temperature(atemp_celsius),
+        normalize_humidity(humidity_percent), normalize_windspeed(windspeed_kmh),
+        hour, day, month, yr, dayofweek
+    ], dtype=float)
+
+
+def feature_grid(base_features, **axes):
+    """Cartesian grid of feature rows around ``base_features``.
+
+    Each keyword names a feature and gives the values to sweep, in model
+    units (e.g. ``hour=range(24), weather=[1, 2, 3]``). Returns
+    ``(X, shape)`` where ``X`` has one row per grid point in C order, so
+    ``predictions.reshape(shape)`` indexes as ``[hour_i, weather_i]``.
+    """
+    base = np.asarray(base_features, dtype=float)
+    if not axes:
+        return base.reshape(1, -1), ()
+
+    columns = [FEATURE_INDEX[name] for name in axes]
+    values = [np.asarray(list(v), dtype=float) for v in axes.values()]
+    shape = tuple(len(v) for v in values)
+
+    X = np.tile(base, (int(np.prod(shape)), 1))
+    mesh = np.meshgrid(*values, indexing='ij')
+    for col, grid in zip(columns, mesh):
+        X[:, col] = grid.ravel()
+    return X, shape
+
+
+def hour_grid(base_features, hours_range):
+    """One row per hour, all other features held at ``base_features``"""
+    X, _ = feature_grid(base_features, hour=hours_range)
+    return X
+
+
+def frame_to_features(df):
+    """Derive the model matrix from a train/test.csv-shaped DataFrame.
+
+    Expects the raw CSV columns (``datetime``, ``temp`` in °C, ``humidity``
+    in %, ``windspeed`` ...) and applies the same normalization as the
+    Predict Demand form, so offline scores match the app.
+    """
+    import pandas as pd  # only offline scoring needs it; the app imports features without it
+    dt = pd.to_datetime(df['datetime'], errors='coerce')
+    X = np.empty((len(df), N_FEATURES), dtype=float)
+    X[:, FEATURE_INDEX['season']] = df['season'].to_numpy()
+    X[:, FEATURE_INDEX['holiday']] = df['holiday'].to_numpy()
+    X[:, FEATURE_INDEX['workingday']] = df['workingday'].to_numpy()
+    X[:, FEATURE_INDEX['weather']] = df['weather'].to_numpy()
+    X[:, FEATURE_INDEX['temp']] = normalize_temperature(df['temp'].to_numpy(dtype=float))
+    X[:, FEATURE_INDEX['atemp']] = normalize_temperature(df['atemp'].to_numpy(dtype=float))
+    X[:, FEATURE_INDEX['humidity']] = normalize_humidity(df['humidity'].to_numpy(dtype=float))
+    X[:, FEATURE_INDEX['windspeed']] = normalize_windspeed(df['windspeed'].to_numpy(dtype=float))
+    X[:, FEATURE_INDEX['hour']] = dt.dt.hour.to_numpy()
+    X[:, FEATURE_INDEX['day']] = dt.dt.day.to_numpy()
+    X[:, FEATURE_INDEX['month']] = dt.dt.month.to_numpy()
+    X[:, FEATURE_INDEX['yr']] = dt.dt.year.to_numpy() - BASE_YEAR
+    X[:, FEATURE_INDEX['dayofweek']] = dt.dt.dayofweek.to_numpy()
+    return X
+
+
+# Raw-unit field names accepted from API payloads, in build_features order
+PAYLOAD_FIELDS = [
+    'season', 'holiday', 'workingday', 'weather',
+    'temp', 'atemp', 'humidity', 'windspeed',
+    'hour', 'day', 'month', 'yr', 'dayofweek'
+]
+
+
+def payload_to_features(payload):
+    """Build features from a dict of raw form values (°C, %, km/h).
+
+    Raises ``KeyError`` naming the first missing field.
+    """
+    missing = [f for f in PAYLOAD_FIELDS if f not in payload]
+    if missing:
+        raise KeyError(missing[0])
+    return build_features(*(float(payload[f]) for f in PAYLOAD_FIELDS))
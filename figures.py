@@ -0,0 +1,270 @@
+"""Plotly figures for the app: one shared template, cached static figures,
+patched dynamic ones.
+
+Every page used to rebuild its ``go.Figure`` objects on each rerun and to
+copy ``BASE_LAYOUT`` into each layout. Now:
+
+* ``TEMPLATE`` carries the shared styling once. A figure's layout holds
+  only what differs from it, and replaces the default template (about
+  3 KB of JSON per chart).
+* ``cached(name, build, *data)`` returns a figure built once per process
+  for the same data. The Dashboard, Analytics and forecast charts only
+  change when the rollups or the forecast do. Identical specs also let
+  the browser's message cache skip re-downloading them.
+* ``patched(store, name, build, traces, layout)`` keeps one skeleton per
+  session (e.g. in ``st.session_state``) and only swaps its trace data,
+  for the Predict page's charts.
+* ``compact()`` turns numeric series into the smallest numpy dtype that
+  holds them. Plotly serializes numpy arrays as base64 typed arrays rather
+  than JSON number lists.
+"""
+import collections
+import threading
+import time
+
+import numpy as np
+import plotly.graph_objects as go
+
+from instrumentation import get_instrumentation
+
+C = {
+    'teal':'#14b8a6','cyan':'#38bdf8','purple':'#a78bfa',
+    'orange':'#fb923c','green':'#4ade80',
+    'grid':'rgba(255,255,255,0.04)','muted':'#3a5472','text':'#c8d6e8',
+}
+
+BASE_LAYOUT = dict(
+    paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)',
+    font=dict(family='Plus Jakarta Sans', color=C['text'], size=12),
+    xaxis=dict(gridcolor=C['grid'], color=C['muted'], showline=False),
+    yaxis=dict(gridcolor=C['grid'], color=C['muted'], showline=False),
+    legend=dict(bgcolor='rgba(0,0,0,0)', orientation='h',
+                yanchor='bottom', y=-0.26, xanchor='center', x=0.5,
+                font=dict(size=12, color=C['text'])),
+    hovermode='x unified',
+    hoverlabel=dict(bgcolor='#1a2840', bordercolor='rgba(56,189,248,0.3)',
+                    font=dict(family='Plus Jakarta Sans', color='#e2ecfb', size=13))
+)
+TEMPLATE = go.layout.Template(layout=BASE_LAYOUT)
+CHART_CONFIG = {'displayModeBar': False}
+
+HOURS = list(range(24))
+HOUR_LABELS = [f"{h:02d}:00" for h in HOURS]
+MAX_CACHED = 64
+
+
+def compact(values, decimals=1):
+    """Numeric series as the smallest numpy dtype that holds it"""
+    arr = np.asarray(values)
+    if arr.dtype.kind in 'iub' or (arr.size and np.all(np.mod(arr, 1) == 0)):
+        arr = arr.astype(np.int64)
+        for dtype in (np.int8, np.int16, np.int32):
+            info = np.iinfo(dtype)
+            if not arr.size or (arr.min() >= info.min and arr.max() <= info.max):
+                return arr.astype(dtype)
+        return arr
+    return np.round(arr.astype(float), decimals).astype(np.float32)
+
+
+def layout(**overrides):
+    """A layout with only what differs from ``TEMPLATE``"""
+    return dict(template=TEMPLATE, **overrides)
+
+
+def _data_key(data):
+    return tuple(tuple(np.asarray(d).ravel().tolist()) if isinstance(d, (list, tuple, np.ndarray)) else d
+                 for d in data)
+
+
+# ─────────────────────────────────────────────
+#  CACHES
+# ─────────────────────────────────────────────
+_figures = collections.OrderedDict()
+_figures_lock = threading.Lock()
+
+
+def cached(name, build, *data):
+    """``build(*data)``, built once per process for each distinct ``data``.
+
+    The returned figure is shared by every session and must not be mutated.
+    """
+    key = (name, _data_key(data))
+    with _figures_lock:
+        fig = _figures.get(key)
+        if fig is not None:
+            _figures.move_to_end(key)
+            return fig
+    t0 = time.perf_counter()
+    fig = build(*data)
+    get_instrumentation().observe('figure_build', time.perf_counter() - t0, figure=name)
+    with _figures_lock:
+        _figures[key] = fig
+        while len(_figures) > MAX_CACHED:
+            _figures.popitem(last=False)
+    return fig
+
+
+def patched(store, name, build, traces=(), layout=None):
+    """The session's ``name`` skeleton (built on first use) with new trace data.
+
+    ``store`` is per-session (``st.session_state``), so patching never races
+    with another session. ``traces`` holds one dict of properties per trace,
+    in trace order.
+    """
+    figures = store.setdefault('_figures', {})
+    fig = figures.get(name)
+    if fig is None:
+        fig = figures[name] = build()
+    with fig.batch_update():
+        for trace, props in zip(fig.data, traces):
+            trace.update(props)
+        if layout:
+            fig.update_layout(layout)
+    return fig
+
+
+def clear():
+    with _figures_lock:
+        _figures.clear()
+
+
+# ─────────────────────────────────────────────
+#  DASHBOARD / ANALYTICS / WEATHER (static)
+# ─────────────────────────────────────────────
+def hourly_pattern(registered, casual):
+    fig = go.Figure(layout=layout(
+        height=295, margin=dict(l=10,r=10,t=6,b=40),
+        xaxis=dict(tickvals=HOURS, ticktext=HOUR_LABELS),
+        yaxis=dict(range=[0, max(list(registered) + list(casual)) * 1.12]),
+    ))
+    fig.add_trace(go.Scatter(
+        x=compact(HOURS), y=compact(registered), name="Registered",
+        mode='lines', fill='tozeroy',
+        line=dict(color=C['cyan'], width=2.5, shape='spline'),
+        fillcolor='rgba(56,189,248,0.13)',
+        hovertemplate='<b>Registered</b>: %{y}'
+    ))
+    fig.add_trace(go.Scatter(
+        x=compact(HOURS), y=compact(casual), name="Casual",
+        mode='lines', fill='tozeroy',
+        line=dict(color=C['purple'], width=2.5, shape='spline'),
+        fillcolor='rgba(167,139,250,0.13)',
+        hovertemplate='<b>Casual</b>: %{y}'
+    ))
+    return fig
+
+
+def weather_impact(weather_avg):
+    return go.Figure(go.Bar(
+        x=['Clear','Cloudy','Light Rain','Heavy Rain'],
+        y=compact(weather_avg),
+        marker_color=[C['orange'], '#94a3b8', '#60a5fa', C['purple']],
+        marker_line_width=0,
+        hovertemplate='%{x}: <b>%{y}</b> avg rentals<extra></extra>'
+    ), layout=layout(
+        height=280, margin=dict(l=10,r=10,t=6,b=10),
+        yaxis=dict(range=[0, max(weather_avg) * 1.2]),
+        bargap=0.35, showlegend=False,
+    ))
+
+
+def season_split(season_share):
+    return go.Figure(go.Pie(
+        labels=['Spring','Summer','Fall','Winter'],
+        values=compact(season_share),
+        hole=0.0,
+        marker=dict(
+            colors=[C['green'], C['orange'], '#fb923c', '#60a5fa'],
+            line=dict(color='#0c1522', width=2.5)
+        ),
+        textinfo='label+percent',
+        textfont=dict(size=13, color='#e2ecfb'),
+        hovertemplate='<b>%{label}</b>: %{value}%<extra></extra>'
+    ), layout=layout(height=280, margin=dict(l=10,r=10,t=6,b=10), showlegend=False))
+
+
+def forecast_bars(days, daily):
+    return go.Figure(go.Bar(
+        x=list(days), y=compact(daily),
+        marker_color=C['cyan'], marker_line_width=0,
+        hovertemplate='%{x}: <b>%{y:,}</b> est. rentals<extra></extra>'
+    ), layout=layout(height=240, margin=dict(l=10,r=10,t=6,b=10), showlegend=False, bargap=0.3))
+
+
+def monthly_volume(months, total_rentals, avg_temp):
+    from plotly.subplots import make_subplots
+    fig = make_subplots(specs=[[{"secondary_y": True}]])
+    fig.add_trace(go.Bar(
+        x=list(months), y=compact(total_rentals), name="Total Rentals",
+        marker_color=C['cyan'], marker_line_width=0,
+        hovertemplate='%{x}: <b>%{y:,}</b><extra></extra>'
+    ), secondary_y=False)
+    fig.add_trace(go.Bar(
+        x=list(months), y=compact(avg_temp), name="Avg Temp (°C)",
+        marker_color=C['orange'], marker_line_width=0,
+        hovertemplate='%{x}: <b>%{y}°C</b><extra></extra>'
+    ), secondary_y=True)
+    fig.update_layout(**layout(
+        margin=dict(l=10,r=10,t=6,b=40), height=310,
+        bargap=0.15, bargroupgap=0.05,
+        legend=dict(y=-0.28),
+    ))
+    fig.update_yaxes(gridcolor='rgba(0,0,0,0)', color=C['orange'], secondary_y=True)
+    return fig
+
+
+# ─────────────────────────────────────────────
+#  PREDICT DEMAND (patched per session)
+# ─────────────────────────────────────────────
+def hourly_forecast():
+    """Skeleton for the 24-hour curve: the curve, then the selected hour"""
+    fig = go.Figure(layout=layout(
+        height=500, margin=dict(l=80, r=40, t=40, b=100),
+        xaxis=dict(tickvals=HOURS, ticktext=HOUR_LABELS, tickangle=-45,
+                   title="Hour of Day", title_font=dict(size=14), tickfont=dict(size=11)),
+        yaxis=dict(title="Predicted Rentals (bikes per hour)", title_font=dict(size=14), tickfont=dict(size=11)),
+        showlegend=True,
+        legend=dict(yanchor='bottom', y=1.02),
+    ))
+    fig.add_trace(go.Scatter(
+        x=compact(HOURS), name="Predicted Demand",
+        mode='lines+markers',
+        line=dict(color=C['cyan'], width=4, shape='spline'),
+        marker=dict(size=10, color=C['cyan']),
+        hovertemplate='Hour %{x:02d}:00<br><b>%{y:,}</b> bikes<extra></extra>'
+    ))
+    fig.add_trace(go.Scatter(
+        mode='markers',
+        marker=dict(size=16, color=C['orange'], line=dict(width=3, color='white')),
+        hovertemplate='Selected: %{x:02d}:00<br><b>%{y:,}</b> bikes<extra></extra>'
+    ))
+    return fig
+
+
+def hourly_forecast_traces(counts, hour, prediction):
+    return [{'y': compact(counts)},
+            {'x': [hour], 'y': [prediction], 'name': f"Selected Hour ({hour:02d}:00)"}]
+
+
+COMPARE_COLORS = [C['cyan'], C['purple'], C['orange'], C['green'], '#94a3b8']
+
+
+def model_comparison():
+    """Skeleton for the per-model bar chart"""
+    return go.Figure(go.Bar(
+        marker_line_width=0,
+        textposition='outside',
+        textfont=dict(size=12, color=C['text']),
+        hovertemplate='%{x}: <b>%{y:,}</b> bikes<extra></extra>'
+    ), layout=layout(
+        height=400, margin=dict(l=60, r=40, t=40, b=100),
+        showlegend=False, bargap=0.3,
+        xaxis=dict(tickangle=-30, title="Model", title_font=dict(size=14)),
+        yaxis=dict(title="Predicted Rentals (bikes per hour)", title_font=dict(size=14)),
+    ))
+
+
+def model_comparison_traces(names, predictions):
+    return [{'x': list(names), 'y': compact(predictions),
+             'marker_color': COMPARE_COLORS[:len(names)],
+             'text': [f"{p:,}" for p in predictions]}]
@@ -0,0 +1,237 @@
+"""7-day demand forecast from a local weather forecast file.
+
+    python forecast.py                          # weather_forecast.json / .csv
+    python forecast.py my_forecast.csv --model XGBoost
+
+The forecast file is dropped next to the app as JSON (a list of records,
+or ``{"hourly": [...]}`` / ``{"daily": [...]}``) or CSV. Hourly records
+carry ``datetime``, ``weather`` (1-4) and ``temp`` (°C), optionally
+``atemp``, ``humidity``, ``windspeed`` (km/h) and ``holiday``. Daily records
+carry ``date``, ``high``, ``low`` and ``weather`` and are spread over the
+day on a diurnal temperature curve. Missing readings default to the
+seasonal normals of the rental history.
+
+The days the file covers (up to seven) become hourly rows, scored together with the
+same hours under normal weather (the seasonal baseline) in one batched
+predict call per model. Results are cached until the forecast file or the
+models change.
+"""
+import argparse
+import json
+import os
+import threading
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from batching import ENSEMBLE
+from ensemble import get_ensemble
+from features import FEATURE_INDEX, frame_to_features, season_of
+from model_registry import get_registry
+from prediction import predict_many, to_counts
+from storage import open_store
+
+FORECAST_FILES = ('weather_forecast.json', 'weather_forecast.csv')
+HISTORY_FILE = 'train.csv'
+FORECAST_DAYS = 7
+
+WEATHER_ICONS = {1: "☀️", 2: "⛅", 3: "🌧️", 4: "⛈️"}
+# Hours whose most common condition decides a day's icon
+DAYTIME = slice(7, 21)
+# Used when neither the forecast nor the history has a reading
+DEFAULT_NORMALS = {'temp': 20.0, 'atemp': 23.0, 'humidity': 62.0, 'windspeed': 12.8}
+_READINGS = ('temp', 'atemp', 'humidity', 'windspeed')
+
+
+# ─────────────────────────────────────────────
+#  FORECAST FILE
+# ─────────────────────────────────────────────
+def find_forecast_file(base_dir='.'):
+    for name in FORECAST_FILES:
+        path = os.path.join(base_dir, name)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def read_forecast(path):
+    """Forecast records from a JSON or CSV file as a DataFrame"""
+    if os.path.splitext(path)[1].lower() == '.csv':
+        return pd.read_csv(path)
+    with open(path) as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get('hourly') or data.get('daily') or []
+    return pd.DataFrame(data)
+
+
+def seasonal_normals(history=HISTORY_FILE):
+    """Mean readings per season {season: {reading: value}} from the rental history"""
+    normals = {s: dict(DEFAULT_NORMALS) for s in range(1, 5)}
+    if not os.path.exists(history):
+        return normals
+    store = open_store(history)
+    season = np.asarray(store['season'], dtype=np.int64)
+    n = np.bincount(season, minlength=5)
+    for reading in _READINGS:
+        if reading in store:
+            sums = np.bincount(season, weights=np.asarray(store[reading], dtype=float), minlength=5)
+            for s in range(1, 5):
+                if n[s]:
+                    normals[s][reading] = float(sums[s] / n[s])
+    return normals
+
+
+def _expand_daily(df):
+    """Spread daily high/low records over 24 hours (minimum at 03:00, peak at 15:00)"""
+    rows = []
+    for rec in df.to_dict('records'):
+        date = pd.Timestamp(rec['date']).normalize()
+        high, low = float(rec['high']), float(rec['low'])
+        for hour in range(24):
+            shape = (1 + np.cos(2 * np.pi * (hour - 15) / 24)) / 2
+            row = {k: v for k, v in rec.items() if k not in ('date', 'high', 'low')}
+            row.update(datetime=date + timedelta(hours=hour), temp=low + (high - low) * shape)
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def hourly_frame(df, normals, days=FORECAST_DAYS):
+    """Hourly CSV-shaped rows for the whole days the forecast covers (at most ``days``).
+
+    Readings are interpolated between forecast hours only; hours before the
+    first or after the last reading of a partly covered day, and readings the
+    file lacks, take the seasonal normals.
+    """
+    if 'datetime' not in df.columns and {'date', 'high', 'low'} <= set(df.columns):
+        df = _expand_daily(df)
+    if 'datetime' not in df.columns or 'temp' not in df.columns:
+        raise ValueError("forecast needs hourly 'datetime'/'temp' or daily 'date'/'high'/'low' records")
+    df = df.copy()
+    df['datetime'] = pd.to_datetime(df['datetime']).dt.floor('h')
+    df = df.drop_duplicates('datetime').set_index('datetime').sort_index()
+
+    start = df.index[0].normalize()
+    covered = (df.index[-1].normalize() - start).days + 1
+    index = pd.date_range(start, periods=min(covered, days) * 24, freq='h')
+    df = df.reindex(index)
+    numeric = [c for c in _READINGS if c in df.columns]
+    df[numeric] = df[numeric].astype(float).interpolate(limit_area='inside')
+    df['weather'] = df['weather'].ffill().bfill().fillna(1).clip(1, 4) if 'weather' in df.columns else 1
+    df['holiday'] = df['holiday'].fillna(0) if 'holiday' in df.columns else 0
+
+    out = pd.DataFrame({'datetime': index})
+    out['season'] = season_of(index.month, index.day)
+    out['holiday'] = df['holiday'].to_numpy().astype(int)
+    out['workingday'] = ((index.dayofweek < 5) & (out['holiday'] == 0)).astype(int)
+    out['weather'] = df['weather'].to_numpy().astype(int)
+    for reading in _READINGS:
+        fallback = np.array([normals[s][reading] for s in out['season']])
+        values = df[reading].to_numpy(dtype=float) if reading in df.columns else np.full(len(out), np.nan)
+        if reading == 'atemp' and 'atemp' not in df.columns:
+            values = out['temp'].to_numpy()
+        out[reading] = np.where(np.isnan(values), fallback, values)
+    return out
+
+
+def baseline_frame(frame, normals):
+    """The same hours under clear skies and seasonal-normal readings"""
+    base = frame.copy()
+    base['weather'] = 1
+    for reading in _READINGS:
+        base[reading] = [normals[s][reading] for s in base['season']]
+    return base
+
+
+# ─────────────────────────────────────────────
+#  ENGINE
+# ─────────────────────────────────────────────
+def _features(frame):
+    X = frame_to_features(frame)
+    # The models only saw 2011-2012; later years are scored as the latest one
+    X[:, FEATURE_INDEX['yr']] = np.clip(X[:, FEATURE_INDEX['yr']], 0, 1)
+    return X
+
+
+def forecast(frame, models, normals, model=ENSEMBLE):
+    """Per-day forecast: one predict call per model over forecast + baseline rows"""
+    n = len(frame)
+    X = np.vstack([_features(frame), _features(baseline_frame(frame, normals))])
+    if model == ENSEMBLE:
+        counts = to_counts(get_ensemble(models).predict_log(X))
+    else:
+        counts = to_counts(predict_many({model: models[model]}, X)[model])
+    hourly, baseline = counts[:n].reshape(-1, 24), counts[n:].reshape(-1, 24)
+
+    days = []
+    for i, (day_counts, base_counts) in enumerate(zip(hourly, baseline)):
+        rows = frame.iloc[i * 24:(i + 1) * 24]
+        weather = int(np.bincount(rows['weather'].iloc[DAYTIME], minlength=5).argmax())
+        total, base_total = int(day_counts.sum()), int(base_counts.sum())
+        days.append({
+            'date': rows['datetime'].iloc[0].date().isoformat(),
+            'label': rows['datetime'].iloc[0].strftime('%a'),
+            'weather': weather,
+            'icon': WEATHER_ICONS[weather],
+            'high': round(float(rows['temp'].max())),
+            'low': round(float(rows['temp'].min())),
+            'rentals': total,
+            'baseline': base_total,
+            'impact': (total / base_total - 1) * 100 if base_total else 0.0,
+            'hourly': day_counts.tolist(),
+        })
+    return days
+
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def get_forecast(path=None, model=ENSEMBLE, models=None, history=HISTORY_FILE):
+    """Cached forecast (up to 7 days) for the current forecast file; None if there is none"""
+    path = path or find_forecast_file()
+    if path is None or not os.path.exists(path):
+        return None
+    models = models if models is not None else get_registry().load_models()
+    if not models or (model != ENSEMBLE and model not in models):
+        return None
+
+    st = os.stat(path)
+    registry = get_registry()
+    versions = tuple((name, registry.version(name)) for name in sorted(models) + ['Ensemble Weights'])
+    key = (os.path.abspath(path), st.st_size, st.st_mtime_ns, model, versions)
+    with _cache_lock:
+        if key in _cache:
+            return _cache[key]
+
+    normals = seasonal_normals(history)
+    result = forecast(hourly_frame(read_forecast(path), normals), models, normals, model)
+    with _cache_lock:
+        # Only the latest state of each forecast file is worth keeping
+        for stale in [k for k in _cache if k[0] == key[0]]:
+            del _cache[stale]
+        _cache[key] = result
+    return result
+
+
+# ─────────────────────────────────────────────
+#  CLI
+# ─────────────────────────────────────────────
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="7-day bike demand forecast from a weather forecast file")
+    parser.add_argument('path', nargs='?', help=f"forecast file (default: {' or '.join(FORECAST_FILES)})")
+    parser.add_argument('--model', default=ENSEMBLE)
+    parser.add_argument('--history', default=HISTORY_FILE, help="rental history for seasonal normals")
+    args = parser.parse_args(argv)
+
+    days = get_forecast(args.path, args.model, history=args.history)
+    if days is None:
+        raise SystemExit("No forecast file or no trained models found.")
+    for day in days:
+        print(f"{day['date']} {day['label']} {day['icon']} {day['high']:>3}°/{day['low']:>3}° "
+              f"{day['rentals']:>7,} rentals ({day['impact']:+.0f}% vs {day['baseline']:,} seasonal)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+"""Stage timers and latency histograms for the prediction flow.
+
+    with get_instrumentation().timer('feature_build'):
+        ...
+    get_instrumentation().observe('predict', seconds, model='XGBoost')
+
+Each (stage, labels) series keeps cumulative Prometheus-style buckets plus
+a window of recent observations for p50/p95/p99. Snapshots are exported as
+JSON (``BIKE_METRICS_FILE``, written at most every ``EXPORT_INTERVAL_S``)
+or Prometheus text, served on ``BIKE_METRICS_PORT`` by a small stdlib HTTP
+thread and on the API server's ``GET /metrics/prometheus``.
+
+``profile()`` captures a cProfile (or pyinstrument, if installed) report
+of one request when the caller asks for it.
+"""
+import collections
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# Upper bounds in seconds, 0.1 ms to 10 s
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+WINDOW = 2048
+EXPORT_INTERVAL_S = 5.0
+
+METRICS_FILE = os.environ.get('BIKE_METRICS_FILE')
+METRICS_PORT = os.environ.get('BIKE_METRICS_PORT')
+
+
+class Histogram:
+    """Cumulative bucket counts plus a window of recent values"""
+
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = collections.deque(maxlen=WINDOW)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.sum += seconds
+        self.recent.append(seconds)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+
+    def summary(self):
+        out = {'count': self.count, 'sum_s': self.sum}
+        if self.recent:
+            arr = np.fromiter(self.recent, dtype=float) * 1000
+            p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+            out.update(p50_ms=float(p50), p95_ms=float(p95), p99_ms=float(p99), max_ms=float(arr.max()))
+        return out
+
+
+def _label_text(labels):
+    return ','.join(f'{k}="{v}"' for k, v in labels)
+
+
+class Instrumentation:
+    """Process-wide registry of stage histograms"""
+
+    def __init__(self, metrics_file=None):
+        self.metrics_file = metrics_file
+        self._series = {}
+        self._lock = threading.Lock()
+        self._last_export = 0.0
+
+    def observe(self, stage, seconds, **labels):
+        key = (stage, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            hist = self._series.get(key)
+            if hist is None:
+                hist = self._series[key] = Histogram()
+            hist.observe(seconds)
+        self._maybe_export()
+
+    @contextlib.contextmanager
+    def timer(self, stage, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - t0, **labels)
+
+    def snapshot(self):
+        """``[{'stage', 'labels', 'count', 'p50_ms', ...}]`` for every series"""
+        with self._lock:
+            return [{'stage': stage, 'labels': dict(labels), **hist.summary()}
+                    for (stage, labels), hist in sorted(self._series.items())]
+
+    def prometheus(self):
+        """Prometheus text exposition of every series as ``bike_stage_seconds``"""
+        lines = ['# HELP bike_stage_seconds Time spent per prediction stage.',
+                 '# TYPE bike_stage_seconds histogram']
+        with self._lock:
+            for (stage, labels), hist in sorted(self._series.items()):
+                base = _label_text((('stage', stage),) + labels)
+                cumulative = 0
+                for bound, n in zip(BUCKETS, hist.buckets):
+                    cumulative += n
+                    lines.append(f'bike_stage_seconds_bucket{{{base},le="{bound}"}} {cumulative}')
+                lines.append(f'bike_stage_seconds_bucket{{{base},le="+Inf"}} {hist.count}')
+                lines.append(f'bike_stage_seconds_sum{{{base}}} {hist.sum}')
+                lines.append(f'bike_stage_seconds_count{{{base}}} {hist.count}')
+        return '\n'.join(lines) + '\n'
+
+    def write_json(self, path):
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'time': time.time(), 'series': self.snapshot()}, f, indent=2)
+        os.replace(tmp, path)
+
+    def _maybe_export(self):
+        if not self.metrics_file:
+            return
+        now = time.monotonic()
+        if now - self._last_export < EXPORT_INTERVAL_S:
+            return
+        self._last_export = now
+        try:
+            self.write_json(self.metrics_file)
+        except OSError:
+            pass
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+# ─────────────────────────────────────────────
+#  PROFILING
+# ─────────────────────────────────────────────
+class Profile:
+    """Report of one profiled block; ``text`` is filled in when the block exits"""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.text = ''
+        self.seconds = None
+
+
+@contextlib.contextmanager
+def profile(enabled=True, kind='cprofile', limit=30):
+    """Profile the enclosed block in this thread when ``enabled``.
+
+    ``kind='pyinstrument'`` uses pyinstrument when it is installed and
+    falls back to cProfile otherwise.
+    """
+    if not enabled:
+        yield None
+        return
+    if kind == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            kind = 'cprofile'
+    result = Profile(kind)
+    t0 = time.perf_counter()
+    if kind == 'pyinstrument':
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield result
+        finally:
+            profiler.stop()
+            result.seconds = time.perf_counter() - t0
+            result.text = profiler.output_text(unicode=True)
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield result
+        finally:
+            profiler.disable()
+            result.seconds = time.perf_counter() - t0
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(limit)
+            result.text = out.getvalue()
+
+
+# ─────────────────────────────────────────────
+#  EXPORT ENDPOINT
+# ─────────────────────────────────────────────
+def serve_prometheus(instrumentation, port, host='127.0.0.1'):
+    """Serve ``/metrics`` (Prometheus text) and ``/metrics.json`` from a daemon thread"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/metrics':
+                body, ctype = instrumentation.prometheus().encode(), 'text/plain; version=0.0.4'
+            elif self.path == '/metrics.json':
+                body, ctype = json.dumps(instrumentation.snapshot()).encode(), 'application/json'
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', ctype)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, int(port)), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True, name='metrics-http').start()
+    return server
+
+
+_instrumentation = None
+_instrumentation_lock = threading.Lock()
+
+
+def get_instrumentation():
+    """Return the instrumentation shared by every session in this process"""
+    global _instrumentation
+    if _instrumentation is None:
+        with _instrumentation_lock:
+            if _instrumentation is None:
+                inst = Instrumentation(METRICS_FILE)
+                if METRICS_PORT:
+                    try:
+                        serve_prometheus(inst, METRICS_PORT)
+                    except OSError:
+                        # Another process (e.g. a second Streamlit worker) owns the port
+                        pass
+                _instrumentation = inst
+    return _instrumentation
@@ -0,0 +1,95 @@
+"""Prediction intervals from the spread the models already compute.
+
+Two sources, both taken from the pass that produces the point estimate:
+
+* Random Forest: its trees are evaluated one by one (as ``predict`` does
+  internally), so the per-row variance across trees comes with the mean.
+* Ensemble: the members' weighted disagreement in log space, plus the
+  weighted within-model variance of any forest member.
+
+Bounds are ``point ± z·sd`` in log1p space at the central ``LEVEL`` (80%
+by default: roughly the 10th and 90th percentiles), then converted with
+``expm1`` like the point, so they are asymmetric in bikes. They measure
+model disagreement, not calibrated coverage. Single boosted models
+(Gradient Boosting, XGBoost, CatBoost) have no spread to report and get
+no interval, as does a compiled (``tree_engine``) forest.
+
+Interval results are ``(3, n)`` log arrays: point, lower, upper rows,
+with NaN bounds where no spread is available.
+"""
+from statistics import NormalDist
+
+import numpy as np
+
+from prediction import predict_log, to_counts
+
+LEVEL = 0.8
+
+
+def z_score(level=LEVEL):
+    return NormalDist().inv_cdf(0.5 + level / 2)
+
+
+def forest_trees(model):
+    """The fitted trees of a sklearn random forest, or None for any other model"""
+    if type(model).__name__ not in ('RandomForestRegressor', 'ExtraTreesRegressor'):
+        return None
+    return getattr(model, 'estimators_', None) or None
+
+
+def predict_log_spread(model, X):
+    """``(log predictions, per-row variance or None)`` from one pass over ``model``"""
+    trees = forest_trees(model)
+    if trees is None:
+        return predict_log(model, X), None
+    # The trees test splits in float32; casting once here is what predict does
+    X32 = np.ascontiguousarray(np.atleast_2d(X), dtype=np.float32)
+    per_tree = np.empty((len(trees), len(X32)))
+    for i, tree in enumerate(trees):
+        per_tree[i] = tree.predict(X32, check_input=False)
+    return per_tree.mean(axis=0), per_tree.var(axis=0)
+
+
+def bounds(point, var, level=LEVEL):
+    """``(3, n)`` point / lower / upper log rows; NaN bounds when ``var`` is None"""
+    point = np.asarray(point, dtype=float).ravel()
+    if var is None:
+        nan = np.full_like(point, np.nan)
+        return np.vstack([point, nan, nan])
+    sd = np.sqrt(np.maximum(np.asarray(var, dtype=float).ravel(), 0.0))
+    z = z_score(level)
+    return np.vstack([point, point - z * sd, point + z * sd])
+
+
+def ensemble_variance(weights, logs, variances):
+    """Weighted between-member plus within-member variance of log predictions.
+
+    ``weights`` is ``{name: weight}``; ``logs`` / ``variances`` are
+    ``{name: array}`` (a variance may be None).
+    """
+    names = [n for n in weights if n in logs]
+    w = np.array([weights[n] for n in names])
+    w = w / w.sum()
+    stacked = np.vstack([np.asarray(logs[n], dtype=float).ravel() for n in names])
+    mean = w @ stacked
+    between = w @ (stacked - mean) ** 2
+    within = sum(wi * np.asarray(variances[n], dtype=float).ravel()
+                 for wi, n in zip(w, names) if variances.get(n) is not None)
+    return between + within
+
+
+def model_interval(model, X, level=LEVEL):
+    """``(3, n)`` interval rows for a single model"""
+    point, var = predict_log_spread(model, X)
+    return bounds(point, var, level)
+
+
+def interval_counts(rows):
+    """``{'count', 'lower', 'upper'}`` bike counts from ``(3, n)`` log rows; None where unknown"""
+    rows = np.asarray(rows, dtype=float).reshape(3, -1)
+    out = {'count': to_counts(rows[0]).tolist()}
+    for key, row in (('lower', rows[1]), ('upper', rows[2])):
+        known = ~np.isnan(row)
+        counts = to_counts(np.where(known, row, 0.0))
+        out[key] = [int(c) if k else None for c, k in zip(counts, known)]
+    return out
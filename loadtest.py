@@ -0,0 +1,436 @@
+"""Load generator for the prediction paths.
+
+    python loadtest.py replay recorded.jsonl --rate 200 --concurrency 16
+    python loadtest.py replay recorded.jsonl --target http://127.0.0.1:8000
+    python loadtest.py synth --rate 100 --duration 30
+    python loadtest.py saturate --start-rate 25 --slo-ms 250
+
+Targets are either ``inproc`` (the server's code paths, i.e. the shared
+``prediction_cache`` in front of the ``batching`` scheduler, called from
+this process) or the base URL of a running ``server.py``.
+
+``replay`` reads JSON lines, one request per line: a bare Predict Demand
+payload (sent to ``/predict``, or ``/predict/batch`` when it has
+``"rows"``) or ``{"route": "/predict/curve", "body": {...}}``. Lines that
+carry no feature fields are skipped and counted. ``synth`` generates
+traffic shaped like the app's: hours drawn from the historical hour-of-day
+demand, mostly curve requests, and slider-drag bursts where one form value
+steps a few times in quick succession. ``saturate`` raises the synthetic
+rate step by step until the process stops keeping up or breaks the
+latency SLO, and reports the last rate it sustained.
+
+Requests are sent open-loop at ``--rate`` (0 = as fast as ``--concurrency``
+allows). Latency is measured from each request's scheduled send time, so
+queueing behind a saturated target shows up in the tail instead of
+silently lowering the offered rate.
+"""
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from aggregates import get_rollups
+from batching import ENSEMBLE, get_scheduler
+from features import N_FEATURES, PAYLOAD_FIELDS, hour_grid, payload_to_features, season_of
+from model_registry import get_registry
+from prediction_cache import get_cache
+from sweep import DEFAULT_SCENARIO
+
+INPROC = 'inproc'
+ROUTES = ('/predict', '/predict/batch', '/predict/curve')
+DEFAULT_CONCURRENCY = 8
+HTTP_TIMEOUT_S = 30.0
+
+# Synthetic traffic: share of each route, and how the Predict page's
+# sliders move during a drag (field, step, events per burst)
+ROUTE_MIX = {'/predict/curve': 0.7, '/predict': 0.25, '/predict/batch': 0.05}
+BURST_PROBABILITY = 0.3
+BURST_GAP_S = 0.05
+SLIDERS = {'temp': 0.5, 'atemp': 0.5, 'humidity': 1.0, 'windspeed': 0.5, 'hour': 1}
+BURST_STEPS = (3, 12)
+BATCH_ROWS = (8, 64)
+
+# Saturation search
+RATE_GROWTH = 1.5
+STEP_DURATION_S = 10.0
+MIN_ACHIEVED = 0.9
+MAX_ERROR_RATE = 0.01
+DEFAULT_SLO_MS = 250.0
+
+
+# ─────────────────────────────────────────────
+#  REQUEST SOURCES
+# ─────────────────────────────────────────────
+def _has_features(body):
+    if isinstance(body.get('rows'), list):
+        return bool(body['rows']) and all(isinstance(r, dict) and _has_features(r) for r in body['rows'])
+    return any(f in body for f in PAYLOAD_FIELDS)
+
+
+def read_requests(path):
+    """``(requests, skipped)`` from a JSON-lines file of recorded payloads"""
+    requests, skipped = [], 0
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                skipped += 1
+                continue
+            if not isinstance(record, dict):
+                skipped += 1
+                continue
+            body = record.get('body', record)
+            route = record.get('route') or ('/predict/batch' if 'rows' in body else '/predict')
+            if route not in ROUTES or not isinstance(body, dict) or not _has_features(body):
+                skipped += 1
+                continue
+            requests.append((route, body))
+    return requests, skipped
+
+
+def hour_weights():
+    """Probability of each hour, proportional to mean historical demand"""
+    rollups = get_rollups()
+    weights = rollups.hourly_mean('count') if rollups is not None else np.ones(24)
+    weights = np.clip(np.asarray(weights, dtype=float), 0, None)
+    return weights / weights.sum() if weights.sum() else np.full(24, 1 / 24)
+
+
+def _random_payload(rng, hours):
+    payload = dict(DEFAULT_SCENARIO)
+    month = rng.randint(1, 12)
+    temp = round(rng.gauss(8 + 3 * min(month, 13 - month), 5) * 2) / 2
+    payload.update(
+        month=month, day=rng.randint(1, 19),
+        dayofweek=rng.randint(0, 6), yr=rng.randint(0, 1),
+        hour=min(int(np.searchsorted(np.cumsum(hours), rng.random())), 23),
+        weather=rng.choices([1, 2, 3, 4], weights=[66, 26, 8, 0.1])[0],
+        temp=temp, atemp=temp + 3, humidity=rng.randint(20, 100), windspeed=round(rng.uniform(0, 35), 1),
+    )
+    payload['season'] = int(season_of(month, payload['day']))
+    payload['workingday'] = int(payload['dayofweek'] < 5 and not payload['holiday'])
+    return payload
+
+
+def synthetic_schedule(rate, duration, seed=0):
+    """``[(offset s, route, body)]``: Poisson arrivals at ``rate``, some of them drag bursts"""
+    rng = random.Random(seed)
+    hours = hour_weights()
+    routes, shares = zip(*ROUTE_MIX.items())
+    events, t = [], 0.0
+    while True:
+        t += rng.expovariate(rate)
+        if t >= duration:
+            return events
+        route = rng.choices(routes, weights=shares)[0]
+        payload = _random_payload(rng, hours)
+        if route == '/predict/batch':
+            rows = [_random_payload(rng, hours) for _ in range(rng.randint(*BATCH_ROWS))]
+            events.append((t, route, {'rows': rows}))
+        elif rng.random() < BURST_PROBABILITY:
+            # A slider drag: Streamlit reruns the page on every value it passes
+            field = rng.choice(list(SLIDERS))
+            step = SLIDERS[field] * rng.choice([-1, 1])
+            for i in range(rng.randint(*BURST_STEPS)):
+                moved = dict(payload)
+                moved[field] = payload[field] + i * step
+                if field == 'hour':
+                    moved['hour'] = int(moved['hour']) % 24
+                events.append((t + i * BURST_GAP_S, route, moved))
+        else:
+            events.append((t, route, payload))
+
+
+def paced(requests, rate):
+    """Spread replayed requests evenly at ``rate`` per second (0 = all at once)"""
+    return [(i / rate if rate else 0.0, route, body) for i, (route, body) in enumerate(requests)]
+
+
+# ─────────────────────────────────────────────
+#  TARGETS
+# ─────────────────────────────────────────────
+class InProcessTarget:
+    """The server's prediction paths, called directly"""
+
+    name = INPROC
+
+    def __init__(self, use_cache=True):
+        if not get_registry().load_models():
+            raise SystemExit("No trained models found for the in-process target.")
+        self.use_cache = use_cache
+
+    def send(self, route, body):
+        model = body.get('model', ENSEMBLE)
+        if route == '/predict/batch':
+            X = np.vstack([payload_to_features(row) for row in body['rows']]).reshape(-1, N_FEATURES)
+            get_scheduler().predict(X, model)
+        elif route == '/predict/curve':
+            X = payload_to_features(body)
+            if self.use_cache:
+                get_cache().curve(X, model)
+            else:
+                get_scheduler().predict(hour_grid(X, range(24)), model)
+        else:
+            X = payload_to_features(body)
+            if self.use_cache:
+                get_cache().predict_rows(X, model)
+            else:
+                get_scheduler().predict(X, model)
+        return 200
+
+
+class HttpTarget:
+    """A running ``server.py``, one keep-alive connection per sender thread"""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise SystemExit(f"unsupported target '{url}' (use '{INPROC}' or http://host:port)")
+        self.name = url
+        self._conn_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self._netloc = parts.netloc
+        self._prefix = parts.path.rstrip('/')
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._conn_class(self._netloc, timeout=HTTP_TIMEOUT_S)
+        return conn
+
+    def send(self, route, body):
+        data = json.dumps(body).encode()
+        headers = {'Content-Type': 'application/json'}
+        conn = self._connection()
+        try:
+            conn.request('POST', self._prefix + route, data, headers)
+            response = conn.getresponse()
+            response.read()
+            return response.status
+        except (OSError, http.client.HTTPException):
+            # Drop the broken connection so the next request reconnects
+            conn.close()
+            self._local.conn = None
+            raise
+
+
+def make_target(spec, use_cache=True):
+    return InProcessTarget(use_cache) if spec == INPROC else HttpTarget(spec)
+
+
+# ─────────────────────────────────────────────
+#  RUNNER
+# ─────────────────────────────────────────────
+class LoadReport:
+    """Outcome of one run: throughput, latency percentiles and errors, overall and per route"""
+
+    def __init__(self, target, offered_rate, concurrency):
+        self.target = target
+        self.offered_rate = offered_rate
+        self.concurrency = concurrency
+        self.latencies = []   # (route, seconds from scheduled send, seconds of service)
+        self.errors = {}
+        self.wall_s = 0.0
+        self.span_s = 0.0     # offset of the last scheduled request
+        self.skipped = 0
+
+    @property
+    def requests(self):
+        return len(self.latencies) + sum(self.errors.values())
+
+    @property
+    def error_rate(self):
+        return sum(self.errors.values()) / self.requests if self.requests else 0.0
+
+    @property
+    def scheduled_rate(self):
+        return self.requests / self.span_s if self.span_s else 0.0
+
+    @property
+    def throughput(self):
+        return len(self.latencies) / self.wall_s if self.wall_s else 0.0
+
+    def _offered(self):
+        # Bursts ride on top of the synthetic arrival rate, so what was
+        # actually scheduled is the honest offered load
+        if not self.offered_rate or not self.scheduled_rate:
+            return 'max'
+        return f"{self.scheduled_rate:,.1f}"
+
+    def percentiles(self, route=None):
+        values = [lat for r, lat, _ in self.latencies if route is None or r == route]
+        if not values:
+            return None
+        arr = np.asarray(values) * 1000
+        p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+        return {'count': len(arr), 'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99),
+                'max_ms': float(arr.max()), 'mean_ms': float(arr.mean())}
+
+    def as_dict(self):
+        return {
+            'target': self.target,
+            'offered_rate': self.offered_rate,
+            'concurrency': self.concurrency,
+            'requests': self.requests,
+            'ok': len(self.latencies),
+            'skipped': self.skipped,
+            'errors': dict(self.errors),
+            'error_rate': self.error_rate,
+            'wall_s': self.wall_s,
+            'scheduled_rate': self.scheduled_rate,
+            'throughput': self.throughput,
+            'latency': self.percentiles(),
+            'routes': {route: self.percentiles(route) for route in ROUTES if self.percentiles(route)},
+        }
+
+    def summary(self):
+        lat = self.percentiles()
+        lines = [f"{self.requests:,} requests in {self.wall_s:.1f}s against {self.target} "
+                 f"({self.throughput:,.1f} ok/s, offered {self._offered()}/s, "
+                 f"{self.concurrency} senders)"]
+        if self.skipped:
+            lines.append(f"  skipped {self.skipped:,} records without feature fields")
+        if lat:
+            lines.append(f"  latency p50 {lat['p50_ms']:.1f} ms · p95 {lat['p95_ms']:.1f} ms · "
+                         f"p99 {lat['p99_ms']:.1f} ms · max {lat['max_ms']:.1f} ms")
+        for route in ROUTES:
+            r = self.percentiles(route)
+            if r:
+                lines.append(f"  {route:16s} {r['count']:>7,} · p50 {r['p50_ms']:8.1f} ms · p99 {r['p99_ms']:8.1f} ms")
+        if self.errors:
+            detail = ', '.join(f"{k}: {v}" for k, v in sorted(self.errors.items()))
+            lines.append(f"  errors {self.error_rate:.2%} ({detail})")
+        return '\n'.join(lines)
+
+
+def run(target, schedule, concurrency=DEFAULT_CONCURRENCY, offered_rate=0):
+    """Send ``schedule`` (``[(offset s, route, body)]``) to ``target``; returns a ``LoadReport``"""
+    report = LoadReport(target.name, offered_rate, concurrency)
+    schedule = sorted(schedule, key=lambda e: e[0])
+    report.span_s = schedule[-1][0] if schedule else 0.0
+    lock = threading.Lock()
+
+    def one(scheduled, route, body):
+        started = time.perf_counter()
+        try:
+            status = target.send(route, body)
+            error = None if status < 400 else f'http {status}'
+        except Exception as e:
+            error = type(e).__name__
+        done = time.perf_counter()
+        with lock:
+            if error:
+                report.errors[error] = report.errors.get(error, 0) + 1
+            else:
+                report.latencies.append((route, done - scheduled, done - started))
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='loadtest') as pool:
+        t0 = time.perf_counter()
+        for offset, route, body in schedule:
+            delay = t0 + offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(one, t0 + offset, route, body)
+    report.wall_s = time.perf_counter() - t0
+    return report
+
+
+def saturate(target, start_rate, concurrency, slo_ms=DEFAULT_SLO_MS, duration=STEP_DURATION_S,
+             max_steps=12, log=print):
+    """Raise the synthetic rate until throughput, p99 or errors give out.
+
+    Returns ``(last sustained report or None, every report)``.
+    """
+    rate, sustained, reports = float(start_rate), None, []
+    for step in range(max_steps):
+        report = run(target, synthetic_schedule(rate, duration, seed=step), concurrency, round(rate, 1))
+        reports.append(report)
+        lat = report.percentiles()
+        # Bursts add requests on top of the Poisson arrivals, so compare
+        # against what was actually scheduled
+        scheduled = report.scheduled_rate
+        ok = (lat is not None and report.throughput >= MIN_ACHIEVED * scheduled
+              and lat['p99_ms'] <= slo_ms and report.error_rate <= MAX_ERROR_RATE)
+        log(f"  {rate:8.1f}/s arrivals · {scheduled:8.1f}/s offered · {report.throughput:8.1f}/s ok · "
+            f"p99 {lat['p99_ms'] if lat else float('nan'):8.1f} ms · errors {report.error_rate:.1%}"
+            f"{'' if ok else '  <- saturated'}")
+        if not ok:
+            break
+        sustained = report
+        rate *= RATE_GROWTH
+    return sustained, reports
+
+
+# ─────────────────────────────────────────────
+#  CLI
+# ─────────────────────────────────────────────
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the prediction paths in-process or over HTTP")
+    sub = parser.add_subparsers(dest='command', required=True)
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--target', default=INPROC, help=f"'{INPROC}' or a server URL such as http://127.0.0.1:8000")
+    common.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+    common.add_argument('--no-cache', action='store_true', help="in-process: bypass the prediction cache")
+    common.add_argument('-o', '--output', help="write the report(s) as JSON")
+
+    p_replay = sub.add_parser('replay', parents=[common], help="replay recorded request payloads")
+    p_replay.add_argument('path', help="JSON-lines file of payloads")
+    p_replay.add_argument('--rate', type=float, default=0, help="requests per second (0 = as fast as possible)")
+    p_replay.add_argument('--loops', type=int, default=1, help="replay the file this many times")
+
+    p_synth = sub.add_parser('synth', parents=[common], help="send synthetic app-shaped traffic")
+    p_synth.add_argument('--rate', type=float, default=50.0,
+                         help="Poisson arrivals per second; slider-drag bursts add requests on top")
+    p_synth.add_argument('--duration', type=float, default=30.0)
+    p_synth.add_argument('--seed', type=int, default=0)
+
+    p_sat = sub.add_parser('saturate', parents=[common], help="find the highest sustainable synthetic rate")
+    p_sat.add_argument('--start-rate', type=float, default=25.0, help="first Poisson arrival rate")
+    p_sat.add_argument('--step-duration', type=float, default=STEP_DURATION_S)
+    p_sat.add_argument('--slo-ms', type=float, default=DEFAULT_SLO_MS, help="p99 latency limit")
+    p_sat.add_argument('--max-steps', type=int, default=12)
+    args = parser.parse_args(argv)
+
+    target = make_target(args.target, use_cache=not args.no_cache)
+    if args.command == 'replay':
+        requests, skipped = read_requests(args.path)
+        if not requests:
+            raise SystemExit(f"No replayable requests in {args.path} ({skipped:,} records without feature fields).")
+        report = run(target, paced(requests * args.loops, args.rate), args.concurrency, args.rate)
+        report.skipped = skipped
+        reports = [report]
+        print(report.summary())
+    elif args.command == 'synth':
+        schedule = synthetic_schedule(args.rate, args.duration, args.seed)
+        report = run(target, schedule, args.concurrency, args.rate)
+        reports = [report]
+        print(report.summary())
+    else:
+        print(f"Saturation search against {target.name} (p99 SLO {args.slo_ms:g} ms, "
+              f"{args.concurrency} senders, {args.step_duration:g}s steps)")
+        sustained, reports = saturate(target, args.start_rate, args.concurrency, args.slo_ms,
+                                      args.step_duration, args.max_steps)
+        if sustained is None:
+            print(f"Saturated already at {args.start_rate:g}/s; try a lower --start-rate.")
+        else:
+            print(f"Sustained {sustained.throughput:,.1f} requests/s at offered {sustained.scheduled_rate:,.1f}/s "
+                  f"({sustained.offered_rate:g}/s arrivals plus bursts)")
+            print(sustained.summary())
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump([r.as_dict() for r in reports], f, indent=2)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == '__main__':
+    main()
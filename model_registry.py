@@ -0,0 +1,252 @@
+import hashlib
+import io
+import os
+import pickle
+import threading
+import time
+
+from instrumentation import get_instrumentation
+
+
+# ─────────────────────────────────────────────
+#  ARTIFACTS
+# ─────────────────────────────────────────────
+MODEL_FILES = {
+    'Gradient Boosting': 'bike_model_gradientboosting.pkl',
+    'Random Forest': 'bike_model_randomforest.pkl',
+    'XGBoost': 'bike_model_xgboost.pkl',
+    'CatBoost': 'bike_model_catboost.pkl'
+}
+FALLBACK_MODEL = ('Gradient Boosting (Original)', 'bike_model.pkl')
+ENSEMBLE_INFO_FILE = 'bike_ensemble_info.pkl'
+ENSEMBLE_WEIGHTS_FILE = 'bike_ensemble_weights.pkl'
+COMPILED_FILE = 'bike_models_compiled.npz'
+# Dual-target casual / registered model (see riders.py); not an ensemble member
+SPLIT_MODEL_NAME = 'Rider Split'
+SPLIT_MODEL_FILE = 'bike_model_split.pkl'
+
+# 'pickle' serves the library models; 'compiled' serves tree_engine's NumPy
+# export of them (see tree_engine.py) without importing sklearn/xgboost/catboost
+BACKEND = os.environ.get('BIKE_MODEL_BACKEND', 'pickle')
+
+
+class ModelEntry:
+    """A loaded artifact plus the file state it was loaded from"""
+
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+        self.obj = None
+        self.mtime_ns = None
+        self.size = None
+        self.sha256 = None
+        self.load_seconds = None
+        self.memory_bytes = None
+        self.loaded_at = None
+        self.loads = 0
+        self.error = None
+
+    @property
+    def version(self):
+        return self.sha256[:12] if self.sha256 else None
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'path': self.path,
+            'version': self.version,
+            'size': self.size,
+            'load_seconds': self.load_seconds,
+            'memory_bytes': self.memory_bytes,
+            'loaded_at': self.loaded_at,
+            'loads': self.loads,
+            'error': self.error,
+        }
+
+
+def _load_compiled(data):
+    from tree_engine import CompiledForest
+    return CompiledForest.load(io.BytesIO(data))
+
+
+def _array_bytes(obj, limit=100_000):
+    """Bytes held by the NumPy arrays reachable from ``obj``"""
+    import numpy as np
+    # ``seen`` keeps its objects alive so ids of temporary states aren't reused
+    total, seen, stack = 0, {}, [obj]
+    while stack and len(seen) < limit:
+        o = stack.pop()
+        if id(o) in seen or isinstance(o, (str, bytes, int, float, bool, type(None))):
+            continue
+        seen[id(o)] = o
+        if isinstance(o, np.ndarray):
+            total += o.nbytes
+            if o.dtype == object:
+                stack.extend(o.ravel())
+        elif isinstance(o, dict):
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        elif hasattr(o, '__dict__'):
+            stack.extend(vars(o).values())
+        elif hasattr(o, '__getstate__'):
+            # Extension types such as sklearn's Tree expose their arrays here
+            try:
+                stack.append(o.__getstate__())
+            except Exception:
+                pass
+    return total
+
+
+def _unpickle_measured(data, loader=pickle.loads):
+    """Deserialize bytes, returning (obj, seconds, approx bytes held)"""
+    t0 = time.perf_counter()
+    obj = loader(data)
+    seconds = time.perf_counter() - t0
+    # Native boosters (XGBoost/CatBoost) keep their trees outside NumPy,
+    # so the serialized size is the better lower bound for those.
+    return obj, seconds, max(_array_bytes(obj), len(data))
+
+
+# ─────────────────────────────────────────────
+#  REGISTRY
+# ─────────────────────────────────────────────
+class ModelRegistry:
+    """Process-wide cache of unpickled artifacts.
+
+    Every lookup is a single ``os.stat``; a file is re-read only when its
+    mtime or size changes, and re-unpickled only when its content hash does.
+    """
+
+    def __init__(self, base_dir='.', backend=None):
+        self.base_dir = base_dir
+        self.backend = backend or BACKEND
+        self._entries = {}
+        self._lock = threading.RLock()
+        self._listeners = []
+
+    def _path(self, filename):
+        return os.path.join(self.base_dir, filename)
+
+    def get(self, name, filename, loader=pickle.loads):
+        """Return the object stored in ``filename`` or None if unavailable"""
+        entry = self.entry(name, filename, loader)
+        return entry.obj if entry is not None else None
+
+    def entry(self, name, filename, loader=pickle.loads):
+        path = self._path(filename)
+        try:
+            st = os.stat(path)
+        except OSError:
+            with self._lock:
+                self._entries.pop(path, None)
+            return None
+
+        entry = self._entries.get(path)
+        if entry is not None and entry.mtime_ns == st.st_mtime_ns and entry.size == st.st_size:
+            return entry if entry.obj is not None else None
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.mtime_ns == st.st_mtime_ns and entry.size == st.st_size:
+                return entry if entry.obj is not None else None
+            if entry is None:
+                entry = ModelEntry(name, path)
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                digest = hashlib.sha256(data).hexdigest()
+                if digest != entry.sha256 or entry.obj is None:
+                    reloaded = entry.sha256 is not None
+                    obj, seconds, memory = _unpickle_measured(data, loader)
+                    entry.obj = obj
+                    entry.sha256 = digest
+                    entry.load_seconds = seconds
+                    entry.memory_bytes = memory
+                    entry.loaded_at = time.time()
+                    entry.loads += 1
+                    get_instrumentation().observe('model_load', seconds, model=name)
+                    if reloaded:
+                        self._notify(entry)
+                entry.error = None
+            except Exception as e:
+                entry.obj = None
+                entry.error = str(e)
+            entry.mtime_ns = st.st_mtime_ns
+            entry.size = st.st_size
+            self._entries[path] = entry
+            return entry if entry.obj is not None else None
+
+    def on_reload(self, callback):
+        """Call ``callback(name, version)`` whenever a file's content changes"""
+        self._listeners.append(callback)
+
+    def _notify(self, entry):
+        # A compiled table carries several models; report each of them
+        names = getattr(entry.obj, 'names', None) or [entry.name]
+        for callback in self._listeners:
+            for name in names:
+                try:
+                    callback(name, entry.version)
+                except Exception:
+                    pass
+
+    def load_models(self):
+        """Return {display name: model} for every available model file"""
+        if self.backend == 'compiled':
+            forest = self.get('Compiled Models', COMPILED_FILE, _load_compiled)
+            if forest is not None:
+                return forest.as_models()
+
+        available_models = {}
+        for model_name, filename in MODEL_FILES.items():
+            model = self.get(model_name, filename)
+            if model is not None:
+                available_models[model_name] = model
+
+        # Also try to load the original model as fallback
+        if not available_models:
+            model = self.get(*FALLBACK_MODEL)
+            if model is not None:
+                available_models[FALLBACK_MODEL[0]] = model
+
+        return available_models
+
+    def load_ensemble_info(self):
+        return self.get('Ensemble Info', ENSEMBLE_INFO_FILE)
+
+    def load_ensemble_weights(self):
+        return self.get('Ensemble Weights', ENSEMBLE_WEIGHTS_FILE)
+
+    def load_split_model(self):
+        return self.get(SPLIT_MODEL_NAME, SPLIT_MODEL_FILE)
+
+    def version(self, name):
+        """Content version of a loaded model, used to key derived caches"""
+        with self._lock:
+            for entry in self._entries.values():
+                if entry.name == name or name in (getattr(entry.obj, 'names', None) or ()):
+                    return entry.version
+        return None
+
+    def stats(self):
+        with self._lock:
+            return [e.as_dict() for e in self._entries.values()]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Return the registry shared by every session in this process"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry()
+    return _registry
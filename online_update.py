@@ -0,0 +1,344 @@
+"""Incremental model updates from newly arrived hourly rentals.
+
+    python online_update.py new_rentals.csv
+    python online_update.py last_week.csv --trees 50 --models XGBoost,CatBoost
+    python online_update.py kc_today.csv --shard london/kings-cross
+    python online_update.py new_rentals.csv --check-only
+
+Instead of refitting every family on the full train.csv, each published
+model is updated on the new window only (train.csv-shaped rows with
+``count``):
+
+* Gradient Boosting, XGBoost and CatBoost continue boosting from the
+  existing artifact: ``--trees`` more stages, fitted to what the current
+  model still gets wrong on the window.
+* Random Forest grows ``--trees`` new trees on the window. ``--rf refresh``
+  (the default) retires as many of the oldest trees, so the forest keeps
+  its size and slowly forgets old data. ``--rf add`` keeps them all.
+
+A drift check runs first. Each model's and the ensemble's RMSLE on the
+window is compared with the validation RMSLE recorded at training time
+(``bike_ensemble_info.pkl``). If the ensemble is more than ``--tolerance``
+worse, or a boosted model has grown past ``MAX_GROWTH`` times its trained
+size, a few more trees won't do. The run then stops and recommends a full
+``train.py``, or runs one on ``--history`` with ``--retrain``.
+
+An update is kept only if it does not score worse on the held-out tail of
+the window (the last ``--holdout`` fraction, in time order). Kept models
+go to ``models/<version>/`` with a manifest and then atomically replace the
+published files, together with ``bike_ensemble_info.pkl`` re-scored on the
+holdout (see ``refreshed_info``) so later drift checks and the app's RMSLE
+badge describe the updated models. The ensemble weights and the casual /
+registered split model (``bike_model_split.pkl``) are left as trained;
+only ``train.py`` refreshes them. The running app and server pick them up on the next
+request: ``model_registry`` re-reads a file whose mtime or size changed,
+and the prediction cache drops that model's entries. A compiled table
+(``bike_models_compiled.npz``) next to them is re-exported.
+"""
+import argparse
+import json
+import os
+import pickle
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from ensemble import EnsemblePredictor
+from features import frame_to_features
+from model_registry import COMPILED_FILE, ENSEMBLE_INFO_FILE, MODEL_FILES, SPLIT_MODEL_NAME, ModelRegistry
+from prediction import predict_log
+from shards import parse_shard, shard_path
+from storage import load_frame
+from train import ARTIFACT_DIR, MODEL_PARAMS, TRAIN_FILE, _atomic_copy, regression_metrics, rmsle
+
+DEFAULT_TREES = 25
+DRIFT_TOLERANCE = 0.25
+HOLDOUT = 0.25
+# Boosted models only grow; past this multiple of their trained size, retrain
+MAX_GROWTH = 2.0
+
+
+# ─────────────────────────────────────────────
+#  WINDOW
+# ─────────────────────────────────────────────
+def load_window(path):
+    """(X, y) of the new rows in time order, y = log1p(count)"""
+    df = load_frame(path)
+    if 'count' not in df:
+        raise SystemExit(f"{path} has no 'count' column to learn from")
+    import pandas as pd
+    order = np.argsort(pd.to_datetime(df['datetime'], errors='coerce').to_numpy(), kind='stable')
+    df = df.iloc[order]
+    return frame_to_features(df), np.log1p(df['count'].to_numpy(dtype=float))
+
+
+def tree_count(model):
+    """Trees (boosting stages) in a fitted model, or None for an unknown type"""
+    kind = type(model).__name__
+    if kind == 'GradientBoostingRegressor':
+        return int(model.n_estimators_)
+    if kind in ('RandomForestRegressor', 'ExtraTreesRegressor'):
+        return len(model.estimators_)
+    if kind == 'XGBRegressor':
+        return int(model.get_booster().num_boosted_rounds())
+    if kind == 'CatBoostRegressor':
+        return int(model.tree_count_)
+    return None
+
+
+def _trained_size(name, model):
+    params = MODEL_PARAMS.get(name, {})
+    return params.get('n_estimators') or params.get('iterations') or tree_count(model)
+
+
+# ─────────────────────────────────────────────
+#  DRIFT CHECK
+# ─────────────────────────────────────────────
+def drift_report(models, info, X, y, weights=None, tolerance=DRIFT_TOLERANCE):
+    """Window RMSLE of each model and the ensemble against their training-time validation RMSLE"""
+    baselines = (info or {}).get('validation_scores', {})
+    per_model = {name: predict_log(model, X) for name, model in models.items()}
+    report = {'models': {}, 'reasons': []}
+    for name, pred in per_model.items():
+        recent, baseline = rmsle(y, pred), baselines.get(name)
+        size = tree_count(models[name])
+        report['models'][name] = {'recent': recent, 'baseline': baseline,
+                                  'ratio': recent / baseline if baseline else None, 'trees': size}
+        trained = _trained_size(name, models[name])
+        if type(models[name]).__name__ not in ('RandomForestRegressor', 'ExtraTreesRegressor') \
+                and size and trained and size > MAX_GROWTH * trained:
+            report['reasons'].append(f"{name} has {size} trees (trained with {trained})")
+
+    recent = rmsle(y, EnsemblePredictor(models, weights).combine(per_model))
+    baseline = (info or {}).get('ensemble_rmsle')
+    ratio = recent / baseline if baseline else None
+    report['ensemble'] = {'recent': recent, 'baseline': baseline, 'ratio': ratio}
+    if ratio is not None and ratio > 1 + tolerance:
+        report['reasons'].append(f"ensemble RMSLE {recent:.4f} is {ratio - 1:.0%} above {baseline:.4f}")
+    report['retrain'] = bool(report['reasons'])
+    return report
+
+
+# ─────────────────────────────────────────────
+#  UPDATES
+# ─────────────────────────────────────────────
+def update_model(model, X, y, trees=DEFAULT_TREES, rf_mode='refresh', n_jobs=1):
+    """A copy of ``model`` updated on (X, y); the served object is never touched.
+
+    ``n_jobs`` threads fit the update; the copy keeps the model's own
+    ``n_jobs`` for serving.
+    """
+    kind = type(model).__name__
+    if kind == 'XGBRegressor':
+        import xgboost as xgb
+        # xgb.train boosts from the existing model's margins; XGBRegressor.fit(xgb_model=...)
+        # fitted the new rounds as if from the base score and made every update worse
+        params = {k: v for k, v in model.get_xgb_params().items() if v is not None and k != 'n_jobs'}
+        booster = xgb.train({**params, 'nthread': n_jobs}, xgb.DMatrix(X, label=y), trees,
+                            xgb_model=model.get_booster())
+        updated = xgb.XGBRegressor()
+        updated.load_model(bytearray(booster.save_raw('ubj')))
+        updated.set_params(**{**model.get_params(), 'n_estimators': booster.num_boosted_rounds()})
+        return updated
+    if kind == 'CatBoostRegressor':
+        import catboost as cb
+        # A fitted CatBoost model's params can't be changed afterwards, so it
+        # trains with the published thread_count rather than ``n_jobs``
+        params = {**model.get_params(), 'iterations': trees}
+        updated = cb.CatBoostRegressor(**params)
+        updated.fit(X, y, init_model=model)
+        return updated
+
+    updated = pickle.loads(pickle.dumps(model))
+    if kind == 'GradientBoostingRegressor':
+        updated.set_params(warm_start=True, n_estimators=updated.n_estimators_ + trees)
+        updated.fit(X, y)
+        updated.set_params(warm_start=False)
+        return updated
+    if kind in ('RandomForestRegressor', 'ExtraTreesRegressor'):
+        grown = len(updated.estimators_) + trees
+        updated.set_params(warm_start=True, n_estimators=grown, n_jobs=n_jobs)
+        updated.fit(X, y)
+        if rf_mode == 'refresh':
+            updated.estimators_ = updated.estimators_[trees:]
+        # Served with the parallelism it was published with
+        updated.set_params(warm_start=False, n_estimators=len(updated.estimators_), n_jobs=model.n_jobs)
+        return updated
+    raise TypeError(f"no incremental update for {kind}")
+
+
+def refreshed_info(info, models, accepted, weights, X, y, version):
+    """Ensemble info with the kept models' baselines re-scored on the holdout ``(X, y)``.
+
+    The kept models' validation scores and metrics, and the ensemble's, are
+    replaced by their holdout scores, so the next drift check and the app's
+    RMSLE badge compare against the models actually served. The other
+    models keep their training-time scores.
+    """
+    info = dict(info or {})
+    served = {**models, **accepted}
+    preds = {name: predict_log(model, X) for name, model in served.items()}
+    scores = dict(info.get('validation_scores') or {})
+    summary = dict(info.get('metrics_summary') or {})
+    for name in accepted:
+        summary[name] = regression_metrics(y, preds[name])
+        scores[name] = summary[name]['RMSLE']
+    ensemble = regression_metrics(y, EnsemblePredictor(served, weights).combine(preds))
+    info.update({
+        'validation_scores': scores,
+        'metrics_summary': summary,
+        'best_model_name': min(scores, key=scores.get) if scores else info.get('best_model_name'),
+        'ensemble_rmsle': ensemble['RMSLE'],
+        'ensemble_mae': ensemble['MAE'],
+        'ensemble_rmse': ensemble['RMSE'],
+        'ensemble_r2': ensemble['R2'],
+        'ensemble_peak_mae': ensemble['Peak_MAE'],
+        'version': version,
+        'online_update': {'models': sorted(accepted), 'holdout_rows': int(len(y))},
+    })
+    return info
+
+
+def _recompile(models, base_dir):
+    """Re-export the compiled table if the app serves one from ``base_dir``"""
+    path = os.path.join(base_dir, COMPILED_FILE)
+    if not os.path.exists(path):
+        return None
+    from tree_engine import CompiledForest
+    tmp = path + '.tmp.npz'
+    CompiledForest.from_models(models).save(tmp)
+    os.replace(tmp, path)
+    return path
+
+
+def update(window_path, base_dir='.', model_names=None, trees=DEFAULT_TREES, rf_mode='refresh',
+           tolerance=DRIFT_TOLERANCE, holdout=HOLDOUT, out_dir=ARTIFACT_DIR, publish=True,
+           check_only=False, retrain=False, history=TRAIN_FILE, log=print):
+    """Drift-check and incrementally update the models published in ``base_dir``; returns the manifest"""
+    t0 = time.perf_counter()
+    # The library models, even when the app serves the compiled table
+    registry = ModelRegistry(base_dir, backend='pickle')
+    models = registry.load_models()
+    if not models:
+        raise SystemExit(f"No trained models found in {base_dir}.")
+    # Only the named artifacts can be republished (not the bike_model.pkl fallback)
+    model_names = [name for name in (model_names or models) if name in models and name in MODEL_FILES]
+    X, y = load_window(window_path)
+    log(f"Window: {len(X):,} rows from {window_path}")
+
+    report = drift_report(models, registry.load_ensemble_info(), X, y, registry.load_ensemble_weights(), tolerance)
+    for name, r in report['models'].items():
+        baseline = f"{r['baseline']:.4f}" if r['baseline'] is not None else "   n/a"
+        log(f"  {name:20s} RMSLE {r['recent']:.4f} (trained {baseline}) · {r['trees']} trees")
+    version = datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S') + '-online'
+    manifest = {'version': version, 'window': window_path, 'rows': int(len(X)), 'base_dir': base_dir,
+                'drift': report, 'updates': {}, 'files': [], 'published': False}
+
+    if report['retrain']:
+        log("Full retrain needed: " + "; ".join(report['reasons']))
+        manifest['action'] = 'retrain'
+        if retrain:
+            from train import train
+            manifest['retrain_run'] = train(history, out_dir=out_dir, publish=publish, publish_dir=base_dir,
+                                            log=log)['version']
+        return manifest
+    if check_only:
+        manifest['action'] = 'none'
+        return manifest
+
+    # Update on the head of the window, judge on its tail
+    split = len(X) - max(1, int(len(X) * holdout))
+    if split < 1:
+        raise SystemExit(f"Window of {len(X)} rows is too small to update and hold out")
+    accepted = {}
+    for name in model_names:
+        fit_t0 = time.perf_counter()
+        try:
+            updated = update_model(models[name], X[:split], y[:split], trees, rf_mode, os.cpu_count() or 1)
+        except TypeError as e:
+            log(f"  {name:20s} skipped: {e}")
+            manifest['updates'][name] = {'accepted': False, 'error': str(e)}
+            continue
+        before = rmsle(y[split:], predict_log(models[name], X[split:]))
+        after = rmsle(y[split:], predict_log(updated, X[split:]))
+        keep = after <= before
+        manifest['updates'][name] = {'accepted': keep, 'holdout_before': before, 'holdout_after': after,
+                                     'trees': tree_count(updated), 'seconds': time.perf_counter() - fit_t0}
+        log(f"  {name:20s} holdout RMSLE {before:.4f} -> {after:.4f} · "
+            f"{'kept' if keep else 'discarded'} ({tree_count(updated)} trees)")
+        if keep:
+            accepted[name] = updated
+
+    manifest['action'] = 'update' if accepted else 'none'
+    if registry.load_split_model() is not None:
+        # Needs casual / registered targets; it is refreshed by train.py only
+        manifest['not_updated'] = [SPLIT_MODEL_NAME]
+        log(f"  {SPLIT_MODEL_NAME:20s} not updated (needs casual / registered targets; run train.py)")
+    if accepted:
+        run_dir = os.path.join(out_dir, version)
+        os.makedirs(run_dir, exist_ok=True)
+        for name, model in accepted.items():
+            with open(os.path.join(run_dir, MODEL_FILES[name]), 'wb') as f:
+                pickle.dump(model, f)
+            manifest['files'].append(MODEL_FILES[name])
+        info = refreshed_info(registry.load_ensemble_info(), models, accepted, registry.load_ensemble_weights(),
+                              X[split:], y[split:], version)
+        with open(os.path.join(run_dir, ENSEMBLE_INFO_FILE), 'wb') as f:
+            pickle.dump(info, f)
+        manifest['files'].append(ENSEMBLE_INFO_FILE)
+        manifest['ensemble_rmsle'] = info['ensemble_rmsle']
+        if publish:
+            for filename in manifest['files']:
+                _atomic_copy(os.path.join(run_dir, filename), os.path.join(base_dir, filename))
+            manifest['compiled'] = _recompile({**models, **accepted}, base_dir)
+            manifest['published'] = True
+
+    manifest['seconds'] = time.perf_counter() - t0
+    if accepted:
+        with open(os.path.join(out_dir, version, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=2)
+    return manifest
+
+
+# ─────────────────────────────────────────────
+#  CLI
+# ─────────────────────────────────────────────
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Update the bike demand models on newly arrived rentals")
+    parser.add_argument('window', help="CSV (or column store) of new hourly rentals with a count column")
+    parser.add_argument('--models', help=f"comma-separated subset of: {', '.join(MODEL_FILES)}")
+    parser.add_argument('--trees', type=int, default=DEFAULT_TREES, help="boosting stages / forest trees to add")
+    parser.add_argument('--rf', choices=('refresh', 'add'), default='refresh',
+                        help="retire the oldest forest trees (refresh) or keep them (add)")
+    parser.add_argument('--tolerance', type=float, default=DRIFT_TOLERANCE,
+                        help="relative RMSLE increase that calls for a full retrain")
+    parser.add_argument('--holdout', type=float, default=HOLDOUT, help="fraction of the window to judge updates on")
+    parser.add_argument('--shard', help="update a city or city/station shard instead of the app's files")
+    parser.add_argument('--out', default=ARTIFACT_DIR, help="directory for versioned runs")
+    parser.add_argument('--no-publish', action='store_true', help="don't replace the artifacts the app reads")
+    parser.add_argument('--check-only', action='store_true', help="only run the drift check")
+    parser.add_argument('--retrain', action='store_true', help="run a full train.py on --history when drifted")
+    parser.add_argument('--history', default=TRAIN_FILE, help="training data for --retrain")
+    args = parser.parse_args(argv)
+
+    model_names = [m.strip() for m in args.models.split(',')] if args.models else None
+    unknown = [m for m in model_names or [] if m not in MODEL_FILES]
+    if unknown:
+        parser.error(f"unknown model(s): {', '.join(unknown)}")
+    try:
+        shard = parse_shard(args.shard)
+    except ValueError as e:
+        parser.error(str(e))
+    base_dir, out_dir = '.', args.out
+    if shard is not None:
+        base_dir, out_dir = shard_path(shard), os.path.join(args.out, *shard.split('/'))
+
+    manifest = update(args.window, base_dir, model_names, args.trees, args.rf, args.tolerance, args.holdout,
+                      out_dir, not args.no_publish, args.check_only, args.retrain, args.history)
+    print(f"\n{manifest['version']} · {manifest['action']}"
+          + (f" · published {', '.join(manifest['files'])}" if manifest['published'] else ""))
+
+
+if __name__ == '__main__':
+    main()
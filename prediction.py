@@ -0,0 +1,53 @@
+import numpy as np
+
+from features import feature_grid, hour_grid
+from records import model_input
+
+
+# ─────────────────────────────────────────────
+#  BATCHED PREDICTION
+#  Models are trained on log1p(count); everything here stays in log space
+#  until ``to_counts`` so ensembles (``ensemble.EnsemblePredictor``) can
+#  be averaged before expm1.
+# ─────────────────────────────────────────────
+def predict_log(model, X, chunk_rows=None):
+    """Run ``model.predict`` over a feature matrix, optionally in row chunks"""
+    # float32 rows (records.FEATURE_DTYPE) go to the model as they are
+    X = model_input(X)
+    if not chunk_rows or len(X) <= chunk_rows:
+        return np.asarray(model.predict(X), dtype=float).ravel()
+    out = np.empty(len(X), dtype=float)
+    for start in range(0, len(X), chunk_rows):
+        stop = start + chunk_rows
+        out[start:stop] = np.asarray(model.predict(X[start:stop]), dtype=float).ravel()
+    return out
+
+
+def to_counts(pred_log):
+    """Convert log predictions to non-negative integer bike counts"""
+    return np.maximum(np.expm1(pred_log), 0).astype(int)
+
+
+def predict_many(models, X, chunk_rows=None):
+    """Score one shared matrix with every model: {name: log predictions}"""
+    return {name: predict_log(model, X, chunk_rows) for name, model in models.items()}
+
+
+def predict_for_hours(model, base_features, hours_range):
+    """Hourly curve for one model from a single (len(hours) x 13) predict call"""
+    return to_counts(predict_log(model, hour_grid(base_features, hours_range))).tolist()
+
+
+def predict_curve(models, base_features, hours_range=range(24)):
+    """Hourly log-prediction curve for every model: {name: array(len(hours))}"""
+    return predict_many(models, hour_grid(base_features, hours_range))
+
+
+def predict_grid(models, base_features, chunk_rows=None, **axes):
+    """Predict a cartesian scenario grid with one batched call per model.
+
+    ``axes`` are passed to ``features.feature_grid``. Returns
+    ``{name: log predictions shaped like the grid}``.
+    """
+    X, shape = feature_grid(base_features, **axes)
+    return {name: pred.reshape(shape) for name, pred in predict_many(models, X, chunk_rows).items()}
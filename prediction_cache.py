@@ -0,0 +1,166 @@
+import collections
+import sys
+import threading
+import time
+
+import numpy as np
+
+from batching import ENSEMBLE, get_scheduler
+from features import FEATURE_INDEX, hour_grid
+from model_registry import get_registry
+
+MAX_ENTRIES = 50_000
+MAX_BYTES = 64 * 1024 * 1024
+TTL_S = 600.0
+# Normalized weather features live in [0, 1]; 4 decimals is finer than any
+# form step (0.5 °C ~ 0.011) while still merging float noise.
+DECIMALS = 4
+_ENTRY_OVERHEAD = 200
+
+
+def quantize(X, decimals=DECIMALS):
+    return np.round(np.asarray(X, dtype=float), decimals) + 0.0  # +0.0 folds -0.0 into 0.0
+
+
+# ─────────────────────────────────────────────
+#  CACHE
+# ─────────────────────────────────────────────
+class PredictionCache:
+    """LRU + TTL cache of log predictions.
+
+    Keys are ``(kind, model name, model version, quantized features)``, so a
+    changed model file never serves stale values; entries for the old
+    version are also purged eagerly when the registry reloads a model.
+    Memory is bounded by both entry count and value bytes.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES, ttl_s=TTL_S, decimals=DECIMALS):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self.decimals = decimals
+        self._data = collections.OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _version(self, model):
+        registry = get_registry()
+        if model == ENSEMBLE:
+            versions = tuple(registry.version(name) for name in registry.load_models())
+            return versions + (registry.version('Ensemble Weights'),)
+        return registry.version(model)
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            value, expires, _ = item
+            if expires < time.monotonic():
+                self._drop(key)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = value.nbytes + sys.getsizeof(key[-1]) + _ENTRY_OVERHEAD
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (value, time.monotonic() + self.ttl_s, size)
+            self._bytes += size
+            while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                self._drop(next(iter(self._data)))
+                self.evictions += 1
+
+    def _drop(self, key):
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+    def invalidate(self, model=None):
+        """Drop entries for ``model`` (and the ensemble), or everything"""
+        with self._lock:
+            if model is None:
+                self._data.clear()
+                self._bytes = 0
+                return
+            for key in [k for k in self._data if k[1] in (model, ENSEMBLE)]:
+                self._drop(key)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._data),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+    # ── cached prediction paths ──
+    def predict_rows(self, X, model=ENSEMBLE, predict=None, interval=False):
+        """Log predictions for each row of ``X``, predicting only cache misses.
+
+        With ``interval=True`` the result is the ``(3, n)`` point / lower /
+        upper rows of ``intervals``, cached separately from plain points.
+        """
+        predict = predict or get_scheduler().predict
+        Xq = quantize(np.atleast_2d(X), self.decimals)
+        version = self._version(model)
+        kind = 'row_iv' if interval else 'row'
+        keys = [(kind, model, version, row.tobytes()) for row in Xq]
+
+        out = np.empty((3 if interval else 1, len(Xq)), dtype=float)
+        missing = []
+        for i, key in enumerate(keys):
+            value = self.get(key)
+            if value is None:
+                missing.append(i)
+            else:
+                out[:, i] = value
+        if missing:
+            pred = predict(Xq[missing], model, interval=True) if interval else predict(Xq[missing], model)
+            pred = np.asarray(pred, dtype=float).reshape(len(out), -1)
+            for j, i in enumerate(missing):
+                out[:, i] = pred[:, j]
+                self.put(keys[i], pred[:, j].copy())
+        return out if interval else out[0]
+
+    def curve(self, base_features, model=ENSEMBLE, hours_range=range(24), predict=None, interval=False):
+        """Whole hourly log-prediction curve, cached as one entry (``(3, 24)`` with ``interval``)"""
+        predict = predict or get_scheduler().predict
+        base = quantize(base_features, self.decimals)
+        base[FEATURE_INDEX['hour']] = 0
+        hours = tuple(hours_range)
+        key = ('curve_iv' if interval else 'curve', model, self._version(model),
+               base.tobytes() + repr(hours).encode())
+        value = self.get(key)
+        if value is None:
+            grid = hour_grid(base, hours)
+            value = np.asarray(predict(grid, model, interval=True) if interval else predict(grid, model),
+                               dtype=float)
+            self.put(key, value)
+        return value
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Return the prediction cache shared by every session in this process"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PredictionCache()
+                get_registry().on_reload(lambda name, version: _cache.invalidate(name))
+    return _cache
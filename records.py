@@ -0,0 +1,225 @@
+"""Compact typed containers for feature rows and prediction results.
+
+``FEATURE_DTYPE`` is a structured dtype with one float32 field per model
+feature, in ``FEATURE_NAMES`` order. Every model tests its splits in
+float32 (the sklearn trees, XGBoost, CatBoost and ``tree_engine`` all cast
+their input), so float32 rows predict exactly what float64 rows do at half
+the memory. Values are still computed in float64 and only then stored.
+The fields are packed and share one type, so a record array *is* the
+(n, 13) model matrix: ``as_matrix`` and ``as_records`` are views, not
+copies.
+
+``FeatureBatch`` and ``ResultBatch`` are growable, array-backed containers
+for many scenarios or results; ``PredictionResult`` is the ``__slots__``
+record one result reads back as. Model names are interned once per process
+and results store a small integer id.
+"""
+import threading
+
+import numpy as np
+
+from features import (FEATURE_NAMES, N_FEATURES, PAYLOAD_FIELDS, normalize_humidity, normalize_temperature,
+                      normalize_windspeed)
+
+FEATURE_DTYPE = np.dtype([(name, np.float32) for name in FEATURE_NAMES])
+RESULT_DTYPE = np.dtype([('model', np.int16), ('count', np.int32), ('log_pred', np.float32), ('ms', np.float32)])
+
+_NORMALIZE = {
+    'temp': normalize_temperature,
+    'atemp': normalize_temperature,
+    'humidity': normalize_humidity,
+    'windspeed': normalize_windspeed,
+}
+
+
+# ─────────────────────────────────────────────
+#  FEATURE ROWS
+# ─────────────────────────────────────────────
+def model_input(X):
+    """``X`` as a 2-D float matrix, keeping float32 input as is instead of upcasting"""
+    X = np.asarray(X)
+    if X.dtype not in (np.float32, np.float64):
+        X = X.astype(np.float64)
+    return X.reshape(1, -1) if X.ndim == 1 else X
+
+
+def as_matrix(records):
+    """The (n, 13) float32 model matrix over a feature record array, without copying"""
+    records = np.asarray(records)
+    if records.dtype != FEATURE_DTYPE:
+        raise TypeError(f"expected FEATURE_DTYPE records, got {records.dtype}")
+    return records.reshape(-1).view(np.float32).reshape(-1, N_FEATURES)
+
+
+def as_records(X):
+    """Feature records over an (n, 13) matrix; a view when ``X`` is C-contiguous float32"""
+    X = np.ascontiguousarray(np.atleast_2d(X), dtype=np.float32)
+    if X.shape[1] != N_FEATURES:
+        raise ValueError(f"expected {N_FEATURES} feature columns, got {X.shape[1]}")
+    return X.view(FEATURE_DTYPE).reshape(-1)
+
+
+def new_matrix(n, base=None):
+    """An (n, 13) float32 matrix, every row set to ``base`` when given"""
+    X = np.empty((n, N_FEATURES), dtype=np.float32)
+    if base is not None:
+        X[:] = np.asarray(base, dtype=np.float64)
+    return X
+
+
+def from_payloads(payloads):
+    """Feature records from raw form payloads (°C, %, km/h), normalized column-wise.
+
+    Raises ``KeyError`` naming the first missing field, like
+    ``features.payload_to_features``.
+    """
+    payloads = list(payloads)
+    records = np.empty(len(payloads), dtype=FEATURE_DTYPE)
+    for field in PAYLOAD_FIELDS:
+        try:
+            column = np.array([float(p[field]) for p in payloads], dtype=np.float64)
+        except KeyError:
+            raise KeyError(field)
+        normalize = _NORMALIZE.get(field)
+        records[field] = normalize(column) if normalize else column
+    return records
+
+
+class FeatureBatch:
+    """Growable array of feature records; ``matrix`` is the model input, as a view"""
+
+    __slots__ = ('_data', '_size')
+
+    def __init__(self, capacity=16):
+        self._data = np.empty(max(int(capacity), 1), dtype=FEATURE_DTYPE)
+        self._size = 0
+
+    @classmethod
+    def from_matrix(cls, X):
+        batch = cls(0)
+        batch._data = as_records(X)
+        batch._size = len(batch._data)
+        return batch
+
+    def _reserve(self, n):
+        if self._size + n > len(self._data):
+            grown = np.empty(max(len(self._data) * 2, self._size + n), dtype=FEATURE_DTYPE)
+            grown[:self._size] = self._data[:self._size]
+            self._data = grown
+
+    def append(self, features):
+        """Add one 13-value feature row (model units) or a raw payload dict"""
+        if isinstance(features, dict):
+            self.extend_records(from_payloads([features]))
+        else:
+            self.extend(np.asarray(features, dtype=np.float64).reshape(1, N_FEATURES))
+
+    def extend(self, X):
+        X = np.atleast_2d(X)
+        self._reserve(len(X))
+        as_matrix(self._data)[self._size:self._size + len(X)] = X
+        self._size += len(X)
+
+    def extend_records(self, records):
+        self._reserve(len(records))
+        self._data[self._size:self._size + len(records)] = records
+        self._size += len(records)
+
+    @property
+    def records(self):
+        return self._data[:self._size]
+
+    @property
+    def matrix(self):
+        return as_matrix(self.records)
+
+    @property
+    def nbytes(self):
+        return self._data.nbytes
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, i):
+        return self.records[i]
+
+
+# ─────────────────────────────────────────────
+#  RESULTS
+# ─────────────────────────────────────────────
+_model_ids = {}
+_model_names = []
+_model_lock = threading.Lock()
+
+
+def model_id(name):
+    """Small process-wide integer id for a model name"""
+    mid = _model_ids.get(name)
+    if mid is None:
+        with _model_lock:
+            mid = _model_ids.get(name)
+            if mid is None:
+                mid = _model_ids[name] = len(_model_names)
+                _model_names.append(name)
+    return mid
+
+
+def model_name(mid):
+    return _model_names[mid]
+
+
+class PredictionResult:
+    """One model's prediction for one row"""
+
+    __slots__ = ('model', 'count', 'log_pred', 'ms')
+
+    def __init__(self, model, count, log_pred=float('nan'), ms=float('nan')):
+        self.model = model
+        self.count = count
+        self.log_pred = log_pred
+        self.ms = ms
+
+    def __repr__(self):
+        return f"PredictionResult({self.model!r}, count={self.count}, ms={self.ms:.2f})"
+
+
+class ResultBatch:
+    """Growable array of results (model id, count, log prediction, ms)"""
+
+    __slots__ = ('_data', '_size')
+
+    def __init__(self, capacity=8):
+        self._data = np.empty(max(int(capacity), 1), dtype=RESULT_DTYPE)
+        self._size = 0
+
+    def add(self, model, count, log_pred=float('nan'), ms=float('nan')):
+        if self._size == len(self._data):
+            grown = np.empty(len(self._data) * 2, dtype=RESULT_DTYPE)
+            grown[:self._size] = self._data[:self._size]
+            self._data = grown
+        self._data[self._size] = (model_id(model), count, log_pred, ms)
+        self._size += 1
+
+    @property
+    def array(self):
+        return self._data[:self._size]
+
+    @property
+    def models(self):
+        return [model_name(mid) for mid in self.array['model']]
+
+    @property
+    def counts(self):
+        return self.array['count']
+
+    def items(self):
+        """``(model name, count)`` pairs, like the dict this replaces"""
+        return zip(self.models, self.counts.tolist())
+
+    def __iter__(self):
+        for row in self.array:
+            yield PredictionResult(model_name(row['model']), int(row['count']),
+                                   float(row['log_pred']), float(row['ms']))
+
+    def __len__(self):
+        return self._size
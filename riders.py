@@ -0,0 +1,126 @@
+"""Casual and registered demand from one dual-target model.
+
+train.csv's ``count`` is ``casual + registered``. The split model is fitted
+on both ``log1p`` targets at once: a multi-output Random Forest (each leaf
+stores both values), XGBoost's ``multi_output_tree`` or CatBoost's
+``MultiRMSE``. A single ``predict`` over the shared feature matrix then
+returns both columns, so the second target costs no second pass over the
+trees. The total is the sum of the two counts.
+
+Split predictions are ``(n, 2)`` log1p arrays: casual, registered columns.
+The batch scheduler serves them as model ``'split'``; ``hourly_split``
+averages them over the rental history for the Dashboard.
+"""
+import os
+import threading
+
+import numpy as np
+
+from features import FEATURE_INDEX, frame_to_features
+from model_registry import SPLIT_MODEL_NAME, get_registry
+from prediction import to_counts
+from records import model_input
+
+TARGETS = ('casual', 'registered')
+SPLIT_FAMILIES = ('Random Forest', 'XGBoost', 'CatBoost')
+DEFAULT_FAMILY = 'Random Forest'
+HISTORY_FILE = 'train.csv'
+
+# What each family needs on top of train.MODEL_PARAMS to fit both targets jointly
+_MULTI_OUTPUT = {
+    'Random Forest': {},
+    'XGBoost': dict(multi_strategy='multi_output_tree', tree_method='hist'),
+    'CatBoost': dict(loss_function='MultiRMSE'),
+}
+
+
+def make_split_model(family=DEFAULT_FAMILY, n_jobs=1):
+    """Unfitted dual-target model of ``family``"""
+    from train import make_model
+    if family not in _MULTI_OUTPUT:
+        raise KeyError(family)
+    return make_model(family, n_jobs, **_MULTI_OUTPUT[family])
+
+
+def target_logs(df):
+    """``(n, 2)`` log1p casual / registered targets of a rental frame"""
+    return np.log1p(df[list(TARGETS)].to_numpy(dtype=float))
+
+
+def predict_split(model, X):
+    """``(n, 2)`` log1p casual / registered predictions from one ``predict`` call"""
+    pred = np.asarray(model.predict(model_input(X)), dtype=float)
+    return pred.reshape(-1, len(TARGETS))
+
+
+def split_counts(pred_log):
+    """``{'casual', 'registered', 'count'}`` bike counts from ``(n, 2)`` log predictions"""
+    pred_log = np.asarray(pred_log, dtype=float).reshape(-1, len(TARGETS))
+    casual, registered = to_counts(pred_log[:, 0]), to_counts(pred_log[:, 1])
+    return {'casual': casual.tolist(), 'registered': registered.tolist(),
+            'count': (casual + registered).tolist()}
+
+
+# ─────────────────────────────────────────────
+#  DASHBOARD
+# ─────────────────────────────────────────────
+_hourly = {'key': None, 'value': None, 'refreshing': False}
+_hourly_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+
+
+def hourly_split(history=HISTORY_FILE, block=True):
+    """Mean predicted ``(registered, casual)`` bikes per hour over the rental history.
+
+    One batched predict over every history row, cached until the split model
+    or the history file changes. Returns None without a split model or history.
+    With ``block=False`` it never predicts (or loads the model) in the caller:
+    it returns the last value, None before the first one, and leaves checking
+    for a newer model or history to a background thread.
+    """
+    if not block:
+        _refresh_in_background(history)
+        return _hourly['value']
+    registry = get_registry()
+    model = registry.load_split_model()
+    try:
+        st = os.stat(history)
+    except OSError:
+        st = None
+    if model is None or st is None:
+        _hourly['value'] = _hourly['key'] = None
+        return None
+    key = (registry.version(SPLIT_MODEL_NAME), history, st.st_mtime_ns, st.st_size)
+    if _hourly['key'] == key:
+        return _hourly['value']
+    with _hourly_lock:
+        if _hourly['key'] != key:
+            from storage import load_frame
+            X = frame_to_features(load_frame(history))
+            bikes = np.maximum(np.expm1(predict_split(model, X)), 0)
+            hour = X[:, FEATURE_INDEX['hour']].astype(int)
+            rows = np.maximum(np.bincount(hour, minlength=24), 1)
+            casual, registered = (np.bincount(hour, weights=bikes[:, j], minlength=24) / rows
+                                  for j in range(len(TARGETS)))
+            _hourly['value'] = (registered, casual)
+            _hourly['key'] = key
+        return _hourly['value']
+
+
+def _refresh_in_background(history):
+    """Run a blocking ``hourly_split`` on a daemon thread unless one is already running"""
+    # Not _hourly_lock: that one is held for the whole computation
+    with _refresh_lock:
+        if _hourly['refreshing']:
+            return
+        _hourly['refreshing'] = True
+
+    def refresh():
+        try:
+            hourly_split(history, block=True)
+        except Exception:
+            pass
+        finally:
+            _hourly['refreshing'] = False
+
+    threading.Thread(target=refresh, name='hourly-split', daemon=True).start()
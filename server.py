@@ -0,0 +1,316 @@
+"""Standalone async prediction service.
+
+    uvicorn server:app --host 0.0.0.0 --port 8000
+
+Endpoints (JSON in, JSON out; weather fields in °C, %, km/h as on the
+Predict Demand form):
+
+    GET  /health          loaded models and their versions, available shards
+    GET  /metrics         micro-batching, cache, ensemble and stage-latency metrics
+    GET  /metrics/prometheus  stage latency histograms as Prometheus text
+    POST /predict         one row            -> {"model", "count"}
+    POST /predict/batch   {"rows": [...]}    -> {"model", "counts"}
+    POST /predict/curve   one row            -> {"model", "hours", "counts"}
+    POST /predict/split   {"rows": [...]}    -> {"casual", "registered", "counts"}
+
+Every body may carry ``"model"``: a model name or ``"ensemble"`` (default),
+and ``"interval": true`` to add the 80% range, ``"lower"`` / ``"upper"``
+next to ``"count"`` / ``"counts"`` (None for a model with no spread; see
+``intervals``). Bounds come from the same batched pass as the point.
+Rows from concurrent requests are micro-batched into a single ``predict``
+call per model by the shared ``batching.BatchScheduler``. Single-row and
+curve results are served from the shared ``prediction_cache`` when the
+same (quantized) inputs were seen before. Split requests score casual and
+registered riders with the dual-target model (see ``riders``) in one call;
+``"counts"`` is their sum.
+
+Rows (or single-row bodies) may name a ``"city"`` and ``"station"`` to be
+scored by that shard's models (see ``shards``); a body-level city /
+station applies to rows without one, and rows with neither use the flat
+model files. Batch rows are grouped by shard, one scheduler request per
+shard, and answered in their original order. Sharded single-row and curve
+requests skip the prediction cache.
+"""
+import asyncio
+import collections
+import json
+
+import numpy as np
+
+from batching import ENSEMBLE, SPLIT, get_scheduler
+from ensemble import get_ensemble
+from features import PAYLOAD_FIELDS, hour_grid, payload_to_features
+from instrumentation import get_instrumentation
+from intervals import interval_counts
+from model_registry import get_registry
+from prediction import to_counts
+from prediction_cache import get_cache
+from records import as_matrix, from_payloads
+from riders import split_counts
+from shards import get_shards, list_shards, shard_key
+
+HOURS = list(range(24))
+
+
+class BadRequest(Exception):
+    pass
+
+
+# ─────────────────────────────────────────────
+#  HANDLERS
+# ─────────────────────────────────────────────
+async def _predict(X, model, interval=False, shard=None):
+    return await asyncio.wrap_future(get_scheduler().submit(X, model, interval=interval, shard=shard))
+
+
+def _registry_of(shard):
+    if shard is None:
+        return get_registry()
+    try:
+        return get_shards().registry(shard)
+    except KeyError:
+        raise BadRequest(f"unknown shard '{shard}'")
+
+
+def _models_of(shard):
+    return _registry_of(shard).load_models()
+
+
+def _split_model_of(shard):
+    return _registry_of(shard).load_split_model()
+
+
+async def _model_of(body, shard=None):
+    model = body.get('model', ENSEMBLE)
+    # Stats every model file, and unpickles a cold shard or a changed file:
+    # off the event loop
+    models = await _cached(_models_of, shard)
+    where = f" for '{shard}'" if shard is not None else ""
+    if not models:
+        raise BadRequest(f"no trained models available{where}")
+    if model != ENSEMBLE and model not in models:
+        raise BadRequest(f"unknown model '{model}'{where} (have: {', '.join(models)})")
+    return model
+
+
+def _shard_of(row, body=None):
+    body = body or {}
+    try:
+        return shard_key(row.get('city', body.get('city')), row.get('station', body.get('station')))
+    except ValueError as e:
+        raise BadRequest(str(e))
+
+
+async def _predict_grouped(X, shards, model, interval=False):
+    """One scheduler request per shard; results put back in row order"""
+    groups = collections.defaultdict(list)
+    for i, shard in enumerate(shards):
+        groups[shard].append(i)
+    if len(groups) == 1:
+        return await _predict(X, model, interval, shards[0])
+    results = await asyncio.gather(*(_predict(X[idx], model, interval, shard) for shard, idx in groups.items()))
+    # Point and split results are row-major; interval rows keep rows on the last axis
+    first = np.asarray(results[0])
+    shape = (first.shape[0], len(X)) if interval else (len(X),) + first.shape[1:]
+    out = np.empty(shape)
+    for idx, pred in zip(groups.values(), results):
+        if interval:
+            out[:, idx] = pred
+        else:
+            out[idx] = pred
+    return out
+
+
+def _interval_of(body):
+    interval = body.get('interval', False)
+    if not isinstance(interval, bool):
+        raise BadRequest("'interval' must be true or false")
+    return interval
+
+
+def _finite(X, rows):
+    """``X``, or ``BadRequest`` naming the fields that hold NaN or infinity.
+
+    The raw values are checked too: normalization clips infinities into range.
+    """
+    raw = np.array([[float(row[field]) for field in PAYLOAD_FIELDS] for row in rows])
+    bad = ~np.isfinite(raw).all(axis=0) | ~np.isfinite(np.atleast_2d(X)).all(axis=0)
+    if bad.any():
+        fields = [name for name, b in zip(PAYLOAD_FIELDS, bad) if b]
+        raise BadRequest(f"non-finite value for {', '.join(fields)}")
+    return X
+
+
+def _features(row):
+    try:
+        X = payload_to_features(row)
+    except KeyError as e:
+        raise BadRequest(f"missing field {e}")
+    except (TypeError, ValueError) as e:
+        raise BadRequest(f"bad field value: {e}")
+    return _finite(X, [row])
+
+
+async def _cached(method, *args):
+    return await asyncio.get_running_loop().run_in_executor(None, method, *args)
+
+
+async def predict_one(body):
+    shard = _shard_of(body)
+    model = await _model_of(body, shard)
+    interval = _interval_of(body)
+    if shard is not None:
+        pred_log = await _predict(_features(body), model, interval, shard)
+    else:
+        pred_log = await _cached(get_cache().predict_rows, _features(body), model, None, interval)
+    if interval:
+        bikes = interval_counts(pred_log)
+        return {'model': model, **{key: values[0] for key, values in bikes.items()}}
+    return {'model': model, 'count': int(to_counts(pred_log)[0])}
+
+
+def _rows(body):
+    """The batch's feature matrix and the shard of every row"""
+    rows = body.get('rows')
+    if not isinstance(rows, list) or not rows:
+        raise BadRequest("'rows' must be a non-empty list")
+    if not all(isinstance(row, dict) for row in rows):
+        raise BadRequest("every entry of 'rows' must be an object")
+    try:
+        X = as_matrix(from_payloads(rows))
+    except KeyError as e:
+        raise BadRequest(f"missing field {e}")
+    except (TypeError, ValueError) as e:
+        raise BadRequest(f"bad field value: {e}")
+    return _finite(X, rows), [_shard_of(row, body) for row in rows]
+
+
+async def predict_batch(body):
+    X, shards = _rows(body)
+    # The model must exist in every shard the rows name
+    for shard in set(shards):
+        model = await _model_of(body, shard)
+    interval = _interval_of(body)
+    pred_log = await _predict_grouped(X, shards, model, interval)
+    if interval:
+        bikes = interval_counts(pred_log)
+        return {'model': model, 'counts': bikes['count'], 'lower': bikes['lower'], 'upper': bikes['upper']}
+    return {'model': model, 'counts': to_counts(pred_log).tolist()}
+
+
+async def predict_curve(body):
+    shard = _shard_of(body)
+    model = await _model_of(body, shard)
+    interval = _interval_of(body)
+    if shard is not None:
+        pred_log = await _predict(hour_grid(_features(body), HOURS), model, interval, shard)
+    else:
+        pred_log = await _cached(get_cache().curve, _features(body), model, HOURS, None, interval)
+    if interval:
+        bikes = interval_counts(pred_log)
+        return {'model': model, 'hours': HOURS, 'counts': bikes['count'],
+                'lower': bikes['lower'], 'upper': bikes['upper']}
+    return {'model': model, 'hours': HOURS, 'counts': to_counts(pred_log).tolist()}
+
+
+async def predict_split(body):
+    X, shards = _rows(body)
+    for shard in set(shards):
+        if await _cached(_split_model_of, shard) is None:
+            where = f" for '{shard}'" if shard is not None else ""
+            raise BadRequest(f"no casual / registered split model available{where}")
+    bikes = split_counts(await _predict_grouped(X, shards, SPLIT))
+    return {'model': SPLIT, 'casual': bikes['casual'], 'registered': bikes['registered'],
+            'counts': bikes['count']}
+
+
+async def health(_body):
+    registry = get_registry()
+    models = await _cached(registry.load_models)
+    return {'status': 'ok' if models else 'no-models',
+            'models': {name: registry.version(name) for name in models},
+            'shards': list_shards()}
+
+
+async def metrics(_body):
+    ensemble = await _cached(get_ensemble)
+    return {'batching': get_scheduler().metrics(), 'cache': get_cache().stats(),
+            'ensemble': ensemble.timings(), 'shards': get_shards().stats(),
+            'stages': get_instrumentation().snapshot()}
+
+
+async def metrics_prometheus(_body):
+    return get_instrumentation().prometheus()
+
+
+ROUTES = {
+    ('GET', '/health'): health,
+    ('GET', '/metrics'): metrics,
+    ('GET', '/metrics/prometheus'): metrics_prometheus,
+    ('POST', '/predict'): predict_one,
+    ('POST', '/predict/batch'): predict_batch,
+    ('POST', '/predict/curve'): predict_curve,
+    ('POST', '/predict/split'): predict_split,
+}
+
+
+# ─────────────────────────────────────────────
+#  ASGI APP
+# ─────────────────────────────────────────────
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def _send_json(send, status, payload):
+    await _send(send, status, json.dumps(payload).encode(), b'application/json')
+
+
+async def _send(send, status, body, content_type):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', content_type),
+                            (b'content-length', str(len(body)).encode())]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                # Warm the registry so the first request doesn't pay for unpickling
+                with get_instrumentation().timer('prewarm', step='server_models'):
+                    await _cached(get_registry().load_models)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    if scope['type'] != 'http':
+        return
+
+    handler = ROUTES.get((scope['method'], scope['path']))
+    if handler is None:
+        await _send_json(send, 404, {'error': 'not found'})
+        return
+    try:
+        raw = await _read_body(receive)
+        body = json.loads(raw) if raw else {}
+        if not isinstance(body, dict):
+            raise BadRequest("body must be a JSON object")
+        with get_instrumentation().timer('request', route=scope['path']):
+            result = await handler(body)
+        if isinstance(result, str):
+            await _send(send, 200, result.encode(), b'text/plain; version=0.0.4')
+        else:
+            await _send_json(send, 200, result)
+    except json.JSONDecodeError as e:
+        await _send_json(send, 400, {'error': f"invalid JSON: {e}"})
+    except BadRequest as e:
+        await _send_json(send, 400, {'error': str(e)})
+    except Exception as e:
+        await _send_json(send, 500, {'error': str(e)})
@@ -0,0 +1,219 @@
+"""Per-city / per-station model shards, loaded on demand under a memory budget.
+
+A shard is a directory under ``SHARD_DIR`` holding the same artifacts as
+the app's flat layout (``bike_model_*.pkl``, ensemble weights and info,
+optionally the rider split model)::
+
+    shards/london/bike_model_xgboost.pkl             shard 'london'
+    shards/london/kings-cross/bike_model_*.pkl       shard 'london/kings-cross'
+
+``python train.py --shard london/kings-cross --data kings_cross.csv``
+publishes one. Rows without a shard keep using the flat files through
+``model_registry.get_registry()``.
+
+``ShardedRegistry`` keeps one ``ModelRegistry`` per shard in LRU order.
+A shard is unpickled the first time it is asked for. Once the loaded
+shards' models exceed ``SHARD_MEMORY_BUDGET`` bytes (as measured by the
+registry at load time), the least recently used ones are dropped. The
+batch scheduler groups rows by shard, so each shard's models run once per
+batch; it hands requests for a cold shard to ``prefetch`` and queues them
+again once the shard is loaded, so a load never stalls its worker.
+"""
+import collections
+import os
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from ensemble import EnsemblePredictor
+from model_registry import MODEL_FILES, ModelRegistry
+
+SHARD_DIR = os.environ.get('BIKE_SHARD_DIR', 'shards')
+SHARD_MEMORY_BUDGET = int(float(os.environ.get('BIKE_SHARD_MEMORY_MB', 1024)) * 1024 * 1024)
+LOADER_THREADS = 2
+
+_PART = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_.-]*$')
+
+
+def shard_key(city=None, station=None):
+    """``'city'``, ``'city/station'`` or None; raises ``ValueError`` on unsafe names"""
+    parts = [str(p).strip() for p in (city, station) if p not in (None, '')]
+    if not parts:
+        return None
+    if station not in (None, '') and city in (None, ''):
+        raise ValueError("a station needs its city")
+    for part in parts:
+        if not _PART.match(part):
+            raise ValueError(f"bad shard name '{part}'")
+    return '/'.join(parts)
+
+
+def parse_shard(key):
+    """``shard_key`` from a ``'city'`` / ``'city/station'`` string"""
+    if key in (None, ''):
+        return None
+    parts = str(key).split('/')
+    if len(parts) > 2:
+        raise ValueError(f"bad shard '{key}' (expected city or city/station)")
+    return shard_key(*parts)
+
+
+def shard_path(key, shard_dir=SHARD_DIR):
+    return os.path.join(shard_dir, *key.split('/'))
+
+
+def has_models(path):
+    return any(os.path.exists(os.path.join(path, f)) for f in MODEL_FILES.values())
+
+
+def list_shards(shard_dir=SHARD_DIR):
+    """Every city and city/station directory holding model files"""
+    found = []
+    if not os.path.isdir(shard_dir):
+        return found
+    for city in sorted(os.listdir(shard_dir)):
+        city_dir = os.path.join(shard_dir, city)
+        if not os.path.isdir(city_dir) or not _PART.match(city):
+            continue
+        if has_models(city_dir):
+            found.append(city)
+        for station in sorted(os.listdir(city_dir)):
+            if _PART.match(station) and has_models(os.path.join(city_dir, station)):
+                found.append(f"{city}/{station}")
+    return found
+
+
+# ─────────────────────────────────────────────
+#  REGISTRY
+# ─────────────────────────────────────────────
+class ShardedRegistry:
+    """LRU of per-shard ``ModelRegistry`` objects bounded by model bytes"""
+
+    def __init__(self, shard_dir=SHARD_DIR, memory_budget=SHARD_MEMORY_BUDGET):
+        self.shard_dir = shard_dir
+        self.memory_budget = memory_budget
+        self._shards = collections.OrderedDict()
+        self._ensembles = {}
+        self._loading = {}
+        self._loader = None
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def registry(self, key):
+        """The shard's registry, its models loaded; raises ``KeyError`` for an unknown shard.
+
+        A cold shard is unpickled outside the registry lock, so lookups of
+        loaded shards never wait on it; concurrent callers asking for the same
+        cold shard share one load.
+        """
+        with self._lock:
+            registry = self._shards.get(key)
+            if registry is not None:
+                self._shards.move_to_end(key)
+                self.hits += 1
+                return registry
+            loading = self._loading.get(key)
+            if loading is None:
+                loading = self._loading[key] = Future()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            return loading.result()
+        try:
+            path = shard_path(key, self.shard_dir)
+            if not has_models(path):
+                raise KeyError(key)
+            registry = ModelRegistry(path)
+            registry.load_models()
+        except BaseException as e:
+            with self._lock:
+                self._loading.pop(key, None)
+            loading.set_exception(e)
+            raise
+        with self._lock:
+            self._shards[key] = registry
+            self._loading.pop(key, None)
+            self.loads += 1
+            self._evict(keep=key)
+        loading.set_result(registry)
+        return registry
+
+    def is_loaded(self, key):
+        with self._lock:
+            return key in self._shards
+
+    def prefetch(self, key):
+        """Future of ``registry(key)``, loaded on a background thread if the shard is cold"""
+        with self._lock:
+            registry = self._shards.get(key)
+            if registry is None and self._loader is None:
+                self._loader = ThreadPoolExecutor(max_workers=LOADER_THREADS, thread_name_prefix='shard-load')
+        if registry is not None:
+            done = Future()
+            done.set_result(registry)
+            return done
+        return self._loader.submit(self.registry, key)
+
+    def load_models(self, key):
+        return self.registry(key).load_models()
+
+    def ensemble(self, key):
+        """The shard's ensemble, with the shard's own weights"""
+        registry = self.registry(key)
+        models = registry.load_models()
+        weights = registry.load_ensemble_weights()
+        cache_key = (tuple((name, id(model)) for name, model in models.items()), id(weights))
+        with self._lock:
+            cached = self._ensembles.get(key)
+            if cached is None or cached[0] != cache_key:
+                cached = self._ensembles[key] = (cache_key, EnsemblePredictor(models, weights))
+            return cached[1]
+
+    @staticmethod
+    def _bytes(registry):
+        return sum(entry['memory_bytes'] or 0 for entry in registry.stats())
+
+    def memory_bytes(self):
+        with self._lock:
+            return sum(self._bytes(r) for r in self._shards.values())
+
+    def _evict(self, keep):
+        total = self.memory_bytes()
+        for key in list(self._shards):
+            if total <= self.memory_budget:
+                break
+            if key == keep:
+                continue
+            registry = self._shards.pop(key)
+            self._ensembles.pop(key, None)
+            total -= self._bytes(registry)
+            registry.clear()
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'loaded': {key: self._bytes(r) for key, r in self._shards.items()},
+                'memory_bytes': self.memory_bytes(),
+                'memory_budget': self.memory_budget,
+                'hits': self.hits,
+                'loads': self.loads,
+                'evictions': self.evictions,
+            }
+
+
+_shards = None
+_shards_lock = threading.Lock()
+
+
+def get_shards():
+    """Return the sharded registry shared by every session in this process"""
+    global _shards
+    if _shards is None:
+        with _shards_lock:
+            if _shards is None:
+                _shards = ShardedRegistry()
+    return _shards
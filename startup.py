@@ -0,0 +1,112 @@
+"""Process start-up for the Streamlit app: background prewarming and cold-start timing.
+
+Streamlit re-executes app.py on every rerun, but imports this module once
+per process. The first run calls ``prewarm()``, which starts one daemon
+thread that loads what the other pages will need (models, ensemble,
+rollups, the hourly rider split, forecast, pandas) while the first page
+renders. Each step's duration is recorded as the ``prewarm`` stage in
+``instrumentation``; the first script run of the process is recorded as
+``cold_start``, labelled with whether prewarming had finished by then.
+"""
+import importlib
+import threading
+import time
+
+from instrumentation import get_instrumentation
+
+# First import of this module, i.e. the start of the process's first script run
+PROCESS_T0 = time.perf_counter()
+
+
+def _import(*names):
+    return lambda: [importlib.import_module(name) for name in names]
+
+
+def _models():
+    from model_registry import get_registry
+    get_registry().load_models()
+
+
+def _ensemble():
+    from ensemble import get_ensemble
+    get_ensemble()
+
+
+def _scheduler():
+    from batching import get_scheduler
+    from prediction_cache import get_cache
+    get_scheduler()
+    get_cache()
+
+
+def _split():
+    from riders import hourly_split
+    hourly_split()
+
+
+def _rollups():
+    from aggregates import get_rollups
+    get_rollups()
+
+
+def _forecast():
+    from forecast import get_forecast
+    get_forecast()
+
+
+# In order of how soon a page is likely to need them
+PREWARM_STEPS = (
+    ('models', _models),
+    ('ensemble', _ensemble),
+    ('scheduler', _scheduler),
+    ('rollups', _rollups),
+    ('split', _split),
+    ('plotly', _import('plotly.graph_objects', 'plotly.subplots')),
+    ('pandas', _import('pandas')),
+    ('forecast', _forecast),
+)
+
+_state = {'thread': None, 'steps': {}, 'errors': {}, 'done': False, 'cold_start': None}
+_lock = threading.Lock()
+
+
+def _run(steps):
+    inst = get_instrumentation()
+    for name, fn in steps:
+        t0 = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            # A missing model or forecast just means that page loads it (or not) itself
+            _state['errors'][name] = str(e)
+        seconds = time.perf_counter() - t0
+        _state['steps'][name] = seconds
+        inst.observe('prewarm', seconds, step=name)
+    _state['done'] = True
+
+
+def prewarm(steps=PREWARM_STEPS):
+    """Start the prewarm thread once per process; later calls are no-ops"""
+    with _lock:
+        if _state['thread'] is None:
+            _state['thread'] = threading.Thread(target=_run, args=(steps,), name='prewarm', daemon=True)
+            _state['thread'].start()
+    return _state['thread']
+
+
+def script_finished(seconds, page):
+    """Record one script run; the process's first run is the cold start"""
+    inst = get_instrumentation()
+    inst.observe('script_run', seconds, page=page)
+    with _lock:
+        if _state['cold_start'] is not None:
+            return
+        _state['cold_start'] = time.perf_counter() - PROCESS_T0
+    inst.observe('cold_start', _state['cold_start'], page=page,
+                 prewarm='done' if _state['done'] else 'running')
+
+
+def report():
+    """Cold start and per-step prewarm seconds so far"""
+    return {'cold_start_s': _state['cold_start'], 'prewarm_done': _state['done'],
+            'prewarm_s': dict(_state['steps']), 'prewarm_errors': dict(_state['errors'])}
@@ -0,0 +1,258 @@
+"""Columnar, memory-mapped copies of the rental history CSVs.
+
+    python storage.py train.csv test.csv          # convert (or refresh) stores
+    python storage.py train.csv --info
+
+Each CSV is parsed once, a chunk at a time, into ``models/store/<name>-<hash>/``
+(the hash is of its absolute path): one ``.npy`` file per column with a
+fixed dtype (int8 categories, float32 weather readings, int32 counts, int64
+epoch seconds for ``datetime``) plus ``meta.json`` recording the source's
+path, size and mtime. Columns are opened with
+``np.load(mmap_mode='r')``, so opening a store costs no parsing and only
+the pages touched are read. A store is rebuilt when its source CSV changes.
+
+``load_frame`` / ``iter_frames`` accept either a CSV path or a store
+directory and yield DataFrames shaped like the CSV, with ``datetime``
+already as ``datetime64``; training, the rollups and batch scoring read
+history through them. pandas is imported only where frames are built, so
+reading columns does not pay for it.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+STORE_DIR = os.path.join('models', 'store')
+META_FILE = 'meta.json'
+CHUNK_ROWS = 500_000
+# Weather readings carry at most 4 decimals; float32 columns are rounded back
+# to them on read so features match the CSV values the models were fitted on
+FLOAT_DECIMALS = 4
+_SWAP_ATTEMPTS = 5
+
+COLUMN_DTYPES = {
+    'datetime': np.int64,
+    'season': np.int8,
+    'holiday': np.int8,
+    'workingday': np.int8,
+    'weather': np.int8,
+    'temp': np.float32,
+    'atemp': np.float32,
+    'humidity': np.float32,
+    'windspeed': np.float32,
+    'casual': np.int32,
+    'registered': np.int32,
+    'count': np.int32,
+}
+
+
+# ─────────────────────────────────────────────
+#  CONVERSION
+# ─────────────────────────────────────────────
+def _source_stat(path):
+    st = os.stat(path)
+    return {'source': os.path.abspath(path), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def _to_epoch(values):
+    import pandas as pd
+    # Unparseable values become NaT, stored as int64 min, which reads back as NaT
+    return pd.to_datetime(values, errors='coerce').astype('datetime64[s]').astype(np.int64)
+
+
+def _write_npy(path, part_path, dtype, rows):
+    """``.npy`` file for ``rows`` values of ``dtype`` whose raw bytes are in ``part_path``"""
+    header = {'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)), 'fortran_order': False, 'shape': (rows,)}
+    with open(path, 'wb') as out, open(part_path, 'rb') as part:
+        np.lib.format.write_array_header_1_0(out, header)
+        shutil.copyfileobj(part, out)
+    os.remove(part_path)
+
+
+def _build(csv_path, tmp_dir, chunksize):
+    """Write the columns of ``csv_path`` into ``tmp_dir`` chunk by chunk"""
+    import pandas as pd
+    stat = _source_stat(csv_path)
+    parts, rows = {}, 0
+    try:
+        for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+            for name in chunk.columns:
+                if name not in COLUMN_DTYPES:
+                    continue
+                if name not in parts:
+                    parts[name] = open(os.path.join(tmp_dir, f'{name}.part'), 'wb')
+                values = _to_epoch(chunk[name]) if name == 'datetime' else chunk[name]
+                parts[name].write(values.to_numpy().astype(COLUMN_DTYPES[name]).tobytes())
+            rows += len(chunk)
+    finally:
+        for f in parts.values():
+            f.close()
+    for name in parts:
+        _write_npy(os.path.join(tmp_dir, f'{name}.npy'), os.path.join(tmp_dir, f'{name}.part'),
+                   COLUMN_DTYPES[name], rows)
+    with open(os.path.join(tmp_dir, META_FILE), 'w') as f:
+        json.dump({**stat, 'rows': rows, 'columns': list(parts), 'created': time.time()}, f, indent=2)
+
+
+def _fresh_store(out_dir, csv_path):
+    """The store at ``out_dir`` if it is complete and current for ``csv_path``, else None"""
+    try:
+        store = ColumnStore(out_dir)
+    except (OSError, ValueError):
+        return None
+    return store if store.is_fresh(csv_path) else None
+
+
+def convert(csv_path, out_dir=None, chunksize=CHUNK_ROWS):
+    """Parse ``csv_path`` into a column store; returns the opened ``ColumnStore``.
+
+    The store is built in a private directory beside ``out_dir`` and renamed
+    into place, so concurrent converters (threads or processes) never touch
+    each other's files. If another one has already published a current
+    store, that one is used and this build is dropped.
+    """
+    out_dir = (out_dir or store_path(csv_path)).rstrip(os.sep)
+    parent = os.path.dirname(out_dir) or '.'
+    os.makedirs(parent, exist_ok=True)
+    prefix = f'.{os.path.basename(out_dir)}.'
+    tmp_dir = tempfile.mkdtemp(dir=parent, prefix=prefix, suffix='.tmp')
+    try:
+        _build(csv_path, tmp_dir, chunksize)
+        for _ in range(_SWAP_ATTEMPTS):
+            store = _fresh_store(out_dir, csv_path)
+            if store is not None:
+                return store
+            # A stale store is renamed aside (not deleted) first: readers that
+            # already opened it keep their memory maps
+            old_dir = None
+            if os.path.exists(out_dir):
+                old_dir = tempfile.mkdtemp(dir=parent, prefix=prefix, suffix='.old')
+                try:
+                    os.replace(out_dir, os.path.join(old_dir, 'store'))
+                except OSError:
+                    pass
+            try:
+                os.rename(tmp_dir, out_dir)
+            except OSError:
+                continue  # another writer got in between; use theirs if it is current
+            finally:
+                if old_dir is not None:
+                    shutil.rmtree(old_dir, ignore_errors=True)
+            return ColumnStore(out_dir)
+        raise OSError(f"could not publish the column store at {out_dir}")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def store_path(csv_path, store_dir=STORE_DIR):
+    """Store directory for ``csv_path``, keyed on its name and absolute path"""
+    source = os.path.abspath(csv_path)
+    digest = hashlib.sha1(source.encode()).hexdigest()[:10]
+    return os.path.join(store_dir, f"{os.path.splitext(os.path.basename(source))[0]}-{digest}")
+
+
+def is_store(path):
+    return os.path.isfile(os.path.join(path, META_FILE))
+
+
+# ─────────────────────────────────────────────
+#  READ SIDE
+# ─────────────────────────────────────────────
+class ColumnStore:
+    """Memory-mapped columns of one converted CSV"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META_FILE)) as f:
+            self.meta = json.load(f)
+        # Mapped up front (a header read each): an open store keeps working
+        # after a rebuild swaps a new directory into its place
+        self._columns = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+                         for name in self.meta['columns']}
+
+    @property
+    def columns(self):
+        return list(self.meta['columns'])
+
+    def __len__(self):
+        return int(self.meta['rows'])
+
+    def __contains__(self, name):
+        return name in self.meta['columns']
+
+    def __getitem__(self, name):
+        """Zero-copy, read-only view of one column"""
+        return self._columns[name]
+
+    def datetimes(self, start=0, stop=None):
+        return self['datetime'][start:stop].astype('datetime64[s]')
+
+    def is_fresh(self, csv_path):
+        """True while ``csv_path`` is the file this was converted from, at the same size and mtime"""
+        try:
+            stat = _source_stat(csv_path)
+        except OSError:
+            return True
+        return all(stat[k] == self.meta.get(k) for k in ('source', 'size', 'mtime_ns'))
+
+    def frame(self, start=0, stop=None, columns=None):
+        """Rows ``[start, stop)`` as a CSV-shaped DataFrame"""
+        import pandas as pd
+        data = {}
+        for name in columns or self.columns:
+            if name == 'datetime':
+                data[name] = self.datetimes(start, stop)
+            elif COLUMN_DTYPES[name] == np.float32:
+                data[name] = np.round(self[name][start:stop].astype(float), FLOAT_DECIMALS)
+            else:
+                data[name] = self[name][start:stop]
+        return pd.DataFrame(data)
+
+    def iter_frames(self, chunk_rows=CHUNK_ROWS, columns=None):
+        for start in range(0, len(self), chunk_rows):
+            yield self.frame(start, start + chunk_rows, columns)
+
+
+def open_store(path, store_dir=STORE_DIR):
+    """Store for ``path`` (a CSV or a store directory), converting the CSV if needed"""
+    if is_store(path):
+        return ColumnStore(path)
+    target = store_path(path, store_dir)
+    return _fresh_store(target, path) or convert(path, target)
+
+
+def load_frame(path, columns=None):
+    """Whole history of ``path`` as a DataFrame, read through its column store"""
+    return open_store(path).frame(columns=columns)
+
+
+def iter_frames(path, chunk_rows=CHUNK_ROWS, columns=None):
+    return open_store(path).iter_frames(chunk_rows, columns)
+
+
+# ─────────────────────────────────────────────
+#  CLI
+# ─────────────────────────────────────────────
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert rental CSVs into memory-mapped column stores")
+    parser.add_argument('inputs', nargs='+', help="CSV files (or store directories with --info)")
+    parser.add_argument('--info', action='store_true', help="describe the stores without converting")
+    args = parser.parse_args(argv)
+
+    for path in args.inputs:
+        t0 = time.perf_counter()
+        store = ColumnStore(path if is_store(path) else store_path(path)) if args.info else open_store(path)
+        size = sum(os.path.getsize(os.path.join(store.path, f'{c}.npy')) for c in store.columns)
+        print(f"{path}: {len(store):,} rows · {len(store.columns)} columns · {size / 1e6:.2f} MB "
+              f"at {store.path} ({time.perf_counter() - t0:.2f}s)")
+        for name in store.columns:
+            print(f"  {name:12s} {store[name].dtype}")
+
+
+if __name__ == '__main__':
+    main()
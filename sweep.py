@@ -0,0 +1,281 @@
+"""Scenario sweeps over the feature space.
+
+    python sweep.py --axis temp=-5:40:46 --axis humidity=0:100:21 --axis hour=0:23:24
+    python sweep.py --set season=3 --set weather=2 --axis windspeed=0,10,20,30 --model XGBoost -o sweep.json
+
+Every ``--axis`` gives the values of one of the 13 features (``start:stop:num``
+or a comma list; temperatures in °C, humidity in %, wind in km/h, like the
+Predict Demand form); everything else is held at the ``--set`` scenario.
+The full cartesian grid is evaluated without ever being materialized: flat
+grid indices are cut into chunks, each chunk's rows are built and scored
+by a worker (a spawned process from the CLI, a thread when the caller
+passes its models), and the worker returns only the per-value sums the
+results need. Memory stays bounded by ``chunk_rows`` x workers.
+
+Results are partial-dependence style: for each axis, the mean predicted
+rentals at each of its values averaged over every other axis, and for
+each pair of axes, the same as a 2-D heatmap.
+"""
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+
+from batching import ENSEMBLE
+from ensemble import get_ensemble
+from features import (FEATURE_INDEX, PAYLOAD_FIELDS, normalize_humidity, normalize_temperature,
+                      normalize_windspeed, payload_to_features)
+from model_registry import get_registry
+from prediction import predict_many, to_counts
+from records import new_matrix
+
+CHUNK_ROWS = 65_536
+# Grids smaller than this are scored in-process; pool start-up would dominate
+PARALLEL_MIN_ROWS = 200_000
+# Chunks queued per worker, bounding result memory in the parent
+IN_FLIGHT_PER_WORKER = 2
+
+# The Predict Demand form's defaults
+DEFAULT_SCENARIO = {
+    'season': 2, 'holiday': 0, 'workingday': 1, 'weather': 1,
+    'temp': 20.0, 'atemp': 20.0, 'humidity': 60.0, 'windspeed': 10.0,
+    'hour': 17, 'day': 15, 'month': 6, 'yr': 1, 'dayofweek': 2,
+}
+
+_TO_MODEL_UNITS = {
+    'temp': normalize_temperature,
+    'atemp': normalize_temperature,
+    'humidity': normalize_humidity,
+    'windspeed': normalize_windspeed,
+}
+
+
+def axis_values(spec):
+    """Parse ``start:stop:num`` (inclusive linspace) or ``a,b,c`` into values"""
+    if ':' in spec:
+        start, stop, num = spec.split(':')
+        return np.linspace(float(start), float(stop), int(num))
+    return np.array([float(v) for v in spec.split(',')])
+
+
+# ─────────────────────────────────────────────
+#  GRID
+# ─────────────────────────────────────────────
+class Grid:
+    """Lazily indexed cartesian grid around a base feature row"""
+
+    def __init__(self, base_features, axes):
+        self.base = np.asarray(base_features, dtype=float)
+        if not axes:
+            raise ValueError("a sweep needs at least one axis")
+        self.names = list(axes)
+        for name in self.names:
+            if name not in FEATURE_INDEX:
+                raise KeyError(name)
+        self.raw = [np.asarray(list(v), dtype=float) for v in axes.values()]
+        self.values = [_TO_MODEL_UNITS.get(n, lambda v: v)(v) for n, v in zip(self.names, self.raw)]
+        self.columns = [FEATURE_INDEX[name] for name in self.names]
+        self.shape = tuple(len(v) for v in self.values)
+        self.size = int(np.prod(self.shape)) if self.shape else 1
+
+    def rows(self, start, stop):
+        """Feature rows for flat grid indices ``[start, stop)`` and their per-axis indices"""
+        flat = np.arange(start, stop)
+        idx = np.unravel_index(flat, self.shape)
+        X = new_matrix(len(flat), self.base)
+        for col, values, i in zip(self.columns, self.values, idx):
+            X[:, col] = values[i]
+        return X, idx
+
+
+# ─────────────────────────────────────────────
+#  EVALUATION
+# ─────────────────────────────────────────────
+def _reduce(grid, idx, counts):
+    """Per-axis and per-pair sums of ``counts`` for one chunk"""
+    curves = [np.bincount(i, weights=counts, minlength=n) for i, n in zip(idx, grid.shape)]
+    pairs = {}
+    for a, b in itertools.combinations(range(len(grid.shape)), 2):
+        flat = idx[a] * grid.shape[b] + idx[b]
+        pairs[(a, b)] = np.bincount(flat, weights=counts, minlength=grid.shape[a] * grid.shape[b])
+    return curves, pairs, float(counts.sum()), float(counts.min()), float(counts.max())
+
+
+def _score_chunk(grid, models, model, start, stop):
+    X, idx = grid.rows(start, stop)
+    if model == ENSEMBLE:
+        pred_log = get_ensemble(models).predict_log(X)
+    else:
+        pred_log = predict_many({model: models[model]}, X)[model]
+    counts = to_counts(pred_log).astype(float)
+    return _reduce(grid, idx, counts)
+
+
+_worker = {}
+
+
+def _init_worker(grid, model):
+    _worker.update(grid=grid, model=model, models=get_registry().load_models())
+
+
+def _worker_chunk(start, stop):
+    return _score_chunk(_worker['grid'], _worker['models'], _worker['model'], start, stop)
+
+
+class SweepResult:
+    """Mean predicted rentals per axis value (``curves``) and per axis pair (``heatmaps``)"""
+
+    def __init__(self, grid, model):
+        self.grid = grid
+        self.model = model
+        self._curves = [np.zeros(n) for n in grid.shape]
+        self._pairs = {}
+        self.total = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.rows = 0
+        self.seconds = 0.0
+
+    def add(self, reduced, rows):
+        curves, pairs, total, lo, hi = reduced
+        for acc, part in zip(self._curves, curves):
+            acc += part
+        for key, part in pairs.items():
+            if key in self._pairs:
+                self._pairs[key] += part
+            else:
+                self._pairs[key] = part.copy()
+        self.total += total
+        self.min, self.max = min(self.min, lo), max(self.max, hi)
+        self.rows += rows
+
+    @property
+    def mean(self):
+        return self.total / self.rows if self.rows else 0.0
+
+    @property
+    def curves(self):
+        """{axis: (raw values, mean rentals)}"""
+        out = {}
+        for name, raw, sums, n in zip(self.grid.names, self.grid.raw, self._curves, self.grid.shape):
+            out[name] = (raw, sums / (self.grid.size / n))
+        return out
+
+    @property
+    def heatmaps(self):
+        """{(axis_a, axis_b): mean rentals shaped (len(a), len(b))}"""
+        out = {}
+        for (a, b), sums in self._pairs.items():
+            na, nb = self.grid.shape[a], self.grid.shape[b]
+            out[(self.grid.names[a], self.grid.names[b])] = sums.reshape(na, nb) / (self.grid.size / (na * nb))
+        return out
+
+    def as_dict(self):
+        return {
+            'model': self.model,
+            'rows': self.rows,
+            'seconds': self.seconds,
+            'rows_per_sec': self.rows / self.seconds if self.seconds else 0.0,
+            'mean': self.mean, 'min': self.min, 'max': self.max,
+            'curves': {k: {'values': v.tolist(), 'mean': m.tolist()} for k, (v, m) in self.curves.items()},
+            'heatmaps': {f'{a}|{b}': h.tolist() for (a, b), h in self.heatmaps.items()},
+        }
+
+
+def _run_bounded(pool, submit, bounds, workers, result, t0, log):
+    """Score ``bounds`` on ``pool`` keeping a bounded number of chunks in flight"""
+    pending = []
+    queue = iter(bounds)
+    for start, stop in itertools.islice(queue, workers * IN_FLIGHT_PER_WORKER):
+        pending.append((stop - start, submit(pool, start, stop)))
+    while pending:
+        rows, future = pending.pop(0)
+        result.add(future.result(), rows)
+        for start, stop in itertools.islice(queue, 1):
+            pending.append((stop - start, submit(pool, start, stop)))
+        if log:
+            log(f"{result.rows:,}/{result.grid.size:,} rows · {result.rows / (time.perf_counter() - t0):,.0f} rows/s")
+
+
+def sweep(base_features, axes, model=ENSEMBLE, models=None, chunk_rows=CHUNK_ROWS, workers=None, log=None):
+    """Evaluate the cartesian grid of ``axes`` around ``base_features``; returns a ``SweepResult``.
+
+    With ``models`` given (the app, a shard's models) large grids are scored
+    on threads in this process: the models release the GIL, and no process
+    is forked from a multithreaded server. Without them, as from the CLI,
+    chunks go to spawned worker processes that load the registry's models.
+    """
+    grid = Grid(base_features, axes)
+    result = SweepResult(grid, model)
+    bounds = [(s, min(s + chunk_rows, grid.size)) for s in range(0, grid.size, chunk_rows)]
+    workers = workers or os.cpu_count() or 1
+    t0 = time.perf_counter()
+
+    if models is not None or workers == 1 or grid.size < PARALLEL_MIN_ROWS:
+        if models is None:
+            models = get_registry().load_models()
+        if model != ENSEMBLE and model not in models:
+            raise KeyError(model)
+        if workers == 1 or grid.size < PARALLEL_MIN_ROWS:
+            for start, stop in bounds:
+                result.add(_score_chunk(grid, models, model, start, stop), stop - start)
+        else:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='sweep') as pool:
+                _run_bounded(pool, lambda p, start, stop: p.submit(_score_chunk, grid, models, model, start, stop),
+                             bounds, workers, result, t0, log)
+    else:
+        # Spawned, not forked: workers start clean and load their own models
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'),
+                                 initializer=_init_worker, initargs=(grid, model)) as pool:
+            _run_bounded(pool, lambda p, start, stop: p.submit(_worker_chunk, start, stop),
+                         bounds, workers, result, t0, log)
+    result.seconds = time.perf_counter() - t0
+    return result
+
+
+# ─────────────────────────────────────────────
+#  CLI
+# ─────────────────────────────────────────────
+def _parse_pairs(items, convert):
+    out = {}
+    for item in items or []:
+        name, _, value = item.partition('=')
+        if name not in PAYLOAD_FIELDS:
+            raise SystemExit(f"unknown feature '{name}' (have: {', '.join(PAYLOAD_FIELDS)})")
+        out[name] = convert(value)
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep a cartesian scenario grid through the models")
+    parser.add_argument('--axis', action='append', required=True, metavar='NAME=SPEC',
+                        help="feature to sweep: start:stop:num or v1,v2,...")
+    parser.add_argument('--set', action='append', metavar='NAME=VALUE', help="fixed scenario value")
+    parser.add_argument('--model', default=ENSEMBLE)
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('-o', '--output', help="write curves and heatmaps as JSON")
+    args = parser.parse_args(argv)
+
+    scenario = {**DEFAULT_SCENARIO, **_parse_pairs(args.set, float)}
+    axes = _parse_pairs(args.axis, axis_values)
+    result = sweep(payload_to_features(scenario), axes, args.model, chunk_rows=args.chunk_rows,
+                   workers=args.workers, log=print)
+    print(f"{result.rows:,} rows in {result.seconds:.2f}s ({result.rows / result.seconds:,.0f} rows/s) · "
+          f"mean {result.mean:,.0f} · range {result.min:,.0f}–{result.max:,.0f}")
+    for name, (values, mean) in result.curves.items():
+        best = int(np.argmax(mean))
+        print(f"  {name:10s} {mean.min():7,.0f} – {mean.max():7,.0f} (peak at {values[best]:g})")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result.as_dict(), f)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == '__main__':
+    main()
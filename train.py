@@ -0,0 +1,319 @@
+"""Reproducible training for the bike_model_*.pkl artifacts.
+
+    python train.py                       # train all four families, publish
+    python train.py --models XGBoost,CatBoost --workers 2 --no-publish
+    python train.py --split-model CatBoost   # dual-target family (default: Random Forest)
+    python train.py --shard london/kings-cross --data kings_cross.csv
+
+Mirrors the notebooks (log1p(count) target, 500 trees, 80/20 split with
+random_state=42, RMSLE on the held-out split, best model refit on all
+rows into ``bike_model_best_<family>.pkl``) but derives features with
+``features.frame_to_features`` so the artifacts see exactly what the app
+feeds them. Model families are fitted
+in parallel, one per process.
+
+The casual / registered split model (see ``riders``) is fitted alongside
+them in the same pool on both log1p targets, unless ``--no-split``.
+
+Every run writes ``models/<version>/`` (models, ensemble info and weights,
+metrics and a manifest with per-stage timings); unless ``--no-publish`` is given the
+files the app reads are then atomically replaced, which the model registry
+picks up on the next rerun. With ``--shard city[/station]`` runs go to
+``models/<city>/<station>/<version>/`` and are published into the shard's
+directory (see ``shards``) instead of next to the app.
+"""
+import argparse
+import json
+import os
+import pickle
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+import numpy as np
+
+from ensemble import EnsemblePredictor, inverse_error_weights
+from features import frame_to_features
+from model_registry import ENSEMBLE_INFO_FILE, ENSEMBLE_WEIGHTS_FILE, MODEL_FILES, SPLIT_MODEL_FILE
+from riders import DEFAULT_FAMILY, SPLIT_FAMILIES, TARGETS, make_split_model, predict_split, target_logs
+from shards import parse_shard, shard_path
+from storage import load_frame
+
+TRAIN_FILE = 'train.csv'
+ARTIFACT_DIR = 'models'
+METRICS_FILE = 'bike_model_metrics.pkl'
+RANDOM_STATE = 42
+
+MODEL_PARAMS = {
+    'Gradient Boosting': dict(n_estimators=500, learning_rate=0.05, max_depth=5, random_state=RANDOM_STATE),
+    'Random Forest': dict(n_estimators=500, max_depth=25, min_samples_split=5, min_samples_leaf=2,
+                          max_features='sqrt', random_state=RANDOM_STATE),
+    'XGBoost': dict(n_estimators=500, learning_rate=0.05, max_depth=7, subsample=0.8,
+                    colsample_bytree=0.8, random_state=RANDOM_STATE),
+    'CatBoost': dict(iterations=500, learning_rate=0.05, depth=6, loss_function='RMSE',
+                     random_seed=RANDOM_STATE, verbose=False),
+}
+
+
+# ─────────────────────────────────────────────
+#  DATA
+# ─────────────────────────────────────────────
+def load_training_data(path=TRAIN_FILE, targets=False):
+    """Return (X, y) with y = log1p(count); ``path`` is a CSV or a column store.
+
+    ``targets=True`` returns (X, y, Y), Y being the (n, 2) log1p casual /
+    registered targets of the split model.
+    """
+    df = load_frame(path)
+    X, y = frame_to_features(df), np.log1p(df['count'].to_numpy(dtype=float))
+    return (X, y, target_logs(df)) if targets else (X, y)
+
+
+def rmsle(y_log, pred_log):
+    """RMSLE on counts, computed from log1p-space targets and predictions"""
+    pred = np.maximum(np.expm1(pred_log), 0)
+    return float(np.sqrt(np.mean((np.log1p(pred) - y_log) ** 2)))
+
+
+def regression_metrics(y_log, pred_log):
+    y, pred = np.expm1(y_log), np.maximum(np.expm1(pred_log), 0)
+    ss_res = np.sum((y - pred) ** 2)
+    ss_tot = np.sum((y - y.mean()) ** 2)
+    return {
+        'RMSLE': rmsle(y_log, pred_log),
+        'MAE': float(np.mean(np.abs(y - pred))),
+        'RMSE': float(np.sqrt(np.mean((y - pred) ** 2))),
+        'R2': float(1 - ss_res / ss_tot) if ss_tot else 0.0,
+        'Peak_MAE': float(np.mean(np.abs(np.sort(y)[-10:] - np.sort(pred)[-10:]))),
+    }
+
+
+def make_model(name, n_jobs=1, **overrides):
+    """Instantiate an unfitted model of the given family"""
+    params = {**MODEL_PARAMS[name], **overrides}
+    if name == 'Gradient Boosting':
+        from sklearn.ensemble import GradientBoostingRegressor
+        return GradientBoostingRegressor(**params)
+    if name == 'Random Forest':
+        from sklearn.ensemble import RandomForestRegressor
+        return RandomForestRegressor(n_jobs=n_jobs, **params)
+    if name == 'XGBoost':
+        import xgboost as xgb
+        return xgb.XGBRegressor(n_jobs=n_jobs, **params)
+    if name == 'CatBoost':
+        import catboost as cb
+        return cb.CatBoostRegressor(thread_count=n_jobs, **params)
+    raise KeyError(name)
+
+
+def _fit_one(name, X_train, y_train, X_val, n_jobs):
+    """Process-pool worker: fit one family, return its pickle and val predictions"""
+    t0 = time.perf_counter()
+    model = make_model(name, n_jobs)
+    model.fit(X_train, y_train)
+    fit_s = time.perf_counter() - t0
+    return name, pickle.dumps(model), np.asarray(model.predict(X_val), dtype=float), fit_s
+
+
+def _fit_split(family, X_train, Y_train, X_val, n_jobs):
+    """Process-pool worker: fit the dual-target model, return its pickle and val predictions"""
+    t0 = time.perf_counter()
+    model = make_split_model(family, n_jobs)
+    model.fit(X_train, Y_train)
+    fit_s = time.perf_counter() - t0
+    return pickle.dumps(model), predict_split(model, X_val), fit_s
+
+
+def split_metrics(Y_log, y_log, pred_log):
+    """RMSLE of each split target and of their summed total"""
+    scores = {target: rmsle(Y_log[:, j], pred_log[:, j]) for j, target in enumerate(TARGETS)}
+    total = np.maximum(np.expm1(pred_log), 0).sum(axis=1)
+    scores['count'] = rmsle(y_log, np.log1p(total))
+    return scores
+
+
+# ─────────────────────────────────────────────
+#  PIPELINE
+# ─────────────────────────────────────────────
+def _split(n, test_size, seed=RANDOM_STATE):
+    """Same shuffled split as sklearn's train_test_split(test_size, random_state)"""
+    from sklearn.model_selection import train_test_split
+    return train_test_split(np.arange(n), test_size=test_size, random_state=seed)
+
+
+def _atomic_copy(src, dst):
+    tmp = dst + '.tmp'
+    shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+def _dump(obj, path):
+    with open(path, 'wb') as f:
+        pickle.dump(obj, f)
+
+
+def train(data_path=TRAIN_FILE, model_names=None, workers=None, out_dir=ARTIFACT_DIR,
+          publish=True, test_size=0.2, log=print, split_family=DEFAULT_FAMILY, publish_dir='.'):
+    """Train, evaluate and save the model families; returns the run manifest.
+
+    ``split_family=None`` skips the casual / registered split model.
+    """
+    model_names = list(model_names or MODEL_FILES)
+    jobs = len(model_names) + (1 if split_family else 0)
+    workers = workers or min(jobs, os.cpu_count() or 1)
+    threads_per_model = max(1, (os.cpu_count() or 1) // workers)
+    timings = {}
+    run_t0 = time.perf_counter()
+
+    t0 = time.perf_counter()
+    X, y, Y = load_training_data(data_path, targets=True)
+    timings['load_features'] = time.perf_counter() - t0
+    log(f"Loaded {len(X):,} rows from {data_path} in {timings['load_features']:.2f}s")
+
+    train_idx, val_idx = _split(len(X), test_size)
+    X_train, y_train, X_val, y_val = X[train_idx], y[train_idx], X[val_idx], y[val_idx]
+
+    # Fit every family (and the split model) in its own process
+    t0 = time.perf_counter()
+    blobs, val_preds = {}, {}
+    split_blob = split_scores = None
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_fit_one, name, X_train, y_train, X_val, threads_per_model)
+                   for name in model_names]
+        if split_family:
+            split_future = pool.submit(_fit_split, split_family, X_train, Y[train_idx], X_val, threads_per_model)
+        for future in as_completed(futures):
+            name, blob, pred, fit_s = future.result()
+            blobs[name] = blob
+            val_preds[name] = pred
+            timings[f'fit:{name}'] = fit_s
+            log(f"  {name:20s} fitted in {fit_s:7.2f}s · RMSLE {rmsle(y_val, pred):.6f}")
+        if split_family:
+            split_blob, split_pred, fit_s = split_future.result()
+            split_scores = split_metrics(Y[val_idx], y_val, split_pred)
+            timings['fit:split'] = fit_s
+            log(f"  {'Split (' + split_family + ')':20s} fitted in {fit_s:7.2f}s · RMSLE "
+                + " · ".join(f"{target} {score:.6f}" for target, score in split_scores.items()))
+    timings['fit_parallel'] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    metrics_summary = {name: regression_metrics(y_val, val_preds[name]) for name in model_names}
+    validation_scores = {name: metrics_summary[name]['RMSLE'] for name in model_names}
+    # Scored with the weights published below, i.e. as the app serves it
+    ensemble_weights = inverse_error_weights(validation_scores)
+    ensemble_pred = EnsemblePredictor(dict.fromkeys(model_names), ensemble_weights).combine(val_preds)
+    ensemble_metrics = regression_metrics(y_val, ensemble_pred)
+    best_model_name = min(validation_scores, key=validation_scores.get)
+    timings['evaluate'] = time.perf_counter() - t0
+
+    # As in the notebooks, the best model is refit on every row
+    t0 = time.perf_counter()
+    best_model = make_model(best_model_name, os.cpu_count() or 1)
+    best_model.fit(X, y)
+    # Only the best_ file gets the refit; the ensemble member stays the
+    # 80%-split model the validation scores and weights describe
+    best_blob = pickle.dumps(best_model)
+    timings['refit_best'] = time.perf_counter() - t0
+    log(f"Best: {best_model_name} (RMSLE {validation_scores[best_model_name]:.6f}), "
+        f"ensemble RMSLE {ensemble_metrics['RMSLE']:.6f}")
+
+    t0 = time.perf_counter()
+    version = datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')
+    run_dir = os.path.join(out_dir, version)
+    os.makedirs(run_dir, exist_ok=True)
+    written = []
+    best_file = MODEL_FILES[best_model_name].replace('bike_model_', 'bike_model_best_')
+    for filename, blob in [(MODEL_FILES[name], blobs[name]) for name in model_names] + [(best_file, best_blob)]:
+        written.append(filename)
+        with open(os.path.join(run_dir, filename), 'wb') as f:
+            f.write(blob)
+
+    ensemble_info = {
+        'validation_scores': validation_scores,
+        'metrics_summary': metrics_summary,
+        'best_model_name': best_model_name,
+        'ensemble_rmsle': ensemble_metrics['RMSLE'],
+        'ensemble_mae': ensemble_metrics['MAE'],
+        'ensemble_rmse': ensemble_metrics['RMSE'],
+        'ensemble_r2': ensemble_metrics['R2'],
+        'ensemble_peak_mae': ensemble_metrics['Peak_MAE'],
+        'ensemble_weights': ensemble_weights,
+        'version': version,
+    }
+    if split_blob is not None:
+        written.append(SPLIT_MODEL_FILE)
+        with open(os.path.join(run_dir, SPLIT_MODEL_FILE), 'wb') as f:
+            f.write(split_blob)
+    written += [ENSEMBLE_INFO_FILE, ENSEMBLE_WEIGHTS_FILE, METRICS_FILE]
+    _dump(ensemble_info, os.path.join(run_dir, ENSEMBLE_INFO_FILE))
+    _dump({'weights': ensemble_weights, 'method': 'inverse squared validation RMSLE', 'version': version},
+          os.path.join(run_dir, ENSEMBLE_WEIGHTS_FILE))
+    _dump(metrics_summary, os.path.join(run_dir, METRICS_FILE))
+    timings['save'] = time.perf_counter() - t0
+
+    if publish:
+        t0 = time.perf_counter()
+        os.makedirs(publish_dir, exist_ok=True)
+        for filename in written:
+            _atomic_copy(os.path.join(run_dir, filename), os.path.join(publish_dir, filename))
+        timings['publish'] = time.perf_counter() - t0
+
+    timings['total'] = time.perf_counter() - run_t0
+    manifest = {
+        'version': version,
+        'data': data_path,
+        'rows': int(len(X)),
+        'models': model_names,
+        'files': written,
+        'published': publish,
+        'publish_dir': publish_dir,
+        'validation_scores': validation_scores,
+        'ensemble_rmsle': ensemble_metrics['RMSLE'],
+        'split': {'family': split_family, 'validation_scores': split_scores} if split_family else None,
+        'timings': timings,
+    }
+    with open(os.path.join(run_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+# ─────────────────────────────────────────────
+#  CLI
+# ─────────────────────────────────────────────
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the bike demand models from train.csv")
+    parser.add_argument('--data', default=TRAIN_FILE)
+    parser.add_argument('--models', help=f"comma-separated subset of: {', '.join(MODEL_FILES)}")
+    parser.add_argument('--workers', type=int, help="parallel training processes (default: one per model)")
+    parser.add_argument('--out', default=ARTIFACT_DIR, help="directory for versioned runs")
+    parser.add_argument('--test-size', type=float, default=0.2)
+    parser.add_argument('--no-publish', action='store_true', help="don't replace the artifacts the app reads")
+    parser.add_argument('--split-model', default=DEFAULT_FAMILY, choices=SPLIT_FAMILIES,
+                        help=f"family of the casual / registered model (default: {DEFAULT_FAMILY})")
+    parser.add_argument('--no-split', action='store_true', help="don't train the casual / registered model")
+    parser.add_argument('--shard', help="publish to this city or city/station shard instead of the app's files")
+    args = parser.parse_args(argv)
+
+    model_names = [m.strip() for m in args.models.split(',')] if args.models else None
+    unknown = [m for m in model_names or [] if m not in MODEL_FILES]
+    if unknown:
+        parser.error(f"unknown model(s): {', '.join(unknown)}")
+
+    try:
+        shard = parse_shard(args.shard)
+    except ValueError as e:
+        parser.error(str(e))
+    out_dir, publish_dir = args.out, '.'
+    if shard is not None:
+        out_dir, publish_dir = os.path.join(args.out, *shard.split('/')), shard_path(shard)
+
+    manifest = train(args.data, model_names, args.workers, out_dir, not args.no_publish, args.test_size,
+                     split_family=None if args.no_split else args.split_model, publish_dir=publish_dir)
+    print(f"\nRun {manifest['version']} · {manifest['rows']:,} rows")
+    for stage, seconds in manifest['timings'].items():
+        print(f"  {stage:28s} {seconds:8.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,324 @@
+"""Library-free NumPy inference for the bike demand tree ensembles.
+
+Every model (sklearn Gradient Boosting / Random Forest, XGBoost, CatBoost)
+is exported to one flat node table:
+
+    feature    int32    column tested at the node (0 for leaves)
+    threshold  float32  go left when x <= threshold (+inf for leaves)
+    left/right int32    child node ids (leaves point at themselves)
+    value      float64  leaf contribution, learning rate / averaging folded in
+
+plus the root node of each tree, the first tree of each model, a per-model
+constant and per-model depth. A batch is evaluated for all of a model's
+trees at once by advancing an (n_rows x n_trees) array of node ids
+``depth`` times.
+
+    python tree_engine.py export -o bike_models_compiled.npz --check test.csv
+    BIKE_MODEL_BACKEND=compiled streamlit run app.py
+
+Compiled evaluation wins for the interactive batch sizes (1-1000 rows);
+for bulk scoring of very deep forests the native libraries stay faster.
+
+Comparisons are done in float32 with thresholds rounded down to float32,
+which reproduces the libraries' own float32 split tests exactly; leaf sums
+agree to ~1e-6 (XGBoost accumulates in float32). Missing
+values (NaN) are not supported; the app never produces them.
+"""
+import argparse
+import json
+import os
+import tempfile
+
+import numpy as np
+
+COMPILED_FILE = 'bike_models_compiled.npz'
+# Upper bound on (rows x trees) node ids held at once while traversing
+CHUNK_CELLS = 2_000_000
+
+
+def _float32_at_most(t):
+    """Largest float32 <= t, so ``x32 <= result`` matches ``x32 <= t``"""
+    t = np.asarray(t, dtype=np.float64)
+    f = t.astype(np.float32)
+    over = f.astype(np.float64) > t
+    f[over] = np.nextafter(f[over], np.float32(-np.inf))
+    return f
+
+
+class _Tree:
+    __slots__ = ('feature', 'threshold', 'left', 'right', 'value')
+
+    def __init__(self, feature, threshold, left, right, value):
+        is_leaf = left < 0
+        idx = np.arange(len(left), dtype=np.int32)
+        self.feature = np.where(is_leaf, 0, feature).astype(np.int32)
+        self.threshold = np.where(is_leaf, np.float32(np.inf), threshold).astype(np.float32)
+        self.left = np.where(is_leaf, idx, left).astype(np.int32)
+        self.right = np.where(is_leaf, idx, right).astype(np.int32)
+        self.value = np.where(is_leaf, value, 0.0).astype(np.float64)
+
+    def depth(self):
+        depth = np.zeros(len(self.left), dtype=np.int32)
+        for node in range(len(self.left)):
+            for child in (self.left[node], self.right[node]):
+                if child != node:
+                    depth[child] = depth[node] + 1
+        return int(depth.max())
+
+
+# ─────────────────────────────────────────────
+#  EXPORTERS (need the training libraries)
+# ─────────────────────────────────────────────
+def _export_sklearn_tree(tree, scale):
+    t = tree.tree_
+    return _Tree(t.feature, _float32_at_most(t.threshold), t.children_left, t.children_right,
+                 t.value[:, 0, 0] * scale)
+
+
+def _export_gradient_boosting(model):
+    init = model.init_
+    if init == 'zero':
+        base = 0.0
+    elif hasattr(init, 'constant_'):
+        base = float(np.ravel(init.constant_)[0])
+    else:
+        raise ValueError("only constant init estimators can be compiled")
+    trees = [_export_sklearn_tree(est, model.learning_rate) for est in model.estimators_[:, 0]]
+    return trees, base
+
+
+def _export_random_forest(model):
+    scale = 1.0 / len(model.estimators_)
+    return [_export_sklearn_tree(est, scale) for est in model.estimators_], 0.0
+
+
+def _export_xgboost(model):
+    booster = model.get_booster()
+    cfg = json.loads(booster.save_raw(raw_format='json'))
+    gbm = cfg['learner']['gradient_booster']
+    if gbm['name'] != 'gbtree':
+        raise ValueError(f"unsupported XGBoost booster '{gbm['name']}'")
+    base = float(cfg['learner']['learner_model_param']['base_score'].strip('[]'))
+    raw_trees = gbm['model']['trees']
+    try:
+        raw_trees = raw_trees[:(model.best_iteration + 1) * max(1, int(gbm['model']['gbtree_model_param'].get('num_parallel_tree', 1)))]
+    except AttributeError:
+        pass
+
+    trees = []
+    for t in raw_trees:
+        left = np.asarray(t['left_children'], dtype=np.int64)
+        cond = np.asarray(t['split_conditions'], dtype=np.float64)
+        # XGBoost goes left on x < split (float32); x <= nextafter(split, -inf) is the same test
+        split32 = cond.astype(np.float32)
+        threshold = np.nextafter(split32, np.float32(-np.inf))
+        trees.append(_Tree(np.asarray(t['split_indices']), threshold, left,
+                           np.asarray(t['right_children']), cond))
+    return trees, base
+
+
+def _export_catboost(model):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'model.json')
+        model.save_model(path, format='json')
+        with open(path) as f:
+            cfg = json.load(f)
+    flat_index = {ff['feature_index']: ff['flat_feature_index']
+                  for ff in cfg['features_info'].get('float_features', [])}
+    scale, bias = cfg['scale_and_bias']
+    bias = float(bias[0]) if isinstance(bias, list) else float(bias)
+
+    trees = []
+    for t in cfg['oblivious_trees']:
+        splits = t['splits']
+        if any(s['split_type'] != 'FloatFeature' for s in splits):
+            raise ValueError("only float-feature CatBoost splits can be compiled")
+        depth = len(splits)
+        leaves = np.asarray(t['leaf_values'], dtype=np.float64) * scale
+        # Expand the oblivious tree into a full binary tree: level i tests
+        # splits[i]; going right sets bit i of the leaf index.
+        n_internal = 2 ** depth - 1
+        n_nodes = n_internal + 2 ** depth
+        feature = np.zeros(n_nodes, dtype=np.int32)
+        threshold = np.zeros(n_nodes, dtype=np.float32)
+        left = np.full(n_nodes, -1, dtype=np.int64)
+        right = np.full(n_nodes, -1, dtype=np.int64)
+        value = np.zeros(n_nodes, dtype=np.float64)
+        for node in range(n_internal):
+            level = int(np.floor(np.log2(node + 1)))
+            split = splits[level]
+            feature[node] = flat_index.get(split['float_feature_index'], split['float_feature_index'])
+            threshold[node] = np.float32(split['border'])
+            left[node] = 2 * node + 1
+            right[node] = 2 * node + 2
+        for leaf in range(2 ** depth):
+            # heap position of leaf: bits read from the root (split 0) downwards
+            node = 0
+            for level in range(depth):
+                node = 2 * node + (2 if (leaf >> level) & 1 else 1)
+            value[node] = leaves[leaf]
+        trees.append(_Tree(feature, threshold, left, right, value))
+    return trees, bias
+
+
+def export_model(model):
+    """Return ``(trees, base)`` for any supported model"""
+    kind = type(model).__name__
+    if kind == 'GradientBoostingRegressor':
+        return _export_gradient_boosting(model)
+    if kind == 'RandomForestRegressor':
+        return _export_random_forest(model)
+    if kind == 'XGBRegressor':
+        return _export_xgboost(model)
+    if kind == 'CatBoostRegressor':
+        return _export_catboost(model)
+    raise TypeError(f"cannot compile model of type {kind}")
+
+
+# ─────────────────────────────────────────────
+#  ENGINE (NumPy only)
+# ─────────────────────────────────────────────
+class CompiledForest:
+    """All trees of one or more models in a single flat node table"""
+
+    def __init__(self, names, feature, threshold, left, right, value, roots, model_offsets, bases, depths):
+        self.names = list(names)
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.model_offsets = model_offsets
+        self.bases = bases
+        self.depths = depths
+        self._models = None
+
+    @classmethod
+    def from_models(cls, models):
+        """Compile ``{name: fitted model}``"""
+        arrays = {k: [] for k in ('feature', 'threshold', 'left', 'right', 'value')}
+        roots, model_offsets, bases, depths = [], [], [], []
+        n_nodes = 0
+        for name, model in models.items():
+            trees, base = export_model(model)
+            model_offsets.append(len(roots))
+            bases.append(base)
+            depths.append(max(tree.depth() for tree in trees))
+            for tree in trees:
+                roots.append(n_nodes)
+                arrays['feature'].append(tree.feature)
+                arrays['threshold'].append(tree.threshold)
+                arrays['left'].append(tree.left + n_nodes)
+                arrays['right'].append(tree.right + n_nodes)
+                arrays['value'].append(tree.value)
+                n_nodes += len(tree.left)
+        model_offsets.append(len(roots))
+        return cls(models.keys(),
+                   np.concatenate(arrays['feature']), np.concatenate(arrays['threshold']),
+                   np.concatenate(arrays['left']), np.concatenate(arrays['right']),
+                   np.concatenate(arrays['value']),
+                   np.asarray(roots, dtype=np.int32), np.asarray(model_offsets, dtype=np.int64),
+                   np.asarray(bases, dtype=np.float64), np.asarray(depths, dtype=np.int32))
+
+    def save(self, path):
+        np.savez_compressed(
+            path, names=np.asarray(self.names), feature=self.feature, threshold=self.threshold,
+            left=self.left, right=self.right, value=self.value, roots=self.roots,
+            model_offsets=self.model_offsets, bases=self.bases, depths=self.depths)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as z:
+            return cls([str(n) for n in z['names']], z['feature'], z['threshold'], z['left'], z['right'],
+                       z['value'], z['roots'], z['model_offsets'], z['bases'], z['depths'])
+
+    def _model_sum(self, X32, i):
+        """Sum of model ``i``'s leaf values for each row, in row chunks"""
+        roots = self.roots[self.model_offsets[i]:self.model_offsets[i + 1]]
+        depth = int(self.depths[i])
+        out = np.empty(len(X32), dtype=np.float64)
+        step = max(1, CHUNK_CELLS // max(1, len(roots)))
+        for start in range(0, len(X32), step):
+            Xc = X32[start:start + step]
+            nodes = np.broadcast_to(roots, (len(Xc), len(roots))).copy()
+            rows = np.arange(len(Xc))[:, None]
+            for _ in range(depth):
+                go_left = Xc[rows, self.feature[nodes]] <= self.threshold[nodes]
+                nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+            out[start:start + step] = self.value[nodes].sum(axis=1)
+        return out + self.bases[i]
+
+    def predict_all(self, X):
+        """Log predictions of every compiled model in one pass: {name: array}"""
+        X32 = np.ascontiguousarray(np.atleast_2d(X), dtype=np.float32)
+        return {name: self._model_sum(X32, i) for i, name in enumerate(self.names)}
+
+    def predict_model(self, name, X):
+        """Log predictions of a single compiled model"""
+        X32 = np.ascontiguousarray(np.atleast_2d(X), dtype=np.float32)
+        return self._model_sum(X32, self.names.index(name))
+
+    def as_models(self):
+        """``{name: predictor}`` with a sklearn-style ``predict`` for each model"""
+        if self._models is None:
+            self._models = {name: CompiledModel(self, name) for name in self.names}
+        return dict(self._models)
+
+
+class CompiledModel:
+    """Drop-in ``predict`` for one model inside a ``CompiledForest``"""
+
+    def __init__(self, forest, name):
+        self.forest = forest
+        self.name = name
+
+    def predict(self, X):
+        return self.forest.predict_model(self.name, X)
+
+
+def check_parity(models, forest, X, atol=1e-4):
+    """Max absolute log-space difference per model; raises if any exceeds ``atol``"""
+    compiled = forest.predict_all(X)
+    diffs = {}
+    for name, model in models.items():
+        reference = np.asarray(model.predict(np.asarray(X, dtype=float)), dtype=float).ravel()
+        diffs[name] = float(np.max(np.abs(reference - compiled[name]))) if len(reference) else 0.0
+    bad = {name: d for name, d in diffs.items() if d > atol}
+    if bad:
+        raise AssertionError(f"compiled predictions diverge: {bad}")
+    return diffs
+
+
+# ─────────────────────────────────────────────
+#  CLI
+# ─────────────────────────────────────────────
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile the bike demand models into a NumPy inference table")
+    sub = parser.add_subparsers(dest='command', required=True)
+    export = sub.add_parser('export', help="compile every registered model")
+    export.add_argument('-o', '--output', default=COMPILED_FILE)
+    export.add_argument('--check', metavar='CSV', help="verify parity on a test.csv-shaped file")
+    export.add_argument('--atol', type=float, default=1e-4, help="max log-space difference")
+    args = parser.parse_args(argv)
+
+    import pandas as pd
+    from features import frame_to_features
+    from model_registry import get_registry
+
+    models = get_registry().load_models()
+    if not models:
+        raise SystemExit("No trained models found.")
+    forest = CompiledForest.from_models(models)
+    forest.save(args.output)
+    print(f"Compiled {len(models)} models, {len(forest.roots):,} trees, {len(forest.left):,} nodes "
+          f"(depths {', '.join(map(str, forest.depths))}) -> {args.output}")
+
+    if args.check:
+        X = frame_to_features(pd.read_csv(args.check))
+        for name, diff in check_parity(models, CompiledForest.load(args.output), X, args.atol).items():
+            print(f"  {name:20s} max |diff| = {diff:.2e}")
+
+
+if __name__ == '__main__':
+    main()
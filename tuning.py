@@ -0,0 +1,254 @@
+"""Hyperparameter search for the bike demand model families.
+
+    python tuning.py --model XGBoost --trials 27
+    python tuning.py --model CatBoost --trials 9 --max-budget 1000 --study cb-deep
+
+Successive halving: ``--trials`` random configurations start with
+``--min-budget`` trees, the best 1/eta advance to eta x the trees, up to
+``--max-budget``. Each (configuration, budget) is scored by mean RMSLE over
+time-ordered folds (``cv.month_splits``: train on every month before the
+validation month) over the cached feature matrix, in a process pool.
+
+Trials are stored in SQLite, so rerunning the same ``--study`` after an
+interruption skips everything already scored on the same training data and
+folds; changing either (e.g. ``--folds``) scores the configurations afresh. The winning configuration is
+refit on all rows and written as ``bike_model_best_<family>.pkl``.
+"""
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import random
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from cv import cached_training_data, month_splits
+from model_registry import MODEL_FILES
+from train import TRAIN_FILE, make_model, rmsle
+
+TRIALS_DB = os.path.join('models', 'tuning.sqlite')
+
+SEARCH_SPACES = {
+    'Gradient Boosting': {
+        'learning_rate': [0.02, 0.05, 0.1],
+        'max_depth': [3, 4, 5, 6, 7],
+        'subsample': [0.7, 0.85, 1.0],
+        'min_samples_leaf': [1, 3, 5],
+    },
+    'Random Forest': {
+        'max_depth': [15, 20, 25, None],
+        'min_samples_split': [2, 5, 10],
+        'min_samples_leaf': [1, 2, 4],
+        'max_features': ['sqrt', 0.5, 1.0],
+    },
+    'XGBoost': {
+        'learning_rate': [0.02, 0.05, 0.1],
+        'max_depth': [4, 5, 6, 7, 8, 9],
+        'subsample': [0.6, 0.8, 1.0],
+        'colsample_bytree': [0.6, 0.8, 1.0],
+        'min_child_weight': [1, 3, 5],
+        'reg_lambda': [0.5, 1.0, 2.0],
+    },
+    'CatBoost': {
+        'learning_rate': [0.02, 0.05, 0.1],
+        'depth': [4, 5, 6, 7, 8],
+        'l2_leaf_reg': [1, 3, 5, 9],
+    },
+}
+BUDGET_PARAM = {'CatBoost': 'iterations'}
+
+
+# ─────────────────────────────────────────────
+#  TRIAL STORE
+# ─────────────────────────────────────────────
+class TrialStore:
+    """SQLite log of scored (configuration, budget) pairs.
+
+    Every trial records the ``evaluation`` it was scored under (training
+    data and folds, see ``evaluation_key``); a resumed study only reuses
+    scores from the same one.
+    """
+
+    def __init__(self, path=TRIALS_DB):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(trials)")]
+        if columns and 'evaluation' not in columns:
+            # Trials from before evaluations were recorded can't be matched; keep them aside
+            tables = {row[0] for row in self.conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+            aside = 'trials_unkeyed' if 'trials_unkeyed' not in tables else f'trials_unkeyed_{int(time.time())}'
+            self.conn.execute(f"ALTER TABLE trials RENAME TO {aside}")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS trials (
+                study TEXT, family TEXT, config_hash TEXT, params TEXT, budget INTEGER,
+                evaluation TEXT, fold_scores TEXT, score REAL, seconds REAL, created REAL,
+                PRIMARY KEY (study, config_hash, budget, evaluation)
+            )""")
+        self.conn.commit()
+
+    def get(self, study, config_hash, budget, evaluation):
+        row = self.conn.execute(
+            "SELECT score FROM trials WHERE study=? AND config_hash=? AND budget=? AND evaluation=?",
+            (study, config_hash, budget, evaluation)).fetchone()
+        return row[0] if row else None
+
+    def put(self, study, family, config_hash, params, budget, evaluation, fold_scores, score, seconds):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO trials VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (study, family, config_hash, json.dumps(params, sort_keys=True), budget, evaluation,
+             json.dumps(fold_scores), score, seconds, time.time()))
+        self.conn.commit()
+
+
+def evaluation_key(X, y, folds):
+    """Fingerprint of the training rows and fold indices a trial is scored on"""
+    digest = hashlib.sha1()
+    for arr in (X, y):
+        arr = np.ascontiguousarray(arr)
+        digest.update(f"{arr.dtype}{arr.shape}".encode())
+        digest.update(arr.data)
+    for train_idx, val_idx in folds:
+        digest.update(np.ascontiguousarray(train_idx, dtype=np.int64).data)
+        digest.update(b'|')
+        digest.update(np.ascontiguousarray(val_idx, dtype=np.int64).data)
+        digest.update(b';')
+    return digest.hexdigest()[:16]
+
+
+def config_hash(params):
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def sample_configs(family, n, seed=0):
+    """``n`` distinct random configurations from the family's grid"""
+    space = SEARCH_SPACES[family]
+    rng = random.Random(seed)
+    seen, configs = set(), []
+    size = int(np.prod([len(v) for v in space.values()]))
+    while len(configs) < min(n, size):
+        params = {k: rng.choice(v) for k, v in space.items()}
+        h = config_hash(params)
+        if h not in seen:
+            seen.add(h)
+            configs.append(params)
+    return configs
+
+
+# ─────────────────────────────────────────────
+#  EVALUATION (process pool)
+# ─────────────────────────────────────────────
+_worker_data = {}
+
+
+def _init_worker(X, y, folds):
+    _worker_data.update(X=X, y=y, folds=folds)
+
+
+def _evaluate(family, params, budget, n_jobs):
+    X, y, folds = _worker_data['X'], _worker_data['y'], _worker_data['folds']
+    t0 = time.perf_counter()
+    overrides = {**params, BUDGET_PARAM.get(family, 'n_estimators'): budget}
+    scores = []
+    for train_idx, val_idx in folds:
+        model = make_model(family, n_jobs, **overrides)
+        model.fit(X[train_idx], y[train_idx])
+        scores.append(rmsle(y[val_idx], np.asarray(model.predict(X[val_idx]), dtype=float)))
+    return scores, time.perf_counter() - t0
+
+
+def successive_halving(family, X, y, n_trials=27, min_budget=50, max_budget=500, eta=3,
+                       n_folds=4, study=None, store=None, workers=None, seed=0, log=print):
+    """Run the search; returns the best ``{'params', 'budget', 'score'}``"""
+    study = study or f"{family}-seed{seed}"
+    store = store or TrialStore()
+    workers = workers or os.cpu_count() or 1
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    folds = month_splits(X, n_folds)
+    evaluation = evaluation_key(X, y, folds)
+
+    budgets = []
+    budget = min_budget
+    while budget < max_budget:
+        budgets.append(int(budget))
+        budget *= eta
+    budgets.append(int(max_budget))
+
+    survivors = sample_configs(family, n_trials, seed)
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(X, y, folds)) as pool:
+        for rung, budget in enumerate(budgets):
+            scored, pending = [], []
+            for params in survivors:
+                h = config_hash(params)
+                cached = store.get(study, h, budget, evaluation)
+                if cached is not None:
+                    scored.append((cached, params))
+                else:
+                    pending.append((params, pool.submit(_evaluate, family, params, budget, threads)))
+            for params, future in pending:
+                fold_scores, seconds = future.result()
+                score = float(np.mean(fold_scores))
+                store.put(study, family, config_hash(params), params, budget, evaluation,
+                          fold_scores, score, seconds)
+                scored.append((score, params))
+
+            scored.sort(key=lambda item: item[0])
+            results = {'params': scored[0][1], 'budget': budget, 'score': scored[0][0]}
+            log(f"  rung {rung} · {budget:5d} trees · {len(scored):3d} configs "
+                f"({len(scored) - len(pending)} resumed) · best RMSLE {scored[0][0]:.6f}")
+            keep = max(1, len(scored) // eta)
+            survivors = [params for _, params in scored[:keep]]
+    return results
+
+
+def write_best(family, result, X, y, out_dir='.'):
+    """Refit the winning configuration on all rows as bike_model_best_<family>.pkl"""
+    overrides = {**result['params'], BUDGET_PARAM.get(family, 'n_estimators'): result['budget']}
+    model = make_model(family, os.cpu_count() or 1, **overrides)
+    model.fit(X, y)
+    path = os.path.join(out_dir, MODEL_FILES[family].replace('bike_model_', 'bike_model_best_'))
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        pickle.dump(model, f)
+    os.replace(tmp, path)
+    return path
+
+
+# ─────────────────────────────────────────────
+#  CLI
+# ─────────────────────────────────────────────
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Successive-halving hyperparameter search")
+    parser.add_argument('--model', required=True, choices=list(SEARCH_SPACES))
+    parser.add_argument('--data', default=TRAIN_FILE)
+    parser.add_argument('--trials', type=int, default=27, help="configurations in the first rung")
+    parser.add_argument('--min-budget', type=int, default=50, help="trees in the first rung")
+    parser.add_argument('--max-budget', type=int, default=500, help="trees in the last rung")
+    parser.add_argument('--eta', type=int, default=3, help="keep 1/eta of configs per rung")
+    parser.add_argument('--folds', type=int, default=4, help="validation months")
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--study', help="name to resume under (default: <model>-seed<seed>)")
+    parser.add_argument('--db', default=TRIALS_DB)
+    parser.add_argument('--out', default='.', help="directory for the best-model artifact")
+    parser.add_argument('--no-write', action='store_true', help="don't refit/write the best model")
+    args = parser.parse_args(argv)
+
+    X, y = cached_training_data(args.data)
+    print(f"Tuning {args.model} on {len(X):,} rows")
+    t0 = time.perf_counter()
+    result = successive_halving(args.model, X, y, args.trials, args.min_budget, args.max_budget,
+                                args.eta, args.folds, args.study, TrialStore(args.db),
+                                args.workers, args.seed)
+    print(f"Best RMSLE {result['score']:.6f} at {result['budget']} trees: {result['params']}")
+    if not args.no_write:
+        print(f"Wrote {write_best(args.model, result, X, y, args.out)}")
+    print(f"Done in {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == '__main__':
+    main()